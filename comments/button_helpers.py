@@ -42,7 +42,10 @@ class XtdCommentAdminButtonHelper(ButtonHelper):
         }
 
     def clear_flags_button(self, comment):
-        if comment.flags.count():
+        flag_count = getattr(comment, 'flag_count', None)
+        if flag_count is None:
+            flag_count = comment.flags.count()
+        if flag_count:
             return {
                 'url': reverse('wagtail_comments_xtd_publication', kwargs={
                     'comment_pk': comment.pk,
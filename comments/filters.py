@@ -1,5 +1,6 @@
 from django.contrib.admin import SimpleListFilter
-from django.db.models import Count
+from django.db.models import Exists, OuterRef
+from django_comments.models import CommentFlag
 
 
 class FlaggedFilter(SimpleListFilter):
@@ -13,6 +14,9 @@ class FlaggedFilter(SimpleListFilter):
         ]
 
     def queryset(self, request, queryset):
-        if self.value():
-            return queryset.annotate(num_flags=Count('flags')).filter(num_flags__gt=0)
+        has_flags = Exists(CommentFlag.objects.filter(comment=OuterRef('pk')))
+        if self.value() == 'True':
+            return queryset.filter(has_flags)
+        if self.value() == 'False':
+            return queryset.exclude(has_flags)
         return queryset
@@ -1,6 +1,11 @@
 from django import forms
+from django.conf import settings
+from django.utils.text import get_text_list
+from django.utils.translation import get_language, gettext, ngettext
 from django_comments_xtd.forms import XtdCommentForm as BaseCommentForm
 
+from comments.profanity import find_profanities
+
 
 class CommentForm(BaseCommentForm):
 
@@ -15,6 +20,21 @@ class CommentForm(BaseCommentForm):
         self.fields['post_anonymously'] = forms.BooleanField(
             label='Don\'t display my username next to my comment', required=False)
 
+    def clean_comment(self):
+        comment = self.cleaned_data['comment']
+        if settings.COMMENTS_ALLOW_PROFANITIES:
+            return comment
+
+        locale = getattr(self.target_object, 'locale', None)
+        bad_words = find_profanities(comment, locale.language_code if locale else get_language())
+        if bad_words:
+            raise forms.ValidationError(ngettext(
+                'Watch your mouth! The word %s is not allowed here.',
+                'Watch your mouth! The words %s are not allowed here.',
+                len(bad_words)) % get_text_list(
+                ['"%s%s%s"' % (word[0], '-' * (len(word) - 2), word[-1]) for word in bad_words], gettext('and')))
+        return comment
+
     def get_comment_create_data(self, site_id=None):
         data = super().get_comment_create_data(site_id=site_id)
 
@@ -0,0 +1,23 @@
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+
+from comments.models import CommentableMixin
+from comments.utils import update_comment_counts
+
+
+class Command(BaseCommand):
+    """
+    This command recounts the public comments of every commentable page,
+    e.g. after comments were changed outside of the comments app.
+    """
+
+    def handle(self, *args, **options):
+        for model in apps.get_models():
+            if not issubclass(model, CommentableMixin):
+                continue
+            content_type = ContentType.objects.get_for_model(model)
+            updated = update_comment_counts(content_type.pk)
+            self.stdout.write(f'Fixed the comment count of {updated} {model._meta.verbose_name_plural}.')
+
+        self.stdout.write(self.style.SUCCESS('Comment counts reconciled.'))
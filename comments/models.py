@@ -1,8 +1,13 @@
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
+from django_comments.models import CommentFlag
 from django_comments_xtd.models import XtdComment
 from wagtail.admin.edit_handlers import FieldPanel
 from wagtail.core.models import Page
+from wagtail.core.signals import page_published
 
 class CommentStatus:
     OPEN = 'open'
@@ -24,12 +29,15 @@ class CommentableMixin(models.Model):
     Make sure you update get_absolute_url if this it hasn't already been
     included.
 
-    Use comments_panels to modify commenting_status from the admin.
+    Use comments_panels to modify commenting_status from the admin, and
+    add comments_exclude_fields_in_copy to the exclude_fields_in_copy of
+    pages, so copies and translations do not take over the comment_count.
     """
     commenting_status = models.CharField(max_length=15, choices=CommentStatus.Choices)
     commenting_starts_at = models.DateTimeField(null=True, blank=True)
     commenting_ends_at = models.DateTimeField(null=True, blank=True)
-
+    # Public, not removed comments; kept up to date by comments.utils.update_comment_counts
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
 
     comments_panels = [
         FieldPanel('commenting_status', heading='Status'),
@@ -37,6 +45,7 @@ class CommentableMixin(models.Model):
         FieldPanel('commenting_ends_at', heading='Commenting Ends At')
 
     ]
+    comments_exclude_fields_in_copy = ['comment_count']
 
     def should_show_comments_list(self):
         return self.commenting_status in [CommentStatus.OPEN, CommentStatus.CLOSED, CommentStatus.TIMESTAMPED]
@@ -66,3 +75,28 @@ class CannedResponse(models.Model):
 
     def __str__(self):
         return self.text
+
+
+@receiver(post_save, sender=XtdComment)
+@receiver(post_delete, sender=XtdComment)
+def invalidate_comments_cache_for_comment(sender, instance, **kwargs):
+    from comments.utils import invalidate_comments_cache, update_comment_counts
+    invalidate_comments_cache(instance.content_type_id, instance.object_pk)
+    update_comment_counts(instance.content_type_id, [instance.object_pk])
+
+
+@receiver(page_published)
+def update_comment_count_on_publish(sender, instance, **kwargs):
+    # Publishing writes the comment_count saved in the revision back to the
+    # page, which is outdated if comments changed since the revision was made
+    from comments.utils import update_comment_counts
+    if isinstance(instance, CommentableMixin):
+        update_comment_counts(ContentType.objects.get_for_model(instance).pk, [instance.pk])
+
+
+@receiver(post_save, sender=CommentFlag)
+@receiver(post_delete, sender=CommentFlag)
+def invalidate_comments_cache_for_flag(sender, instance, **kwargs):
+    from comments.utils import invalidate_comments_cache
+    comment = instance.comment
+    invalidate_comments_cache(comment.content_type_id, comment.object_pk)
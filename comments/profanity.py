@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+import unicodedata
+from collections import deque
+
+from django.conf import settings
+
+LEET_TRANSLATION = str.maketrans({
+    '0': 'o',
+    '1': 'i',
+    '!': 'i',
+    '3': 'e',
+    '4': 'a',
+    '@': 'a',
+    '5': 's',
+    '$': 's',
+    '7': 't',
+    '+': 't',
+})
+
+
+def normalize(text):
+    """
+    Casefold text, strip accents and undo common leetspeak substitutions so
+    that e.g. "Cr@p" and "crâp" match "crap".
+    """
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return stripped.translate(LEET_TRANSLATION)
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over a fixed set of terms. find_all runs in time
+    linear in the length of the text plus the number of matches, however
+    many terms there are.
+    """
+
+    def __init__(self, terms):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+
+        for term in terms:
+            if not term:
+                continue
+            state = 0
+            for char in term:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = next_state
+            self.output[state] += (term,)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def find_all(self, text):
+        """
+        Terms found in text, in the order they end, without duplicates
+        """
+        found = {}
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for term in self.output[state]:
+                found.setdefault(term, None)
+        return list(found)
+
+
+class ProfanityMatcher:
+    """
+    Matches PROFANITIES_LIST plus the word list of one language, read from
+    PROFANITIES_DIR/<language code>.txt with one term per line. The file is
+    compiled on first use and recompiled when its modification time
+    changes, checked at most every PROFANITIES_RELOAD_INTERVAL seconds.
+    """
+
+    def __init__(self, language_code):
+        self.language_code = language_code
+        self.automaton = None
+        self.mtime = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(settings.PROFANITIES_DIR, f'{self.language_code}.txt')
+
+    def get_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def read_terms(self):
+        terms = set(settings.PROFANITIES_LIST)
+        if self.mtime is not None:
+            with open(self.path, encoding='utf-8') as f:
+                terms.update(line.strip() for line in f if line.strip() and not line.startswith('#'))
+        return {normalize(term) for term in terms}
+
+    def get_automaton(self):
+        now = time.monotonic()
+        if self.automaton is not None and now - self.checked_at < settings.PROFANITIES_RELOAD_INTERVAL:
+            return self.automaton
+
+        with self.lock:
+            mtime = self.get_mtime()
+            if self.automaton is None or mtime != self.mtime:
+                self.mtime = mtime
+                self.automaton = AhoCorasick(self.read_terms())
+            self.checked_at = now
+        return self.automaton
+
+    def find_all(self, text):
+        return self.get_automaton().find_all(normalize(text))
+
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+def get_profanity_matcher(language_code):
+    matcher = _matchers.get(language_code)
+    if matcher is None:
+        with _matchers_lock:
+            matcher = _matchers.setdefault(language_code, ProfanityMatcher(language_code))
+    return matcher
+
+
+def find_profanities(text, language_code):
+    return get_profanity_matcher(language_code).find_all(text)
@@ -1,36 +1,29 @@
 from django import template
 
-register = template.Library()
-
-
-@register.simple_tag
-def user_can_report(comment, user):
-    if user.is_anonymous:
-        return False
-    return (comment.user != user) and not comment.flags.filter(user=user).exists()
-
-
-@register.simple_tag
-def filter_removed_comments(comments):
-    return [comment for comment in comments if not comment['comment'].is_removed]
-
+from comments.utils import get_comments_page
 
-@register.simple_tag
-def get_comments_page(comments, request):
-    return list(reversed(comments))[:get_current_num_records(request)]
-
-
-@register.simple_tag
-def has_more_comments(comments, request):
-    return get_current_num_records(request) < len(comments)
-
-
-@register.simple_tag
-def get_current_num_records(request):
-    return int(request.GET.get('num_records', 5))
+register = template.Library()
 
 
-@register.simple_tag
-def get_next_num_records(request):
-    current_num_records = int(request.GET.get('num_records', 5))
-    return current_num_records + 5
+@register.inclusion_tag('django_comments_xtd/comment_tree.html', takes_context=True)
+def render_comments_page(context, obj):
+    """
+    Render one page of the comment tree of obj. The page is chosen with the
+    ?comments_before=<thread id> query parameter.
+    """
+    request = context['request']
+    try:
+        cursor = int(request.GET.get('comments_before', 0))
+    except ValueError:
+        cursor = None
+    comments, next_cursor = get_comments_page(obj, request, cursor=cursor)
+
+    context_dict = context.flatten()
+    context_dict.update({
+        'comments': comments,
+        'next_comments_cursor': next_cursor,
+        'allow_flagging': True,
+        'allow_feedback': True,
+        'show_feedback': True,
+    })
+    return context_dict
@@ -0,0 +1,254 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.core import management
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory, override_settings
+from django_comments.models import CommentFlag
+from django_comments_xtd.models import XtdComment
+
+from comments import profanity
+from comments.models import CommentStatus
+from comments.utils import annotate_flag_totals, attach_content_objects, get_comments_page, moderate_comments
+from home.factories import ArticleFactory
+from home.models import Article, HomePage
+from iogt_users.factories import UserFactory
+
+
+class CommentsPageTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = UserFactory()
+        self.other_user = UserFactory()
+        self.article = ArticleFactory.build(owner=self.user, commenting_status=CommentStatus.OPEN)
+        HomePage.objects.first().add_child(instance=self.article)
+
+    def create_comment(self, parent=None, **kwargs):
+        comment = XtdComment.objects.create(
+            content_type=ContentType.objects.get_for_model(self.article), object_pk=self.article.pk, site_id=1,
+            user=self.other_user, comment='A comment', parent_id=parent.pk if parent else 0, **kwargs)
+        return XtdComment.objects.get(pk=comment.pk)
+
+    def get_request(self, query=None):
+        request = RequestFactory().get('/', query or {})
+        request.user = self.user
+        return request
+
+    def test_pages_are_fetched_newest_first_with_replies(self):
+        first, second, third = [self.create_comment() for _ in range(3)]
+        reply = self.create_comment(parent=third)
+        later_reply = self.create_comment(parent=third)
+
+        page, next_cursor = get_comments_page(self.article, self.get_request(), page_size=2)
+        last_page, last_cursor = get_comments_page(self.article, self.get_request(), cursor=next_cursor, page_size=2)
+
+        self.assertEqual([item['comment'] for item in page], [third, second])
+        self.assertEqual([item['comment'] for item in page[0]['children']], [reply, later_reply])
+        self.assertEqual([item['comment'] for item in last_page], [first])
+        self.assertIsNone(last_cursor)
+
+    def test_removed_comments_and_their_replies_are_excluded(self):
+        removed = self.create_comment(is_removed=True)
+        self.create_comment(parent=removed)
+
+        page, _ = get_comments_page(self.article, self.get_request())
+
+        self.assertEqual(page, [])
+
+    def test_flagged_comments_cannot_be_reported_again(self):
+        flagged = self.create_comment()
+        other = self.create_comment()
+        CommentFlag.objects.create(comment=flagged, user=self.user, flag=CommentFlag.SUGGEST_REMOVAL)
+
+        page, _ = get_comments_page(self.article, self.get_request())
+        can_report = {item['comment']: item['can_report'] for item in page}
+
+        self.assertEqual(can_report, {flagged: False, other: True})
+        self.assertEqual(page[1]['flagged_count'], 1)
+
+    @mock.patch('comments.utils.is_process_local_cache', return_value=False)
+    def test_cached_page_is_invalidated_when_comments_change(self, is_process_local_cache):
+        comment = self.create_comment()
+        get_comments_page(self.article, self.get_request())
+
+        with self.assertNumQueries(1):
+            page, _ = get_comments_page(self.article, self.get_request())
+        self.assertEqual([item['comment'] for item in page], [comment])
+
+        comment.is_removed = True
+        comment.save()
+        page, _ = get_comments_page(self.article, self.get_request())
+
+        self.assertEqual(page, [])
+
+    @mock.patch('comments.utils.is_process_local_cache', return_value=False)
+    def test_cached_page_shows_the_users_own_flags(self, is_process_local_cache):
+        comment = self.create_comment()
+        get_comments_page(self.article, self.get_request())
+        CommentFlag.objects.create(comment=comment, user=self.user, flag=CommentFlag.SUGGEST_REMOVAL)
+
+        page, _ = get_comments_page(self.article, self.get_request())
+
+        self.assertFalse(page[0]['can_report'])
+        self.assertEqual(page[0]['flagged_count'], 1)
+
+    def test_pages_are_not_cached_in_a_process_local_cache(self):
+        comment = self.create_comment()
+        get_comments_page(self.article, self.get_request())
+        XtdComment.objects.filter(pk=comment.pk).update(is_removed=True)
+
+        page, _ = get_comments_page(self.article, self.get_request())
+
+        self.assertEqual(page, [])
+
+
+class ModerateCommentsTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = UserFactory()
+        self.article = ArticleFactory.build(owner=self.user, commenting_status=CommentStatus.OPEN)
+        HomePage.objects.first().add_child(instance=self.article)
+
+    def create_comment(self, parent=None):
+        return XtdComment.objects.create(
+            content_type=ContentType.objects.get_for_model(self.article), object_pk=self.article.pk, site_id=1,
+            user=self.user, comment='A comment', parent_id=parent.pk if parent else 0)
+
+    def test_hide_applies_to_comments_and_their_replies(self):
+        first, second, untouched = [self.create_comment() for _ in range(3)]
+        reply = self.create_comment(parent=first)
+
+        moderate_comments([first.pk, second.pk], 'hide')
+
+        removed = set(XtdComment.objects.filter(is_removed=True).values_list('pk', flat=True))
+        self.assertEqual(removed, {first.pk, second.pk, reply.pk})
+
+    def test_clear_flags_only_clears_the_selected_comments(self):
+        first, second = self.create_comment(), self.create_comment()
+        for comment in (first, second):
+            CommentFlag.objects.create(comment=comment, user=self.user, flag=CommentFlag.SUGGEST_REMOVAL)
+
+        moderate_comments([first.pk], 'clear_flags')
+
+        self.assertEqual(list(CommentFlag.objects.values_list('comment_id', flat=True)), [second.pk])
+
+    def test_unknown_action_is_rejected(self):
+        with self.assertRaises(ValueError):
+            moderate_comments([self.create_comment().pk], 'delete')
+
+
+class CommentAdminListingTests(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory()
+        self.articles = [ArticleFactory.build(owner=self.user, commenting_status=CommentStatus.OPEN) for _ in range(2)]
+        for article in self.articles:
+            HomePage.objects.first().add_child(instance=article)
+        for article in self.articles:
+            XtdComment.objects.create(
+                content_type=ContentType.objects.get_for_model(article), object_pk=article.pk, site_id=1,
+                user=self.user, comment='A comment')
+
+    def test_content_objects_and_flag_counts_are_loaded_in_bulk(self):
+        comment = XtdComment.objects.first()
+        CommentFlag.objects.create(comment=comment, user=self.user, flag=CommentFlag.SUGGEST_REMOVAL)
+
+        comments = attach_content_objects(list(annotate_flag_totals(XtdComment.objects.order_by('pk'))))
+
+        with self.assertNumQueries(0):
+            titles = [c.content_object.title for c in comments]
+            language_codes = [c.content_object.locale.language_code for c in comments]
+        self.assertEqual(titles, [article.title for article in self.articles])
+        self.assertEqual(language_codes, ['en', 'en'])
+        self.assertEqual([c.flag_count for c in comments], [1, 0])
+
+
+@override_settings(PROFANITIES_LIST=('crap',), PROFANITIES_RELOAD_INTERVAL=0)
+class ProfanityTests(TestCase):
+    def setUp(self) -> None:
+        profanity._matchers.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        override = override_settings(PROFANITIES_DIR=self.directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def write_terms(self, language_code, terms):
+        path = os.path.join(self.directory.name, f'{language_code}.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(terms))
+        return path
+
+    def test_accents_and_leetspeak_are_normalized(self):
+        self.assertEqual(profanity.find_profanities('Cr@p! CRÂP', 'en'), ['crap'])
+
+    def test_each_language_has_its_own_list(self):
+        self.write_terms('fr', ['merde'])
+
+        self.assertEqual(profanity.find_profanities('merde', 'fr'), ['merde'])
+        self.assertEqual(profanity.find_profanities('merde', 'en'), [])
+
+    def test_overlapping_terms_are_all_found(self):
+        self.write_terms('en', ['he', 'she', 'hers'])
+
+        self.assertEqual(profanity.find_profanities('ushers', 'en'), ['she', 'he', 'hers'])
+
+    def test_changed_lists_are_reloaded(self):
+        path = self.write_terms('en', ['darn'])
+        self.assertEqual(profanity.find_profanities('darn', 'en'), ['darn'])
+
+        self.write_terms('en', ['heck'])
+        os.utime(path, ns=(0, 0))
+
+        self.assertEqual(profanity.find_profanities('darn heck', 'en'), ['heck'])
+
+
+class CommentCountTests(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory()
+        self.article = ArticleFactory.build(owner=self.user, commenting_status=CommentStatus.OPEN)
+        HomePage.objects.first().add_child(instance=self.article)
+
+    def create_comment(self):
+        return XtdComment.objects.create(
+            content_type=ContentType.objects.get_for_model(self.article), object_pk=self.article.pk, site_id=1,
+            user=self.user, comment='A comment')
+
+    def get_comment_count(self):
+        return Article.objects.get(pk=self.article.pk).comment_count
+
+    def test_count_follows_posting_and_moderation(self):
+        first, second = self.create_comment(), self.create_comment()
+        self.assertEqual(self.get_comment_count(), 2)
+
+        moderate_comments([first.pk], 'hide')
+        self.assertEqual(self.get_comment_count(), 1)
+
+        second.delete()
+        self.assertEqual(self.get_comment_count(), 0)
+
+    def test_reconcile_command_fixes_drifted_counts(self):
+        self.create_comment()
+        Article.objects.filter(pk=self.article.pk).update(comment_count=7)
+
+        management.call_command('reconcile_comment_counts', stdout=io.StringIO())
+
+        self.assertEqual(self.get_comment_count(), 1)
+
+    def test_publishing_an_old_revision_keeps_the_count(self):
+        revision = self.article.save_revision()
+        self.create_comment()
+
+        revision.publish()
+
+        self.assertEqual(self.get_comment_count(), 1)
+
+    def test_copies_do_not_take_over_the_count(self):
+        self.create_comment()
+        article = Article.objects.get(pk=self.article.pk)
+
+        copy = article.copy(update_attrs={'slug': 'copy'})
+
+        self.assertEqual(Article.objects.get(pk=copy.pk).comment_count, 0)
@@ -9,6 +9,8 @@ urlpatterns = [
         views.update, name='wagtail_comments_xtd_publication'),
     path('comment/<int:comment_pk>/reply',
         views.CommentReplyView.as_view(), name='comment_reply_view'),
+    path('moderation/',
+        views.CommentModerationQueueView.as_view(), name='comment_moderation_queue'),
     path('comment/new',
             views.post_admin_comment, name='comment_post_admin_comment'),
 
@@ -0,0 +1,250 @@
+import time
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.shortcuts import get_current_site
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import CharField, Count, IntegerField, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Cast, Coalesce
+from django_comments.models import CommentFlag
+from django_comments_xtd.conf import settings as xtd_settings
+from django_comments_xtd.models import LIKEDIT_FLAG, XtdComment
+from wagtail.core.models import Page
+
+from home.utils.cache import is_process_local_cache
+
+
+def get_public_comments(obj, site_id):
+    """
+    Public, not removed comments posted to obj
+    """
+    return XtdComment.objects.filter(
+        content_type=ContentType.objects.get_for_model(obj),
+        object_pk=obj.pk,
+        site__pk=site_id,
+        is_public=True,
+        is_removed=False,
+    )
+
+
+def annotate_flag_counts(queryset):
+    """
+    Annotate how many users suggested the removal of each comment
+    """
+    return queryset.annotate(flagged_count=Count('flags', filter=Q(flags__flag=CommentFlag.SUGGEST_REMOVAL)))
+
+
+def update_comment_counts(content_type_id, object_pks=None):
+    """
+    Recount the public comments of the given objects, or of all objects of
+    the content type, into their comment_count. Content types without a
+    comment_count, i.e. not using CommentableMixin, are ignored. Returns the
+    number of objects whose count changed.
+    """
+    from comments.models import CommentableMixin
+
+    model = ContentType.objects.get_for_id(content_type_id).model_class()
+    if model is None or not issubclass(model, CommentableMixin):
+        return 0
+
+    counts = XtdComment.objects.filter(
+        content_type_id=content_type_id,
+        object_pk=Cast(OuterRef('pk'), output_field=CharField()),
+        is_public=True,
+        is_removed=False,
+    ).order_by().values('object_pk').annotate(count=Count('pk')).values('count')
+    comment_count = Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    objects = model._default_manager.all()
+    if object_pks is not None:
+        objects = objects.filter(pk__in=object_pks)
+    return objects.exclude(comment_count=comment_count).update(comment_count=comment_count)
+
+
+def annotate_flag_totals(queryset):
+    """
+    Annotate flag_count, the number of flags of any kind on each comment.
+    A correlated subquery keeps the outer query free of a GROUP BY.
+    """
+    flag_counts = CommentFlag.objects.filter(
+        comment=OuterRef('pk')).order_by().values('comment').annotate(count=Count('pk')).values('count')
+    return queryset.annotate(flag_count=Coalesce(Subquery(flag_counts, output_field=IntegerField()), 0))
+
+
+def attach_content_objects(comments):
+    """
+    Load the objects the given comments were posted to with one query per
+    content type and cache them on the comments' content_object. Pages come
+    with their locale.
+    """
+    object_pks = {}
+    for comment in comments:
+        object_pks.setdefault(comment.content_type_id, set()).add(comment.object_pk)
+
+    objects = {}
+    for content_type_id, pks in object_pks.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            continue
+        queryset = model._default_manager.filter(pk__in=pks)
+        if issubclass(model, Page):
+            queryset = queryset.select_related('locale')
+        objects.update({(content_type_id, str(obj.pk)): obj for obj in queryset})
+
+    content_object = XtdComment._meta.get_field('content_object')
+    for comment in comments:
+        obj = objects.get((comment.content_type_id, comment.object_pk))
+        if obj is not None:
+            content_object.set_cached_value(comment, obj)
+    return comments
+
+
+def get_flagged_comment_ids(user, comment_ids):
+    """
+    Ids of the given comments the user has already flagged
+    """
+    if not user.is_authenticated or not comment_ids:
+        return set()
+    return set(CommentFlag.objects.filter(user=user, comment_id__in=comment_ids).values_list('comment_id', flat=True))
+
+
+def _comments_version_key(content_type_id, object_pk):
+    return f'comments:version:{content_type_id}:{object_pk}'
+
+
+def get_comments_cache_version(content_type_id, object_pk):
+    key = _comments_version_key(content_type_id, object_pk)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        cache.set(key, version, None)
+    return version
+
+
+def invalidate_comments_cache(content_type_id, object_pk):
+    """
+    Drop all cached comment pages of an object. The pages are not deleted;
+    their keys contain a version that is changed here.
+    """
+    cache.set(_comments_version_key(content_type_id, object_pk), time.time_ns(), None)
+
+
+def _fetch_comments_page(obj, site_id, cursor, page_size):
+    likes = Prefetch(
+        'flags', queryset=CommentFlag.objects.filter(flag=LIKEDIT_FLAG).select_related('user'), to_attr='like_flags')
+    comments = annotate_flag_counts(get_public_comments(obj, site_id)).select_related('user').prefetch_related(likes)
+
+    roots = comments.filter(level=0)
+    if cursor:
+        roots = roots.filter(thread_id__lt=cursor)
+    roots = list(roots.order_by('-thread_id')[:page_size + 1])
+    next_cursor = None
+    if len(roots) > page_size:
+        roots = roots[:page_size]
+        next_cursor = roots[-1].thread_id
+
+    replies = list(comments.filter(
+        thread_id__in=[root.thread_id for root in roots], level__gt=0).order_by('submit_date', 'pk'))
+    return roots, replies, next_cursor
+
+
+def get_comments_page(obj, request, cursor=None, page_size=None):
+    """
+    One page of the comment tree of obj, newest thread first, with the
+    per-user state the comment tree template needs.
+
+    A page holds page_size top level comments with all of their replies.
+    cursor is the thread id of the last thread on the previous page. Returns
+    (tree, next_cursor), where tree has the same shape as
+    XtdComment.tree_from_queryset.
+
+    Pages are cached for all users until a comment or flag of obj changes;
+    only the user's own flags are queried on every call. Pages are not
+    cached if the cache is private to each process, since invalidating them
+    in one process would leave the other workers showing moderated comments.
+    """
+    page_size = page_size or settings.COMMENTS_PAGE_SIZE
+    site_id = get_current_site(request).pk
+    if is_process_local_cache():
+        page = _fetch_comments_page(obj, site_id, cursor, page_size)
+    else:
+        content_type_id = ContentType.objects.get_for_model(obj).pk
+        version = get_comments_cache_version(content_type_id, obj.pk)
+        key = f'comments:page:{content_type_id}:{obj.pk}:{version}:{site_id}:{cursor or 0}:{page_size}'
+        page = cache.get(key)
+        if page is None:
+            page = _fetch_comments_page(obj, site_id, cursor, page_size)
+            cache.set(key, page, settings.COMMENTS_CACHE_TIMEOUT)
+    roots, replies, next_cursor = page
+
+    flagged_ids = get_flagged_comment_ids(request.user, [comment.pk for comment in roots + replies])
+    return build_tree(roots, replies, request.user, flagged_ids), next_cursor
+
+
+def build_tree(roots, replies, user, flagged_ids):
+    """
+    Nest replies under their parents, oldest first, so a conversation reads
+    in order. Replies are expected in submit_date order. Replies to comments
+    that are not in the tree, e.g. because they were removed, are left out.
+    """
+    nodes = {}
+    tree = []
+    for comment in roots:
+        nodes[comment.pk] = _make_node(comment, user, flagged_ids)
+        tree.append(nodes[comment.pk])
+    for comment in replies:
+        parent = nodes.get(comment.parent_id)
+        if parent:
+            nodes[comment.pk] = _make_node(comment, user, flagged_ids)
+            parent['children'].append(nodes[comment.pk])
+    return tree
+
+
+def _make_node(comment, user, flagged_ids):
+    return {
+        'comment': comment,
+        'children': [],
+        'flagged': comment.flagged_count > 0,
+        'flagged_count': comment.flagged_count,
+        'likedit_users': [xtd_settings.COMMENTS_XTD_API_USER_REPR(flag.user) for flag in comment.like_flags],
+        'can_report': user.is_authenticated and comment.user_id != user.pk and comment.pk not in flagged_ids,
+    }
+
+
+MODERATION_UPDATES = {
+    'publish': {'is_public': True},
+    'unpublish': {'is_public': False},
+    'hide': {'is_removed': True},
+    'show': {'is_removed': False},
+}
+MODERATION_ACTIONS = (*MODERATION_UPDATES, 'clear_flags')
+
+
+def moderate_comments(comment_ids, action):
+    """
+    Apply a moderation action to the given comments in one transaction.
+
+    publish, unpublish, hide and show also apply to the replies of the
+    comments and run as a single UPDATE. clear_flags deletes the flags of
+    the given comments only. Returns the number of comments or flags changed.
+    """
+    if action not in MODERATION_ACTIONS:
+        raise ValueError(f'Unknown moderation action: {action}')
+
+    with transaction.atomic():
+        if action == 'clear_flags':
+            comments = XtdComment.objects.filter(pk__in=comment_ids)
+            objects = list(comments.order_by().values_list('content_type_id', 'object_pk').distinct())
+            count, _ = CommentFlag.objects.filter(comment_id__in=comment_ids).delete()
+        else:
+            comments = XtdComment.objects.filter(Q(pk__in=comment_ids) | Q(parent_id__in=comment_ids))
+            objects = list(comments.order_by().values_list('content_type_id', 'object_pk').distinct())
+            count = comments.update(**MODERATION_UPDATES[action])
+            for content_type_id, object_pk in objects:
+                update_comment_counts(content_type_id, [object_pk])
+
+    # QuerySet.update sends no post_save signals
+    for content_type_id, object_pk in objects:
+        invalidate_comments_cache(content_type_id, object_pk)
+    return count
@@ -1,48 +1,74 @@
-from django.db.models import Q
+from django.core.paginator import Paginator
+from django.db.models import Count, Q
 from django.contrib import messages
 from django.shortcuts import redirect
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_POST
 from django.views.generic import TemplateView
+from django_comments.models import CommentFlag
 from django_comments.views.comments import post_comment
 from django_comments_xtd.models import XtdComment
 from django.utils.translation import ugettext as _
+from wagtail.contrib.modeladmin.views import IndexView
 
 from comments.forms import AdminCommentForm
 from comments.models import CannedResponse
+from comments.utils import MODERATION_ACTIONS, attach_content_objects, moderate_comments
+
+MODERATION_VERBS = {
+    'publish': 'published',
+    'unpublish': 'unpublished',
+    'hide': 'removed',
+    'show': 'shown',
+    'clear_flags': 'cleared',
+}
 
 
 def update(request, comment_pk, action):
-    get_comment_with_children_filter = Q(parent_id=comment_pk) | Q(pk=comment_pk)
-    comments = XtdComment.objects.filter(get_comment_with_children_filter)
-    verb = ''
-    if action == 'unpublish':
-        for comment in comments:
-            comment.is_public = False
-        verb = 'unpublished'
-    elif action == 'publish':
-        for comment in comments:
-            comment.is_public = True
-        verb = 'published'
-    elif action == 'hide':
-        for comment in comments:
-            comment.is_removed = True
-        verb = 'removed'
-    elif action == 'show':
-        for comment in comments:
-            comment.is_removed = False
-        verb = 'shown'
-    elif action == 'clear_flags':
-        comment = XtdComment.objects.get(pk=comment_pk)
-        comment.flags.all().delete()
-        verb = 'cleared'
-    XtdComment.objects.bulk_update(comments, ['is_public', 'is_removed'])
+    moderate_comments([comment_pk], action)
+    verb = MODERATION_VERBS[action]
 
     messages.success(request, _(f'The comment has been {verb} successfully!'))
 
     return redirect(request.META.get('HTTP_REFERER'))
 
 
+class CommentModerationQueueView(TemplateView):
+    """
+    Comments waiting for a moderator: flagged for removal or not public.
+    Selected comments are moderated together in one transaction.
+    """
+    template_name = 'comment_moderation_queue.html'
+    paginate_by = 200
+
+    def get_queryset(self):
+        return XtdComment.objects.annotate(
+            num_flags=Count('flags', filter=Q(flags__flag=CommentFlag.SUGGEST_REMOVAL)),
+        ).filter(
+            Q(num_flags__gt=0) | Q(is_public=False), is_removed=False,
+        ).select_related('user').order_by('-num_flags', '-submit_date')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = Paginator(self.get_queryset(), self.paginate_by).get_page(self.request.GET.get('p'))
+        context.update({
+            'page_obj': page,
+            'comments': page.object_list,
+            'actions': [(action, action.replace('_', ' ').capitalize()) for action in MODERATION_ACTIONS],
+        })
+        return context
+
+    def post(self, request, *args, **kwargs):
+        action = request.POST.get('action')
+        comment_ids = [int(pk) for pk in request.POST.getlist('comment_ids') if pk.isdigit()]
+        if action not in MODERATION_ACTIONS or not comment_ids:
+            messages.error(request, _('Select an action and at least one comment.'))
+        else:
+            moderate_comments(comment_ids, action)
+            messages.success(request, _(f'{len(comment_ids)} comments have been {MODERATION_VERBS[action]}.'))
+        return redirect(request.get_full_path())
+
+
 class CommentReplyView(TemplateView):
     template_name = 'comment_reply.html'
 
@@ -70,3 +96,28 @@ def post_admin_comment(request):
     response = post_comment(request, next='/')
     messages.success(request, _("Sent Reply successfully"))
     return response
+
+
+class CommentsIndexView(IndexView):
+    export_chunk_size = 2000
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['object_list'] = attach_content_objects(list(context['object_list']))
+        return context
+
+    def as_spreadsheet(self, queryset, spreadsheet_format):
+        return super().as_spreadsheet(self.iter_export_rows(queryset), spreadsheet_format)
+
+    def iter_export_rows(self, queryset):
+        """
+        Stream comments in chunks, resolving the content objects of each
+        chunk together.
+        """
+        chunk = []
+        for comment in queryset.iterator(chunk_size=self.export_chunk_size):
+            chunk.append(comment)
+            if len(chunk) == self.export_chunk_size:
+                yield from attach_content_objects(chunk)
+                chunk = []
+        yield from attach_content_objects(chunk)
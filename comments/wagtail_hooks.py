@@ -8,6 +8,8 @@ from .button_helpers import XtdCommentAdminButtonHelper
 from .filters import FlaggedFilter
 from .models import CannedResponse
 from .urls import urlpatterns as urls
+from .utils import annotate_flag_totals
+from .views import CommentsIndexView
 from wagtail.core import hooks
 from django.conf.urls import include, url
 
@@ -33,6 +35,7 @@ class XtdCommentAdmin(ModelAdmin):
         'article_url', 'article_language_code',
     )
     button_helper_class = XtdCommentAdminButtonHelper
+    index_view_class = CommentsIndexView
     menu_order = 601
 
     def status(self, obj):
@@ -45,14 +48,17 @@ class XtdCommentAdmin(ModelAdmin):
         return format_html(button_html)
 
     def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related('flags')
+        return annotate_flag_totals(super().get_queryset(request).select_related('user'))
 
     def num_replies(self, obj):
         return obj.nested_count
 
     def num_flags(self, obj):
-        return obj.flags.count()
+        return obj.flag_count
 
+    num_flags.admin_order_field = 'flag_count'
+
+    # content_object is resolved in bulk by CommentsIndexView
     def article(self, obj):
         return getattr(obj.content_object, 'title', 'N/A')
 
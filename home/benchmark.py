@@ -0,0 +1,199 @@
+"""
+Building blocks of the benchmark_pages management command: a generator of
+synthetic content trees that can be removed again afterwards.
+"""
+import json
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from wagtail.core.models import Locale, Page, Site
+
+from comments.models import CommentStatus
+from home.models import Article, BannerIndexPage, FooterIndexPage, Section, SectionIndexPage
+from iogt_users.models import Profile
+from messaging.models import ChatbotChannel, Message, Thread, UserThread
+from questionnaires.models import (
+    Poll, PollFormField, PollIndexPage, QuizIndexPage, SurveyIndexPage, UserSubmission,
+)
+
+User = get_user_model()
+
+POLL_CHOICES = ['Yes', 'No', 'Maybe']
+
+
+class SyntheticContent:
+    """
+    Creates sections with articles in every locale under the default site's
+    home page and its translations, polls with submissions, users who have
+    read articles and an inbox of chatbot threads for the first user.
+
+    Pages are created one by one with add_child, so the tree is exactly what
+    editors would produce. Everything created is recorded so that delete()
+    removes it again; pages that existed before, e.g. translations of the
+    home page, are left alone.
+    """
+
+    def __init__(self, run_id, seed=0, batch_size=1000, stdout=None):
+        self.run_id = run_id
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.created_locales = []
+        self.created_page_ids = []
+        self.home_pages = []
+        self.sections = []
+        self.articles = []
+        self.polls = []
+        self.users = []
+        self.chatbot = None
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def counts(self):
+        return {
+            'locales': len(self.home_pages),
+            'sections': len(self.sections),
+            'articles': len(self.articles),
+            'polls': len(self.polls),
+            'users': len(self.users),
+        }
+
+    def get_locales(self, count):
+        default_locale = Site.objects.get(is_default_site=True).root_page.locale
+        locales = [default_locale]
+        for language_code, __ in settings.WAGTAIL_CONTENT_LANGUAGES:
+            if len(locales) >= count:
+                break
+            if language_code == default_locale.language_code:
+                continue
+            locale, created = Locale.objects.get_or_create(language_code=language_code)
+            if created:
+                self.created_locales.append(locale)
+            locales.append(locale)
+        return locales
+
+    def translate(self, page, locale):
+        translation = page.get_translation_or_none(locale)
+        if translation is None:
+            translation = page.copy_for_translation(locale)
+            translation.save_revision().publish()
+            self.created_page_ids.append(translation.pk)
+        return translation.specific
+
+    def add_page(self, parent, page):
+        page.slug = slugify(page.title)
+        parent.add_child(instance=page)
+        return page
+
+    def build_pages(self, locale_count, sections_per_locale, articles_per_section, polls):
+        home_page = Site.objects.get(is_default_site=True).root_page.specific
+        section_index_page = SectionIndexPage.objects.child_of(home_page).first()
+        # Like load_v1_db.translate_index_pages; pages of every locale render
+        # e.g. the footers of their FooterIndexPage
+        other_index_pages = [
+            index_page
+            for index_page in (
+                model.objects.child_of(home_page).first()
+                for model in (BannerIndexPage, FooterIndexPage, PollIndexPage, SurveyIndexPage, QuizIndexPage)
+            )
+            if index_page
+        ]
+        for locale in self.get_locales(locale_count):
+            with transaction.atomic():
+                localized_home_page = self.translate(home_page, locale)
+                localized_index_page = self.translate(section_index_page, locale)
+                for index_page in other_index_pages:
+                    self.translate(index_page, locale)
+                self.home_pages.append(localized_home_page)
+
+                for i in range(sections_per_locale):
+                    section = self.add_page(localized_index_page, Section(
+                        title=f'Benchmark {self.run_id} section {i} {locale.language_code}'))
+                    self.created_page_ids.append(section.pk)
+                    self.sections.append(section)
+                    for j in range(articles_per_section):
+                        self.articles.append(self.add_page(section, Article(
+                            title=f'Benchmark {self.run_id} article {i}.{j} {locale.language_code}',
+                            body=[('markdown', f'Synthetic article {i}.{j} of section {i}. ' * 20)],
+                            commenting_status=CommentStatus.OPEN,
+                        )))
+            self.log(f'Created the pages of locale {locale.language_code}')
+
+        with transaction.atomic():
+            for i in range(polls):
+                poll = self.add_page(home_page, Poll(
+                    title=f'Benchmark {self.run_id} poll {i}',
+                    poll_form_fields=[
+                        PollFormField(label='Choice', field_type='radio', choices='|'.join(POLL_CHOICES))],
+                ))
+                self.created_page_ids.append(poll.pk)
+                self.polls.append(poll)
+
+    def build_users(self, count, reads_per_user):
+        password = make_password(uuid.uuid4().hex)
+        prefix = f'benchmark-{self.run_id}-'
+        User.objects.bulk_create([
+            User(username=f'{prefix}user{i}', password=password,
+                 has_filled_registration_survey=True, terms_accepted=True)
+            for i in range(count)
+        ], batch_size=self.batch_size)
+        self.users = list(User.objects.filter(username__startswith=prefix).order_by('pk'))
+        Profile.objects.bulk_create([Profile(user=user) for user in self.users], batch_size=self.batch_size)
+
+        reads = []
+        article_ids = [article.pk for article in self.articles]
+        for user in self.users:
+            for article_id in self.random.sample(article_ids, min(reads_per_user, len(article_ids))):
+                reads.append(User.read_articles.through(user_id=user.pk, article_id=article_id))
+        User.read_articles.through.objects.bulk_create(reads, batch_size=self.batch_size)
+
+    def build_submissions(self, submissions_per_poll):
+        for poll in self.polls:
+            clean_name = poll.poll_form_fields.get().clean_name
+            UserSubmission.objects.bulk_create([
+                UserSubmission(
+                    page=poll,
+                    user=self.users[i % len(self.users)] if self.users else None,
+                    form_data=json.dumps({clean_name: self.random.choice(POLL_CHOICES)}),
+                )
+                for i in range(submissions_per_poll)
+            ], batch_size=self.batch_size)
+
+    def build_inbox(self, threads, messages_per_thread):
+        if not self.users:
+            return
+        user = self.users[0]
+        self.chatbot = ChatbotChannel.objects.create(
+            display_name=f'Benchmark {self.run_id}', request_url='http://localhost/')
+        now = timezone.now()
+        for i in range(threads):
+            thread = Thread.objects.create(
+                chatbot=self.chatbot, subject=f'Benchmark thread {i}', last_message_at=now - timedelta(minutes=i))
+            UserThread.objects.create(user=user, thread=thread, is_read=i % 2 == 0)
+            Message.objects.bulk_create([
+                Message(thread=thread, sender=user if j % 2 else None, text=f'Message {j} of thread {i}')
+                for j in range(messages_per_thread)
+            ])
+
+    def delete(self):
+        if self.chatbot:
+            Thread.objects.filter(chatbot=self.chatbot).delete()
+            self.chatbot.delete()
+        User.objects.filter(pk__in=[user.pk for user in self.users]).delete()
+        # Newest first, so sections go before the translated index pages
+        # they were added to
+        for page_id in reversed(self.created_page_ids):
+            page = Page.objects.filter(pk=page_id).first()
+            if page:
+                page.delete()
+        for locale in self.created_locales:
+            locale.delete()
@@ -0,0 +1,147 @@
+import json
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from home.benchmark import SyntheticContent
+from messaging.loadtest import Metrics
+
+
+class Command(BaseCommand):
+    """
+    This command benchmarks page rendering on a large synthetic content
+    tree. It creates sections and articles in every locale, polls with many
+    submissions, users who have read articles and an inbox of chatbot
+    threads, then renders the home, section, article, search, poll and
+    inbox pages as an anonymous and as a logged in user through the Django
+    test client. Latency percentiles and query counts are reported per page
+    and can be saved as JSON and compared with an earlier run.
+
+    It writes to the configured database and deletes the generated data
+    afterwards, so never run it against production. Use PostgreSQL for
+    numbers that carry over to production.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locales', type=int, default=len(settings.WAGTAIL_CONTENT_LANGUAGES),
+                            help='Number of locales to create content in.')
+        parser.add_argument('--sections', type=int, default=40, help='Sections per locale.')
+        parser.add_argument('--articles', type=int, default=5, help='Articles per section.')
+        parser.add_argument('--polls', type=int, default=5, help='Number of polls.')
+        parser.add_argument('--submissions', type=int, default=1000, help='Submissions per poll.')
+        parser.add_argument('--users', type=int, default=500, help='Number of users.')
+        parser.add_argument('--reads', type=int, default=20, help='Articles read by each user.')
+        parser.add_argument('--threads', type=int, default=50, help='Threads in the inbox of the logged in user.')
+        parser.add_argument('--messages', type=int, default=5, help='Messages per thread.')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed renders of each page.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed renders of each page before timing.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the choice of rendered pages.')
+        parser.add_argument('--output', help='Also write the report as JSON to this file.')
+        parser.add_argument('--compare', help='JSON report of an earlier run to compare with.')
+        parser.add_argument('--keep-data', action='store_true', help='Do not delete the generated data.')
+        parser.add_argument('--force', action='store_true', help='Run even if DEBUG is off.')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('Refusing to write benchmark data with DEBUG off. Use --force to run anyway.')
+
+        run_id = uuid.uuid4().hex[:8]
+        started_at = timezone.now()
+        content = SyntheticContent(run_id, seed=options['seed'], stdout=self.stdout)
+        test_settings = override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver'])
+        test_settings.enable()
+        try:
+            start = time.perf_counter()
+            content.build_pages(options['locales'], options['sections'], options['articles'], options['polls'])
+            content.build_users(options['users'], options['reads'])
+            content.build_submissions(options['submissions'])
+            content.build_inbox(options['threads'], options['messages'])
+            setup_seconds = time.perf_counter() - start
+            self.stdout.write(f'Created {content.counts()} in {setup_seconds:.1f}s')
+
+            metrics = self._render_pages(content, options)
+        finally:
+            test_settings.disable()
+            if not options['keep_data']:
+                content.delete()
+
+        report = {
+            'run_id': run_id,
+            'started_at': started_at.isoformat(),
+            'database': connection.vendor,
+            'commit_hash': settings.COMMIT_HASH,
+            'content': content.counts(),
+            'setup_seconds': round(setup_seconds, 1),
+            'iterations': options['iterations'],
+            'operations': metrics.summary(),
+        }
+        self._print_report(report)
+        if options['compare']:
+            with open(options['compare']) as f:
+                self._print_comparison(report, json.load(f))
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+    def _get_urls(self, content, options):
+        pick = content.random.choice
+        sample_size = options['iterations']
+        urls = {
+            'home': [page.url for page in content.home_pages],
+            'section': [pick(content.sections).url for __ in range(sample_size)] if content.sections else [],
+            'article': [pick(content.articles).url for __ in range(sample_size)] if content.articles else [],
+            'search': [f"{reverse('search')}?query=Benchmark+{content.run_id}+article"],
+            'poll': [page.url for page in content.polls],
+        }
+        return {name: page_urls for name, page_urls in urls.items() if page_urls}
+
+    def _render_pages(self, content, options):
+        metrics = Metrics()
+        # Failed renders are counted as errors instead of ending the run
+        anonymous = Client(raise_request_exception=False)
+        logged_in = Client(raise_request_exception=False)
+        clients = [('anonymous', anonymous)]
+        if content.users:
+            logged_in.force_login(content.users[0])
+            clients.append(('logged_in', logged_in))
+
+        urls = self._get_urls(content, options)
+        for client_name, client in clients:
+            client_urls = dict(urls)
+            if client is logged_in and content.chatbot:
+                client_urls['inbox'] = [reverse('messaging:inbox')]
+            for page_name, page_urls in client_urls.items():
+                for i in range(options['warmup']):
+                    client.get(page_urls[i % len(page_urls)])
+                for i in range(options['iterations']):
+                    metrics.measure(f'{page_name}:{client_name}', client.get, page_urls[i % len(page_urls)])
+        return metrics
+
+    def _print_report(self, report):
+        self.stdout.write(f"Rendered on {report['database']} with {report['content']}")
+        columns = ('count', 'errors', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'avg_queries', 'max_queries')
+        self.stdout.write(f"{'page':<20}" + ''.join(f'{column:>12}' for column in columns))
+        for operation, stats in report['operations'].items():
+            self.stdout.write(f'{operation:<20}' + ''.join(f'{str(stats[column]):>12}' for column in columns))
+
+    def _print_comparison(self, report, baseline):
+        self.stdout.write(f"Compared with run {baseline.get('run_id')} ({baseline.get('content')})")
+        columns = ('p50_ms', 'p90_ms', 'avg_queries')
+        self.stdout.write(f"{'page':<20}" + ''.join(f'{column:>16}' for column in columns))
+        for operation, stats in report['operations'].items():
+            baseline_stats = baseline.get('operations', {}).get(operation)
+            if not baseline_stats:
+                continue
+            cells = []
+            for column in columns:
+                if stats[column] is None or baseline_stats[column] is None:
+                    cells.append(f'{"-":>16}')
+                else:
+                    cells.append(f'{stats[column] - baseline_stats[column]:>+16.1f}')
+            self.stdout.write(f'{operation:<20}' + ''.join(cells))
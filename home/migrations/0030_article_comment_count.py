@@ -0,0 +1,40 @@
+# Generated by Django 3.1.14 on 2026-10-19 02:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce
+
+
+def count_article_comments(apps, schema_editor):
+    Article = apps.get_model('home', 'Article')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    XtdComment = apps.get_model('django_comments_xtd', 'XtdComment')
+
+    content_type = ContentType.objects.filter(app_label='home', model='article').first()
+    if content_type is None:
+        return
+    counts = XtdComment.objects.filter(
+        content_type=content_type,
+        object_pk=Cast(OuterRef('pk'), output_field=models.CharField()),
+        is_public=True,
+        is_removed=False,
+    ).order_by().values('object_pk').annotate(count=Count('pk')).values('count')
+    Article.objects.update(comment_count=Coalesce(Subquery(counts, output_field=models.IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0029_merge_20211111_1852'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('django_comments_xtd', '0008_auto_20200920_2037'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_article_comments, migrations.RunPython.noop),
+    ]
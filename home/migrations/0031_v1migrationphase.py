@@ -0,0 +1,22 @@
+# Generated by Django 3.1.14 on 2026-10-19 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0030_article_comment_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='V1MigrationPhase',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.DurationField(blank=True, null=True)),
+            ],
+        ),
+    ]
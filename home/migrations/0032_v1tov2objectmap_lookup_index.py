@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-19 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0031_v1migrationphase'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='v1tov2objectmap',
+            index=models.Index(fields=['content_type', 'v1_object_id', 'extra'], name='home_v1tov2_content_11fd23_idx'),
+        ),
+    ]
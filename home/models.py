@@ -301,6 +301,7 @@ class Article(Page, PageUtilsMixin, CommentableMixin, TitleIconMixin):
         ('chat_bot', ChatBotButtonBlock()),
     ])
     show_in_menus_default = True
+    exclude_fields_in_copy = CommentableMixin.comments_exclude_fields_in_copy
 
     def _get_child_block_values(self, block_type):
         searchable_content = []
@@ -980,14 +981,14 @@ class V1ToV2ObjectMap(models.Model):
     content_object = GenericForeignKey('content_type', 'object_id')
     extra = models.CharField(max_length=100, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'v1_object_id', 'extra']),
+        ]
+
     def __str__(self):
         return f'{self.v1_object_id} -> {self.object_id}'
 
-    @classmethod
-    def create_map(cls, content_object, v1_object_id):
-        v1_to_v2_object_map = cls(content_object=content_object, v1_object_id=v1_object_id)
-        v1_to_v2_object_map.save()
-
     @classmethod
     def get_v1_id(cls, klass, object_id, extra=None):
         content_type = ContentType.objects.get_for_model(klass)
@@ -1014,6 +1015,19 @@ class V1ToV2ObjectMap(models.Model):
         return obj
 
 
+class V1MigrationPhase(models.Model):
+    """
+    A completed step of the v1 migration commands, so an interrupted
+    migration can be resumed with --resume instead of starting over.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    duration = models.DurationField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
 class SVGToPNGMap(models.Model):
     svg_path = models.TextField()
     fill_color = models.TextField(null=True)
@@ -4,10 +4,12 @@ from wagtail.core.models import Site
 from home.models import ThemeSettings
 from home.templatetags.image_tags import svg_to_png_url
 from iogt import settings
+from iogt.metrics import timed_tag
 
 register = template.Library()
 
 
+@timed_tag(register)
 @register.inclusion_tag('generic_components/primary_button.html')
 def primary_button(title, extra_classnames='', href=None, icon_path=None,
                    font_color=None, background_color=None, is_svg_icon=False):
@@ -3,11 +3,13 @@ from django.urls import translate_url
 from wagtail.core.models import Locale, Site
 
 from home.models import SectionIndexPage, Section, Article, FooterIndexPage
+from iogt.metrics import timed_tag
 from iogt.settings.base import LANGUAGES
 
 register = template.Library()
 
 
+@timed_tag(register)
 @register.inclusion_tag('home/tags/language_switcher.html', takes_context=True)
 def language_switcher(context, page):
     if page:
@@ -27,6 +29,7 @@ def render_previous_next_buttons(page):
     }
 
 
+@timed_tag(register)
 @register.inclusion_tag('home/tags/footer.html', takes_context=True)
 def footer(context):
     return {
@@ -35,6 +38,7 @@ def footer(context):
     }
 
 
+@timed_tag(register)
 @register.inclusion_tag('home/tags/top_level_sections.html', takes_context=True)
 def top_level_sections(context):
     return {
@@ -84,6 +88,7 @@ def render_user_progress(user_progress, show_count=True):
     }
 
 
+@timed_tag(register)
 @register.inclusion_tag('home/tags/is_completed.html', takes_context=True)
 def render_is_content_completed(context, content):
     content = content.specific
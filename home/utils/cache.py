@@ -0,0 +1,10 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_process_local_cache(alias='default'):
+    """
+    Whether the cache is private to this process, like the LocMemCache used when CACHES is not configured.
+    Invalidating an entry of such a cache leaves the copies of other worker processes stale.
+    """
+    return isinstance(caches[alias], LocMemCache)
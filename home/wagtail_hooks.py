@@ -52,6 +52,11 @@ def check_group(page, request, serve_args, serve_kwargs):
                         raise PermissionDenied
 
 
+@hooks.register('before_serve_page')
+def record_page_for_metrics(page, request, serve_args, serve_kwargs):
+    request.metrics_page = page
+
+
 @hooks.register('construct_explorer_page_queryset')
 def sort_page_listing_by_path(parent_page, pages, request):
     if isinstance(parent_page, (
@@ -0,0 +1,204 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django import template
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.db import connections
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    """
+    What one request cost: DB queries and their time, cache hits and misses
+    and, per instrumented template tag, render time and queries. Tag timings
+    include the tags rendered inside them.
+    """
+
+    def __init__(self):
+        self.query_count = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.tags = defaultdict(lambda: [0, 0.0, 0])
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_count += 1
+            self.query_time += time.perf_counter() - start
+
+    def record_cache_access(self, hit, count=1):
+        if hit:
+            self.cache_hits += count
+        else:
+            self.cache_misses += count
+
+    def record_tag(self, name, seconds, query_count):
+        stats = self.tags[name]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] += query_count
+
+
+class MetricsRegistry:
+    """
+    Totals of all requests served by this process, by view and by template
+    tag, in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(lambda: defaultdict(float))
+        self.tags = defaultdict(lambda: defaultdict(float))
+
+    def add(self, view_name, duration, metrics, budget_exceeded=False):
+        with self.lock:
+            view = self.views[view_name]
+            view['requests'] += 1
+            view['duration'] += duration
+            view['queries'] += metrics.query_count
+            view['query_time'] += metrics.query_time
+            view['cache_hits'] += metrics.cache_hits
+            view['cache_misses'] += metrics.cache_misses
+            view['budget_violations'] += int(budget_exceeded)
+            for name, (count, seconds, query_count) in metrics.tags.items():
+                tag = self.tags[name]
+                tag['renders'] += count
+                tag['duration'] += seconds
+                tag['queries'] += query_count
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+            self.tags.clear()
+
+    def render(self):
+        view_metrics = [
+            ('iogt_requests_total', 'requests', 'Requests served'),
+            ('iogt_request_duration_seconds_total', 'duration', 'Time spent serving requests'),
+            ('iogt_db_queries_total', 'queries', 'DB queries run'),
+            ('iogt_db_query_duration_seconds_total', 'query_time', 'Time spent in DB queries'),
+            ('iogt_cache_hits_total', 'cache_hits', 'Cache hits'),
+            ('iogt_cache_misses_total', 'cache_misses', 'Cache misses'),
+            ('iogt_query_budget_violations_total', 'budget_violations', 'Requests over their query budget'),
+        ]
+        tag_metrics = [
+            ('iogt_template_tag_renders_total', 'renders', 'Template tag renders'),
+            ('iogt_template_tag_duration_seconds_total', 'duration', 'Time spent rendering template tags'),
+            ('iogt_template_tag_db_queries_total', 'queries', 'DB queries run by template tags'),
+        ]
+        with self.lock:
+            lines = []
+            for label, series, metrics in [('view', self.views, view_metrics), ('tag', self.tags, tag_metrics)]:
+                for metric, key, help_text in metrics:
+                    lines.append(f'# HELP {metric} {help_text}')
+                    lines.append(f'# TYPE {metric} counter')
+                    for name, values in sorted(series.items()):
+                        lines.append(f'{metric}{{{label}="{_escape_label(name)}"}} {values[key]:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+def get_current_metrics():
+    return getattr(_local, 'metrics', None)
+
+
+@contextmanager
+def _track_cache(metrics):
+    # Backends are per thread, so wrapping this thread's instance for the
+    # duration of the request does not affect other requests.
+    backend = caches['default']
+
+    def get(key, default=None, version=None):
+        value = backend.__class__.get(backend, key, default=default, version=version)
+        metrics.record_cache_access(value is not default)
+        return value
+
+    def get_many(keys, version=None):
+        values = backend.__class__.get_many(backend, keys, version=version)
+        metrics.record_cache_access(True, len(values))
+        metrics.record_cache_access(False, len(keys) - len(values))
+        return values
+
+    backend.get = get
+    # BaseCache.get_many calls get for each key, which already counts them
+    wraps_get_many = type(backend).get_many is not BaseCache.get_many
+    if wraps_get_many:
+        backend.get_many = get_many
+    try:
+        yield
+    finally:
+        del backend.get
+        if wraps_get_many:
+            del backend.get_many
+
+
+@contextmanager
+def track_request():
+    """
+    Collect the RequestMetrics of the code run inside the block in this
+    thread.
+    """
+    metrics = RequestMetrics()
+    previous, _local.metrics = get_current_metrics(), metrics
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            stack.enter_context(_track_cache(metrics))
+            yield metrics
+    finally:
+        _local.metrics = previous
+
+
+class TimedNode(template.Node):
+    def __init__(self, name, node):
+        self.name = name
+        self.node = node
+
+    def render(self, context):
+        metrics = get_current_metrics()
+        if metrics is None:
+            return self.node.render(context)
+
+        query_count = metrics.query_count
+        start = time.perf_counter()
+        try:
+            return self.node.render(context)
+        finally:
+            metrics.record_tag(self.name, time.perf_counter() - start, metrics.query_count - query_count)
+
+
+def timed_tag(register):
+    """
+    Records the render time and queries of a template tag in the metrics of
+    the current request. Goes above the @register.inclusion_tag or
+    @register.simple_tag decorator:
+
+        @timed_tag(register)
+        @register.inclusion_tag('home/tags/footer.html', takes_context=True)
+        def footer(context):
+    """
+    def decorator(func):
+        name = getattr(func, '_decorated_function', func).__name__
+        compile_func = register.tags[name]
+
+        def timed_compile_func(parser, token):
+            return TimedNode(name, compile_func(parser, token))
+
+        register.tags[name] = timed_compile_func
+        return func
+
+    return decorator
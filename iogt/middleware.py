@@ -1,4 +1,12 @@
+import logging
+import time
+
+from django.conf import settings
+
 from home.models import SiteSettings
+from iogt.metrics import registry, track_request
+
+logger = logging.getLogger(__name__)
 
 
 class CacheControlMiddleware:
@@ -12,3 +20,42 @@ class CacheControlMiddleware:
             response['Cache-Control'] = 'no-transform'
 
         return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the queries, cache accesses and template tag timings of each
+    request in iogt.metrics.registry, by view name. Wagtail pages are
+    recorded as wagtail_serve:<app_label>.<model_name>.
+
+    Requests running more queries than settings.REQUEST_QUERY_BUDGETS allows
+    for their view are logged.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with track_request() as metrics:
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        view_name = self.get_view_name(request)
+        budget = settings.REQUEST_QUERY_BUDGETS.get(view_name)
+        budget_exceeded = budget is not None and metrics.query_count > budget
+        if budget_exceeded:
+            logger.warning(
+                'Query budget exceeded: view=%s, path=%s, queries=%s, budget=%s',
+                view_name, request.path, metrics.query_count, budget)
+        registry.add(view_name, duration, metrics, budget_exceeded=budget_exceeded)
+
+        return response
+
+    def get_view_name(self, request):
+        page = getattr(request, 'metrics_page', None)
+        if page is not None:
+            return f'wagtail_serve:{page._meta.label_lower}'
+        if request.resolver_match:
+            return request.resolver_match.view_name
+        return 'unresolved'
@@ -75,6 +75,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'iogt.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -226,6 +227,11 @@ SITE_ID = 1
 # Comments
 COMMENTS_APP = 'django_comments_xtd'
 COMMENTS_XTD_MAX_THREAD_LEVEL = 1
+# Number of top level comments shown per page under an article
+COMMENTS_PAGE_SIZE = 5
+# Seconds a page of comments is cached; pages are also invalidated whenever comments change.
+# Pages are only cached if CACHES configures a backend shared by all processes, e.g. memcached
+COMMENTS_CACHE_TIMEOUT = 60 * 60
 
 # Miscellaneous
 LOGIN_REDIRECT_URL = "user_profile"
@@ -371,8 +377,34 @@ LOCALE_PATHS = [
 
 # ========= Rapid Pro =================
 RAPIDPRO_BOT_USER_ID = os.getenv('RAPIDPRO_BOT_USER_ID')
+if RAPIDPRO_BOT_USER_ID:
+    RAPIDPRO_BOT_USER_ID = int(RAPIDPRO_BOT_USER_ID)
 RAPIDPRO_BOT_USER_USERNAME = os.getenv('RAPIDPRO_BOT_USER_USERNAME')
 RAPIDPRO_BOT_USER_PASSWORD = os.getenv('RAPIDPRO_BOT_USER_PASSWORD')
+# When set, the webhook also accepts "Authorization: Token <RAPIDPRO_WEBHOOK_TOKEN>",
+# which is much cheaper to verify than basic authentication
+RAPIDPRO_WEBHOOK_TOKEN = os.getenv('RAPIDPRO_WEBHOOK_TOKEN')
+
+# Outgoing replies are queued in messaging.OutboxMessage and delivered by the
+# deliver_rapidpro_outbox management command
+RAPIDPRO_REQUEST_TIMEOUT = int(os.getenv('RAPIDPRO_REQUEST_TIMEOUT', 10))
+RAPIDPRO_HTTP_POOL_SIZE = int(os.getenv('RAPIDPRO_HTTP_POOL_SIZE', 10))
+RAPIDPRO_OUTBOX_CONCURRENCY = int(os.getenv('RAPIDPRO_OUTBOX_CONCURRENCY', 8))
+RAPIDPRO_OUTBOX_BATCH_SIZE = int(os.getenv('RAPIDPRO_OUTBOX_BATCH_SIZE', 100))
+RAPIDPRO_OUTBOX_MAX_ATTEMPTS = int(os.getenv('RAPIDPRO_OUTBOX_MAX_ATTEMPTS', 8))
+RAPIDPRO_OUTBOX_BACKOFF_SECONDS = int(os.getenv('RAPIDPRO_OUTBOX_BACKOFF_SECONDS', 5))
+RAPIDPRO_OUTBOX_MAX_BACKOFF_SECONDS = int(os.getenv('RAPIDPRO_OUTBOX_MAX_BACKOFF_SECONDS', 3600))
+RAPIDPRO_OUTBOX_LEASE_SECONDS = int(os.getenv('RAPIDPRO_OUTBOX_LEASE_SECONDS', 60))
+
+# Chatbot attachments are fetched by the download_chatbot_attachments management command
+RAPIDPRO_ATTACHMENT_MAX_SIZE = int(os.getenv('RAPIDPRO_ATTACHMENT_MAX_SIZE', 20 * 1024 * 1024))
+RAPIDPRO_ATTACHMENT_CHUNK_SIZE = int(os.getenv('RAPIDPRO_ATTACHMENT_CHUNK_SIZE', 64 * 1024))
+RAPIDPRO_ATTACHMENT_MAX_ATTEMPTS = int(os.getenv('RAPIDPRO_ATTACHMENT_MAX_ATTEMPTS', 3))
+RAPIDPRO_ATTACHMENT_CONCURRENCY = int(os.getenv('RAPIDPRO_ATTACHMENT_CONCURRENCY', 4))
+RAPIDPRO_ATTACHMENT_BATCH_SIZE = int(os.getenv('RAPIDPRO_ATTACHMENT_BATCH_SIZE', 20))
+# Downloads still running after this many seconds are considered abandoned and claimed again,
+# so it must be longer than the slowest download of a RAPIDPRO_ATTACHMENT_MAX_SIZE file
+RAPIDPRO_ATTACHMENT_LEASE_SECONDS = int(os.getenv('RAPIDPRO_ATTACHMENT_LEASE_SECONDS', 30 * 60))
 
 # Wagtail transfer default values. Override these in local.py
 WAGTAILTRANSFER_SECRET_KEY = os.getenv('WAGTAILTRANSFER_SECRET_KEY')
@@ -403,3 +435,10 @@ EXPORT_FILENAME_TIMESTAMP_FORMAT = '%Y-%m-%dT%H%M%S'
 WAGTAILMARKDOWN = {
     'allowed_tags': ['i', 'b'],
 }
+
+# ========= Request metrics =================
+# Maximum number of queries per request by view name, e.g. {'wagtail_serve:home.article': 40};
+# requests over budget are logged. Wagtail pages are named wagtail_serve:<app_label>.<model_name>
+REQUEST_QUERY_BUDGETS = {}
+# Clients allowed to scrape the metrics endpoint
+REQUEST_METRICS_ALLOWED_IPS = os.getenv('REQUEST_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
@@ -1,2 +1,10 @@
+import os
+
 COMMENTS_ALLOW_PROFANITIES = True
+# Checked for every language, in addition to PROFANITIES_DIR/<language code>.txt
 PROFANITIES_LIST = ('crap', 'hell')
+# One <language code>.txt file per language, one term per line
+PROFANITIES_DIR = os.getenv('PROFANITIES_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'profanities'))
+# Seconds between checks for changed word lists
+PROFANITIES_RELOAD_INTERVAL = int(os.getenv('PROFANITIES_RELOAD_INTERVAL', '30'))
@@ -0,0 +1,64 @@
+from django import template
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Engine
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from iogt.metrics import registry, timed_tag, track_request
+
+register = template.Library()
+
+
+@timed_tag(register)
+@register.simple_tag
+def count_users():
+    return get_user_model().objects.count()
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        registry.clear()
+
+    def test_queries_are_recorded_by_view_name(self):
+        self.client.get(reverse('sitemap'))
+
+        self.assertEqual(registry.views['sitemap']['requests'], 1)
+        self.assertGreater(registry.views['sitemap']['queries'], 0)
+
+    @override_settings(REQUEST_QUERY_BUDGETS={'sitemap': 0})
+    def test_requests_over_query_budget_are_logged(self):
+        with self.assertLogs('iogt.middleware', 'WARNING') as logs:
+            self.client.get(reverse('sitemap'))
+
+        self.assertIn('view=sitemap', logs.output[0])
+        self.assertEqual(registry.views['sitemap']['budget_violations'], 1)
+
+    def test_timed_tag_records_render_time_and_queries(self):
+        engine = Engine()
+        engine.template_builtins.append(register)
+
+        with track_request() as metrics:
+            output = engine.from_string('{% count_users %}').render(Context())
+
+        self.assertEqual(output, '0')
+        count, seconds, query_count = metrics.tags['count_users']
+        self.assertEqual((count, query_count), (1, 1))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_cache_get_many_counts_each_key_once(self):
+        cache.set('hit', 1)
+
+        with track_request() as metrics:
+            cache.get_many(['hit', 'miss'])
+
+        self.assertEqual((metrics.cache_hits, metrics.cache_misses), (1, 1))
+
+    def test_metrics_endpoint_is_only_served_to_allowed_clients(self):
+        self.client.get(reverse('sitemap'))
+
+        response = self.client.get(reverse('metrics'))
+        remote_response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+
+        self.assertContains(response, 'iogt_requests_total{view="sitemap"} 1')
+        self.assertEqual(remote_response.status_code, 403)
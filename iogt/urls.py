@@ -11,7 +11,7 @@ from wagtail.core import urls as wagtail_urls
 from wagtail.documents import urls as wagtaildocs_urls
 from home import views as pwa_views
 from wagtail_transfer import urls as wagtailtransfer_urls
-from iogt.views import TransitionPageView, SitemapAPIView
+from iogt.views import TransitionPageView, SitemapAPIView, MetricsView
 
 urlpatterns = [
     path('django-admin/', admin.site.urls),
@@ -31,6 +31,7 @@ urlpatterns = [
     *i18n_patterns(path('messaging/', include('messaging.urls'), name='messaging-urls')),
     path('wagtail-transfer/', include(wagtailtransfer_urls)),
     path('sitemap/', SitemapAPIView.as_view(), name='sitemap'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path("manifest.webmanifest", get_manifest, name="manifest"),
 ]
 
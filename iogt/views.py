@@ -1,10 +1,14 @@
 from django.contrib.admin.utils import flatten
+from django.conf import settings
 from django.contrib.sites.shortcuts import get_current_site
+from django.http import HttpResponse, HttpResponseForbidden
 from django.urls import reverse
+from django.views import View
 from django.views.generic import TemplateView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from iogt.metrics import registry
 from questionnaires.models import Poll, Survey, Quiz
 
 
@@ -47,3 +51,10 @@ class SitemapAPIView(APIView):
             home_page_urls + section_urls + article_urls + footer_urls + poll_urls + survey_urls + quiz_urls)
 
         return Response(sitemap)
+
+
+class MetricsView(View):
+    def get(self, request):
+        if request.META.get('REMOTE_ADDR') not in settings.REQUEST_METRICS_ALLOWED_IPS:
+            return HttpResponseForbidden()
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4')
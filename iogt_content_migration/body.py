@@ -0,0 +1,122 @@
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from html.parser import HTMLParser
+
+
+class TagCollector(HTMLParser):
+    """
+    Collects the names of the start tags of an HTML fragment without
+    building a tree.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.tags = []
+
+    def handle_starttag(self, tag, attrs):
+        self.tags.append(tag)
+
+
+class BodyTransformer:
+    """
+    Maps v1 StreamField blocks to v2 in a single pass. It only needs the v1
+    to v2 ids of images, media and pages, so it can run in worker
+    processes; what would go in the post migration report is returned as
+    (kind, value) findings.
+    """
+
+    def __init__(self, allowed_tags, v1_domains, image_ids, media_ids, page_ids):
+        self.allowed_tags = frozenset(allowed_tags)
+        self.domains_regex = re.compile(
+            '|'.join(re.escape(domain) for domain in sorted(v1_domains, key=len, reverse=True))
+        ) if v1_domains else None
+        self.image_ids = image_ids
+        self.media_ids = media_ids
+        self.page_ids = page_ids
+
+    def get_unsupported_html_tags(self, value):
+        parser = TagCollector()
+        parser.feed(value)
+        parser.close()
+        return [tag for tag in parser.tags if tag not in self.allowed_tags]
+
+    def has_internal_links(self, value):
+        return bool(self.domains_regex and self.domains_regex.search(value))
+
+    def transform(self, body, introduction=None):
+        """
+        Returns the v2 body as JSON and a list of findings. introduction, if
+        given, becomes the first paragraph.
+        """
+        blocks = json.loads(body)
+        findings = []
+        for block in blocks:
+            if block['type'] == 'paragraph':
+                unsupported_html_tags = self.get_unsupported_html_tags(block['value'])
+                if unsupported_html_tags:
+                    block['type'] = 'paragraph_v1_legacy'
+                    findings.append(('unsupported_tags', unsupported_html_tags))
+                else:
+                    block['type'] = 'markdown'
+
+                if self.has_internal_links(block['value']):
+                    findings.append(('internal_links', None))
+
+            elif block['type'] == 'richtext':
+                block['type'] = 'paragraph'
+
+                if self.has_internal_links(block['value']):
+                    findings.append(('internal_links', None))
+
+            elif block['type'] == 'image':
+                image_id = self.image_ids.get(block['value'])
+                if image_id is None:
+                    findings.append(('invalid_image_id', block['value']))
+                block['value'] = image_id
+
+            elif block['type'] == 'media':
+                media_id = self.media_ids.get(block['value'])
+                if media_id is None:
+                    findings.append(('invalid_media_id', block['value']))
+                block['value'] = media_id
+
+            elif block['type'] == 'page':
+                block['type'] = 'page_button'
+                page_id = self.page_ids.get(block['value'])
+                if page_id is None:
+                    findings.append(('invalid_page_id', block['value']))
+                block['value'] = {'page': page_id, 'text': ''}
+
+        if introduction:
+            blocks = [{'type': 'paragraph', 'value': introduction}] + blocks
+        return json.dumps(blocks), findings
+
+
+_transformer = None
+
+
+def _init_worker(*args):
+    global _transformer
+    _transformer = BodyTransformer(*args)
+
+
+def _transform(item):
+    return _transformer.transform(*item)
+
+
+@contextmanager
+def body_transformer(allowed_tags, v1_domains, image_ids, media_ids, page_ids, workers=1):
+    """
+    Yields a function mapping a list of (body, introduction) pairs to
+    BodyTransformer.transform results, spread over worker processes when
+    workers > 1.
+    """
+    args = (allowed_tags, v1_domains, image_ids, media_ids, page_ids)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=args) as executor:
+            yield lambda items: list(executor.map(_transform, items, chunksize=max(1, len(items) // workers)))
+    else:
+        transformer = BodyTransformer(*args)
+        yield lambda items: [transformer.transform(*item) for item in items]
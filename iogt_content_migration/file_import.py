@@ -0,0 +1,133 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files import File
+from django.db import connections, router, transaction
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    sha1 = hashlib.sha1()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha1.update(chunk)
+            size += len(chunk)
+    return sha1.hexdigest(), size
+
+
+class BulkFileImporter:
+    """
+    Imports v1 documents, media or images in batches. Files are hashed and
+    copied to storage by a pool of worker threads, which also probe image
+    dimensions, and the objects are inserted with bulk_create.
+
+    A file with the same content as one imported before is not stored
+    again: its v1 row still gets an object of its own, whose file field
+    points at the stored file of the first copy. Objects are inserted
+    without Model.save(), so they are not indexed for search.
+    """
+    # Attributes derived from the file content, shared by duplicates
+    file_attributes = ('width', 'height')
+
+    def __init__(self, model, object_map, batch_size=500, workers=4):
+        self.model = model
+        self.object_map = object_map
+        self.batch_size = batch_size
+        self.workers = workers
+        self.pending = []
+        self.objects_by_hash = {}
+
+    def add(self, instance, v1_object_id, files, tags=None):
+        """
+        Queue instance for insertion. files maps file field names to source
+        paths; duplicates are detected on the first one.
+        """
+        self.pending.append((instance, v1_object_id, files, tags))
+        if len(self.pending) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """
+        Import all queued objects. Returns (v1_object_id, object, original)
+        tuples, where original is the object whose stored file the object
+        shares, or None if its file was stored for it.
+        """
+        pending, self.pending = self.pending, []
+        if not pending:
+            return []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            hashes = list(pool.map(hash_file, [next(iter(files.values())) for __, __, files, __ in pending]))
+
+            originals, stored, batch_originals = [], [], {}
+            for item, (file_hash, file_size) in zip(pending, hashes):
+                instance, __, files, __ = item
+                if hasattr(instance, 'file_hash'):
+                    instance.file_hash = file_hash
+                    instance.file_size = file_size
+                original = self.objects_by_hash.get(file_hash) or batch_originals.get(file_hash)
+                if original is None:
+                    batch_originals[file_hash] = instance
+                    stored.append((item, files))
+                else:
+                    # Other files, e.g. media thumbnails, may still differ
+                    field_name = next(iter(files))
+                    stored.append((item, {name: path for name, path in files.items() if name != field_name}))
+                originals.append(original)
+
+            list(pool.map(self.store_files, stored))
+
+        # The files of duplicates come from batch originals once they are stored
+        for (instance, __, files, __), original in zip(pending, originals):
+            if original is not None:
+                self.share_file(instance, original, next(iter(files)))
+
+        try:
+            with transaction.atomic():
+                self.insert([instance for instance, *__ in pending])
+                for instance, v1_object_id, __, __ in pending:
+                    self.object_map.create_map(instance, v1_object_id)
+                self.object_map.flush()
+        except Exception:
+            for item, files in stored:
+                self.delete_files(item[0], files)
+            raise
+        self.objects_by_hash.update({file_hash: instance for file_hash, instance in batch_originals.items()})
+
+        results = []
+        for (instance, v1_object_id, __, tags), original in zip(pending, originals):
+            if tags:
+                instance.tags.add(*tags)
+            results.append((v1_object_id, instance, original))
+        return results
+
+    def insert(self, instances):
+        connection = connections[router.db_for_write(self.model)]
+        if connection.features.can_return_rows_from_bulk_insert:
+            self.model.objects.bulk_create(instances, batch_size=self.batch_size)
+        else:
+            for instance in instances:
+                instance.save()
+
+    def store_files(self, item_files):
+        (instance, __, __, __), files = item_files
+        for field_name, path in files.items():
+            with open(path, 'rb') as f:
+                getattr(instance, field_name).save(os.path.basename(path), File(f), save=False)
+
+    def share_file(self, instance, original, field_name):
+        # Setting the name on the FieldFile does not read the file again
+        getattr(instance, field_name).name = getattr(original, field_name).name
+        for attribute in self.file_attributes:
+            if hasattr(original, attribute):
+                setattr(instance, attribute, getattr(original, attribute))
+
+    def delete_files(self, instance, files):
+        for field_name in files:
+            field_file = getattr(instance, field_name)
+            if field_file:
+                field_file.storage.delete(field_file.name)
@@ -1,9 +1,16 @@
+import hashlib
 import os
 
-from django.core.files import File
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
 from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+from taggit.models import Tag, TaggedItem
 from wagtailsvg.models import Svg
 
+from home.models import SVGToPNGMap, ThemeSettings
+
 
 class Command(BaseCommand):
 
@@ -19,33 +26,143 @@ class Command(BaseCommand):
             action='store_true',
             help='Remove existing SVG'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of SVGs inserted per batch'
+        )
+        parser.add_argument(
+            '--rasterize',
+            action='store_true',
+            help='Also render PNGs of the new SVGs, filled with each colour of --colors'
+        )
+        parser.add_argument(
+            '--colors',
+            nargs='+',
+            help='Fill colours for --rasterize as HEX codes, defaults to the colours of the theme settings'
+        )
 
     def handle(self, *args, **options):
         self.svg_dir = options.get('svg_dir')
+        self.batch_size = options.get('batch_size')
         clean = options.get('clean')
         if clean:
             self._clean()
-        self._load_svg()
+        svgs = self._load_svg()
+        self.stdout.write(self.style.SUCCESS(f'SVG loaded successfully, count={len(svgs)}.'))
 
-        self.stdout.write(self.style.SUCCESS('SVG loaded successfully.'))
+        if options.get('rasterize'):
+            self._rasterize(svgs, options.get('colors') or self._get_theme_colors())
 
     def _clean(self):
         Svg.objects.all().delete()
         self.stdout.write(self.style.ERROR('Existing SVG removed.'))
 
-    def _open_svg_file(self, svg_path):
-        try:
-            return open(svg_path, 'rb')
-        except:
-            self.stdout.write(self.style.WARNING(f'SVG file not found: {svg_path}.'))
+    def _get_file_hash(self, content):
+        return hashlib.sha1(content).hexdigest()
 
-    def _load_svg(self):
-        for dir in os.listdir(self.svg_dir):
+    def _get_existing_file_hashes(self):
+        file_hashes = {}
+        for svg in Svg.objects.all():
+            try:
+                with svg.file.open('rb') as f:
+                    file_hashes.setdefault(self._get_file_hash(f.read()), svg)
+            except (OSError, ValueError):
+                continue
+        return file_hashes
+
+    def _find_svg_files(self):
+        for dir in sorted(os.listdir(self.svg_dir)):
             dir_path = os.path.join(self.svg_dir, dir)
             if os.path.isdir(dir_path):
-                for svg_file in os.listdir(dir_path):
-                    svg_path = os.path.join(dir_path, svg_file)
-                    file = self._open_svg_file(svg_path)
-                    if file:
-                        svg = Svg.objects.create(title=svg_file.strip('.svg'), file=File(file, name=svg_file))
-                        svg.tags.add(dir)
+                for svg_file in sorted(os.listdir(dir_path)):
+                    yield dir, os.path.join(dir_path, svg_file)
+
+    def _load_svg(self):
+        """
+        Imports the SVGs in the subdirectories of --svg-dir, tagged with the
+        name of their directory. Files with the same content as an existing
+        SVG are not imported again, so the command can be run again after
+        adding icons; the existing SVG is tagged with their directory instead.
+        """
+        file_hashes = self._get_existing_file_hashes()
+        svgs = []
+        batch = []
+        duplicate_tags = []
+        for tag_name, svg_path in self._find_svg_files():
+            try:
+                with open(svg_path, 'rb') as f:
+                    content = f.read()
+            except OSError:
+                self.stdout.write(self.style.WARNING(f'SVG file not found: {svg_path}.'))
+                continue
+
+            file_hash = self._get_file_hash(content)
+            if file_hash in file_hashes:
+                duplicate_tags.append((file_hashes[file_hash], tag_name))
+                continue
+
+            svg_file = os.path.basename(svg_path)
+            svg = Svg(title=os.path.splitext(svg_file)[0])
+            svg.file.save(svg_file, ContentFile(content), save=False)
+            file_hashes[file_hash] = svg
+            batch.append((svg, tag_name))
+            if len(batch) >= self.batch_size:
+                svgs += self._create_svgs(batch)
+                batch = []
+        svgs += self._create_svgs(batch)
+        # Tagged last, as the SVGs of duplicates may have been in a later batch
+        self._tag_svgs(duplicate_tags)
+        return svgs
+
+    def _create_svgs(self, batch):
+        if not batch:
+            return []
+
+        svgs = [svg for svg, __ in batch]
+        with transaction.atomic():
+            if connections[router.db_for_write(Svg)].features.can_return_rows_from_bulk_insert:
+                Svg.objects.bulk_create(svgs)
+            else:
+                for svg in svgs:
+                    svg.save()
+            self._tag_svgs(batch)
+        return svgs
+
+    def _tag_svgs(self, svg_tags):
+        """
+        Tags each SVG of the (svg, tag_name) pairs, skipping tags it already has.
+        """
+        if not svg_tags:
+            return
+
+        tags = {tag_name: Tag.objects.get_or_create(name=tag_name)[0] for __, tag_name in svg_tags}
+        content_type = ContentType.objects.get_for_model(Svg)
+        existing = set(TaggedItem.objects.filter(
+            content_type=content_type, object_id__in={svg.pk for svg, __ in svg_tags},
+        ).values_list('object_id', 'tag_id'))
+        tagged_items = {}
+        for svg, tag_name in svg_tags:
+            key = (svg.pk, tags[tag_name].pk)
+            if key not in existing:
+                tagged_items[key] = TaggedItem(tag=tags[tag_name], content_type=content_type, object_id=svg.pk)
+        TaggedItem.objects.bulk_create(tagged_items.values())
+
+    def _get_theme_colors(self):
+        color_fields = [field.name for field in ThemeSettings._meta.fields if field.name.endswith('_color')]
+        colors = set()
+        for values in ThemeSettings.objects.values_list(*color_fields):
+            colors.update(value for value in values if value)
+        return sorted(colors)
+
+    def _rasterize(self, svgs, colors):
+        """
+        Renders the PNGs that the svg_to_png_url and render_png_from_svg
+        template tags would otherwise render on first use.
+        """
+        for svg in svgs:
+            svg_path = f'{settings.BASE_DIR}{svg.url}'
+            for color in colors:
+                SVGToPNGMap.get_png_image(svg_path, fill_color=color)
+        self.stdout.write(self.style.SUCCESS(f'PNGs rendered, count={len(svgs) * len(colors)}.'))
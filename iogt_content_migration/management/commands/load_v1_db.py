@@ -1,13 +1,13 @@
+import itertools
 from collections import defaultdict
 from pathlib import Path
 
-from bs4 import BeautifulSoup
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from django.core.files import File
 from django.core.management.base import BaseCommand
 from django.urls import reverse
 from wagtail.core.models import Page, Site, Locale, Collection, PageRevision
-from django.core.files.images import ImageFile
 from wagtail.documents.models import Document
 from wagtail.images.models import Image
 from wagtail_localize.models import Translation
@@ -19,6 +19,11 @@ from wagtailsvg.models import Svg
 import home.models as models
 from comments.models import CommentStatus
 from home.models import V1ToV2ObjectMap
+from iogt_content_migration.body import body_transformer
+from iogt_content_migration.file_import import BulkFileImporter
+from iogt_content_migration.object_map import ObjectIdMap
+from iogt_content_migration.page_tree import BulkPageTreeBuilder
+from iogt_content_migration.phases import PhaseRunner
 from questionnaires.models import Poll, PollFormField, Survey, SurveyFormField, Quiz, QuizFormField
 import psycopg2
 import psycopg2.extras
@@ -79,11 +84,54 @@ class Command(BaseCommand):
             help="IoGT V1 domains for manually inserted internal links, --v1-domains domain1 domain2 ..."
         )
 
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Insert sections, articles, footers, banners, polls and surveys in batches instead of one by one. '
+                 'Pages are not indexed for search; run update_index afterwards'
+        )
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of pages inserted per batch with --bulk, and of documents, media, images and object map rows '
+                 'written per batch'
+        )
+
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of threads copying and hashing document, media and image files, and of processes mapping '
+                 'page bodies'
+        )
+
+        parser.add_argument(
+            '--itersize',
+            type=int,
+            default=2000,
+            help='Number of rows fetched from the v1 database per round trip'
+        )
+
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue an interrupted migration: keep migrated data and skip completed phases'
+        )
+
     def handle(self, *args, **options):
         self.db_connect(options)
         self.media_dir = options.get('media_dir')
         self.skip_locales = options.get('skip_locales')
         self.v1_domains_list = options.get('v1_domains')
+        self.bulk = options.get('bulk')
+        self.batch_size = options.get('batch_size')
+        self.workers = options.get('workers')
+        self.object_map = ObjectIdMap(batch_size=self.batch_size)
+        self.page_tree_builder = BulkPageTreeBuilder(self.object_map, batch_size=self.batch_size)
+        self.phases = PhaseRunner(
+            'load_v1_db', resume=options.get('resume'), stdout=self.stdout, on_complete=self.object_map.flush)
 
         self.collection_map = {}
         self.document_map = {}
@@ -91,10 +139,16 @@ class Command(BaseCommand):
         self.image_map = {}
         self.page_translation_map = {}
         self.v1_to_v2_page_map = {}
+        self.home_page = None
         self.post_migration_report_messages = defaultdict(list)
 
-        self.clear()
-        self.stdout.write('Existing site structure cleared')
+        if self.phases.resume:
+            self.load_migrated_objects()
+            self.stdout.write('Resuming migration')
+        else:
+            self.clear()
+            self.phases.reset()
+            self.stdout.write('Existing site structure cleared')
 
         root = Page.get_first_root_node()
         self.migrate(root)
@@ -125,10 +179,42 @@ class Command(BaseCommand):
         Media.objects.all().delete()
         V1ToV2ObjectMap.objects.all().delete()
 
+    def load_migrated_objects(self):
+        """
+        Rebuild the in-memory v1 to v2 maps from V1ToV2ObjectMap so that a
+        resumed migration can link to objects created by an earlier run.
+        """
+        object_ids = defaultdict(dict)
+        for content_type_id, object_id, v1_object_id in V1ToV2ObjectMap.objects.filter(
+                extra__isnull=True).values_list('content_type_id', 'object_id', 'v1_object_id'):
+            object_ids[content_type_id][object_id] = v1_object_id
+
+        maps = {
+            Collection: self.collection_map,
+            Document: self.document_map,
+            Media: self.media_map,
+            Image: self.image_map,
+        }
+        for content_type_id, v1_object_ids in object_ids.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            if model in maps:
+                object_map = maps[model]
+            elif model and issubclass(model, Page):
+                object_map = self.v1_to_v2_page_map
+            else:
+                continue
+            for object_id, obj in model.objects.in_bulk(list(v1_object_ids)).items():
+                object_map[v1_object_ids[object_id]] = obj
+
+        self.home_page = next(
+            (page for page in self.v1_to_v2_page_map.values() if isinstance(page, models.HomePage)), None)
+
     def db_connect(self, options):
         connection_string = self.create_connection_string(options)
         self.stdout.write(f'DB connection string created, string={connection_string}')
         self.v1_conn = psycopg2.connect(connection_string)
+        self.itersize = options.get('itersize')
+        self.cursor_ids = itertools.count()
         self.stdout.write('Connected to v1 DB')
 
     def __del__(self):
@@ -146,46 +232,60 @@ class Command(BaseCommand):
         password = options.get('password', '')
         return f"host={host} port={port} dbname={name} user={user} password={password}"
 
-    def db_query(self, q):
-        cur = self.v1_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    def db_query(self, q, server_side=True):
+        """
+        Results are streamed from a named server-side cursor, fetching
+        --itersize rows per round trip. Small lookups that run once per row
+        pass server_side=False to skip the extra round trip of declaring a
+        cursor.
+        """
+        if server_side:
+            cur = self.v1_conn.cursor(
+                name=f'v1_query_{next(self.cursor_ids)}', cursor_factory=psycopg2.extras.RealDictCursor)
+            cur.itersize = self.itersize
+        else:
+            cur = self.v1_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         cur.execute(q)
         return cur
 
     def migrate(self, root):
-        self.migrate_collections()
-        self.migrate_documents()
-        self.migrate_media()
-        self.migrate_images()
+        run = self.phases.run
+        run(self.migrate_collections)
+        run(self.migrate_documents)
+        run(self.migrate_media)
+        run(self.migrate_images)
         self.load_page_translation_map()
-        self.home_page = self.create_home_page(root)
-        self.translate_home_pages(self.home_page)
+        self.home_page = run(self.create_home_page, root) or self.home_page
+        run(self.translate_home_pages, self.home_page)
         self.create_index_pages(self.home_page)
-        self.translate_index_pages()
-        self.migrate_sections()
-        self.migrate_articles()
-        self.migrate_footers()
-        self.migrate_polls()
-        self.migrate_surveys()
-        self.migrate_banners()
-        self.mark_pages_which_are_not_translated_in_v1_as_draft()
-        Page.fix_tree()
-        self.fix_articles_body()
-        self.fix_footers_body()
-        self.fix_survey_description()
-        self.fix_banner_link_page()
-        self.attach_banners_to_home_page()
-        self.migrate_recommended_articles_for_article()
-        self.migrate_featured_articles_for_homepage()
-        self.add_surveys_from_surveys_index_page_to_footer_index_page_as_page_link_page()
-        self.add_polls_from_polls_index_page_to_footer_index_page_as_page_link_page()
-        self.add_polls_from_polls_index_page_to_home_page_featured_content()
-        self.add_surveys_from_surveys_index_page_to_home_page_featured_content()
-        self.move_footers_to_end_of_footer_index_page()
-        self.stop_translations()
+        run(self.translate_index_pages)
+        run(self.migrate_sections)
+        run(self.migrate_articles)
+        run(self.migrate_footers)
+        run(self.migrate_polls)
+        run(self.migrate_surveys)
+        run(self.migrate_banners)
+        run(self.mark_pages_which_are_not_translated_in_v1_as_draft)
+        if self.bulk:
+            self.check_page_tree()
+        run(Page.fix_tree)
+        run(self.fix_articles_body)
+        run(self.fix_footers_body)
+        run(self.fix_survey_description)
+        run(self.fix_banner_link_page)
+        run(self.attach_banners_to_home_page)
+        run(self.migrate_recommended_articles_for_article)
+        run(self.migrate_featured_articles_for_homepage)
+        run(self.add_surveys_from_surveys_index_page_to_footer_index_page_as_page_link_page)
+        run(self.add_polls_from_polls_index_page_to_footer_index_page_as_page_link_page)
+        run(self.add_polls_from_polls_index_page_to_home_page_featured_content)
+        run(self.add_surveys_from_surveys_index_page_to_home_page_featured_content)
+        run(self.move_footers_to_end_of_footer_index_page)
+        run(self.stop_translations)
 
     def create_home_page(self, root):
         sql = 'select * from core_main main join wagtailcore_page page on main.page_ptr_id = page.id'
-        cur = self.db_query(sql)
+        cur = self.db_query(sql, server_side=False)
         main = cur.fetchone()
         cur.close()
         home = None
@@ -204,12 +304,12 @@ class Command(BaseCommand):
                 seo_title=main['seo_title'],
             )
             root.add_child(instance=home)
-            V1ToV2ObjectMap.create_map(content_object=home, v1_object_id=main['page_ptr_id'])
+            self.object_map.create_map(content_object=home, v1_object_id=main['page_ptr_id'])
         else:
             raise Exception('Could not find a main page in v1 DB')
         cur.close()
 
-        cur = self.db_query('select * from wagtailcore_site')
+        cur = self.db_query('select * from wagtailcore_site', server_side=False)
         v1_site = cur.fetchone()
         cur.close()
         if v1_site:
@@ -255,6 +355,12 @@ class Command(BaseCommand):
             self.quiz_index_page = QuizIndexPage(title='Quizzes')
             homepage.add_child(instance=self.quiz_index_page)
 
+        for index_page in [
+            self.section_index_page, self.banner_index_page, self.footer_index_page, self.poll_index_page,
+            self.survey_index_page, self.quiz_index_page,
+        ]:
+            self.page_tree_builder.register(index_page)
+
     def migrate_collections(self):
         cur = self.db_query('select * from wagtailcore_collection')
         for row in cur:
@@ -268,7 +374,7 @@ class Command(BaseCommand):
             )
             collection.save()
             self.collection_map.update({row['id']: collection})
-            V1ToV2ObjectMap.create_map(content_object=collection, v1_object_id=row['id'])
+            self.object_map.create_map(content_object=collection, v1_object_id=row['id'])
 
         cur.close()
         self.stdout.write('Collections migrated')
@@ -276,75 +382,83 @@ class Command(BaseCommand):
     def migrate_documents(self):
         cur = self.db_query('select * from wagtaildocs_document')
         content_type = self.find_content_type_id('wagtaildocs', 'document')
+        importer = self.create_file_importer(Document)
         for row in cur:
+            if row['id'] in self.document_map:
+                continue
+
             if not row['file']:
                 self.post_migration_report_messages['document_file_not_found'].append(
                     f'Document file path not found, id={row["id"]}'
                 )
                 continue
 
-            file = self.open_file(row['file'])
-            if file:
-                document = Document.objects.create(
+            file_path = self.find_file(row['file'])
+            if file_path:
+                document = Document(
                     title=row['title'],
-                    file=File(file),
                     created_at=row['created_at'],
                     collection=self.collection_map.get(row['collection_id']),
                 )
-                V1ToV2ObjectMap.create_map(content_object=document, v1_object_id=row['id'])
                 tags = self.find_tags(content_type, row['id'])
-                if tags:
-                    document.tags.add(*tags)
-                self.document_map.update({ row['id']: document })
+                self.record_imported_files(
+                    importer.add(document, row['id'], {'file': file_path}, tags=tags), self.document_map)
+        self.record_imported_files(importer.flush(), self.document_map)
         cur.close()
         self.stdout.write('Documents migrated')
 
     def migrate_media(self):
         cur = self.db_query('select * from core_molomedia')
         content_type = self.find_content_type_id('core', 'molomedia')
+        importer = self.create_file_importer(Media)
         for row in cur:
+            if row['id'] in self.media_map:
+                continue
+
             if not row['file']:
                 self.post_migration_report_messages['media_file_not_found'].append(
                     f'Media file path not found, id={row["id"]}'
                 )
                 continue
 
-            file = self.open_file(row['file'])
-            if file:
-                thumbnail = self.open_file(row['thumbnail'])
-                media = Media.objects.create(
+            file_path = self.find_file(row['file'])
+            if file_path:
+                files = {'file': file_path}
+                thumbnail_path = self.find_file(row['thumbnail'])
+                if thumbnail_path:
+                    files['thumbnail'] = thumbnail_path
+                media = Media(
                     title=row['title'],
-                    file=File(file),
                     type=row['type'],
                     duration=row['duration'],
-                    thumbnail=File(thumbnail) if thumbnail else None,
                     created_at=row['created_at'],
                     collection=self.collection_map.get(row['collection_id']),
                 )
-                V1ToV2ObjectMap.create_map(content_object=media, v1_object_id=row['id'])
                 tags = self.find_tags(content_type, row['id'])
-                if tags:
-                    media.tags.add(*tags)
-                self.media_map.update({ row['id']: media })
+                self.record_imported_files(importer.add(media, row['id'], files, tags=tags), self.media_map)
+        self.record_imported_files(importer.flush(), self.media_map)
         cur.close()
         self.stdout.write('Media migrated')
 
     def migrate_images(self):
         cur = self.db_query('select * from wagtailimages_image')
         content_type = self.find_content_type_id('wagtailimages', 'image')
+        importer = self.create_file_importer(Image)
         for row in cur:
+            if row['id'] in self.image_map:
+                continue
+
             if not row['file']:
                 self.post_migration_report_messages['image_file_not_found'].append(
                     f'Image file path not found, id={row["id"]}'
                 )
                 continue
 
-            image_file = self.open_file(row['file'])
-            if image_file:
+            file_path = self.find_file(row['file'])
+            if file_path:
                 self.stdout.write(f"Creating image, file={row['file']}")
-                image = Image.objects.create(
+                image = Image(
                     title=row['title'],
-                    file=ImageFile(image_file, name=row['file'].split('/')[-1]),
                     focal_point_x=row['focal_point_x'],
                     focal_point_y=row['focal_point_y'],
                     focal_point_width=row['focal_point_width'],
@@ -352,34 +466,44 @@ class Command(BaseCommand):
                     created_at=row['created_at'],
                     collection=self.collection_map.get(row['collection_id']),
                 )
-                V1ToV2ObjectMap.create_map(content_object=image, v1_object_id=row['id'])
-                image.get_file_size()
-                image.get_file_hash()
                 tags = self.find_tags(content_type, row['id'])
-                if tags:
-                    image.tags.add(*tags)
-                self.image_map.update({row['id']: image})
+                self.record_imported_files(
+                    importer.add(image, row['id'], {'file': file_path}, tags=tags), self.image_map)
+        self.record_imported_files(importer.flush(), self.image_map)
         cur.close()
         self.stdout.write('Images migrated')
 
+    def create_file_importer(self, model):
+        return BulkFileImporter(model, self.object_map, batch_size=self.batch_size, workers=self.workers)
+
+    def record_imported_files(self, results, object_map):
+        for v1_object_id, obj, original in results:
+            object_map.update({v1_object_id: obj})
+            if original:
+                self.post_migration_report_messages['duplicate_files'].append(
+                    f'Shared the identical file of {obj._meta.verbose_name} id={original.pk}, '
+                    f'v1 id={v1_object_id}, id={obj.pk}'
+                )
+
     def find_content_type_id(self, app_label, model):
-        cur = self.db_query(f"select id from django_content_type where app_label = '{app_label}' and model = '{model}'")
+        cur = self.db_query(f"select id from django_content_type where app_label = '{app_label}' and model = '{model}'", server_side=False)
         content_type = cur.fetchone()
         cur.close()
         return content_type.get('id')
 
-    def open_file(self, file):
+    def find_file(self, file):
+        if not file:
+            return None
         file_path = Path(self.media_dir) / file
-        try:
-            return open(file_path, 'rb')
-        except:
-            self.post_migration_report_messages['file_not_found'].append(
-                f"File not found: {file_path}"
-            )
+        if file_path.is_file():
+            return file_path
+        self.post_migration_report_messages['file_not_found'].append(
+            f"File not found: {file_path}"
+        )
 
     def find_tags(self, content_type, object_id):
         tags_query = 'select t.name from taggit_tag t join taggit_taggeditem ti on t.id = ti.tag_id where ti.content_type_id = {} and ti.object_id = {}'
-        cur = self.db_query(tags_query.format(content_type, object_id))
+        cur = self.db_query(tags_query.format(content_type, object_id), server_side=False)
         tags = [tag['name'] for tag in cur]
         cur.close()
         return tags
@@ -396,11 +520,14 @@ class Command(BaseCommand):
         cur = self.db_query(sql)
         section_page_translations = []
         for row in cur:
+            if row['page_ptr_id'] in self.v1_to_v2_page_map:
+                continue
             if row['page_ptr_id'] in self.page_translation_map:
                 section_page_translations.append(row)
             else:
                 self.create_section(row)
         else:
+            self.flush_pages()
             for row in section_page_translations:
                 section = self.v1_to_v2_page_map.get(self.page_translation_map[row['page_ptr_id']])
                 locale, __ = Locale.objects.get_or_create(language_code=self._get_iso_locale(row['locale']))
@@ -433,7 +560,7 @@ class Command(BaseCommand):
                     tags = self.find_tags(content_type, row['id'])
                     if tags:
                         translated_section.tags.add(*tags)
-                    V1ToV2ObjectMap.create_map(content_object=translated_section, v1_object_id=row['page_ptr_id'])
+                    self.object_map.create_map(content_object=translated_section, v1_object_id=row['page_ptr_id'])
 
                     self.v1_to_v2_page_map.update({
                         row['page_ptr_id']: translated_section
@@ -468,22 +595,22 @@ class Command(BaseCommand):
             font_color=self.get_color_hex(row['extra_style_hints']),
             larger_image_for_top_page_in_list_as_in_v1=True,
         )
-        section.save()
         content_type = self.find_content_type_id('core', 'sectionpage')
         tags = self.find_tags(content_type, row['id'])
-        if tags:
-            section.tags.add(*tags)
-        V1ToV2ObjectMap.create_map(content_object=section, v1_object_id=row['page_ptr_id'])
+        self.save_new_page(section, row['page_ptr_id'], tags=tags, on_insert=lambda: self.report_section_description(
+            section, row))
 
         self.v1_to_v2_page_map.update({
             row['page_ptr_id']: section
         })
+        self.stdout.write(f"saved section, title={section.title}")
+
+    def report_section_description(self, section, row):
         if row['description'] is None:
             self.post_migration_report_messages['sections_with_null_description'].append(
                 f'title: {section.title}. URL: {section.full_url}. '
                 f'Admin URL: {self.get_admin_url(section.id)}.'
             )
-        self.stdout.write(f"saved section, title={section.title}")
 
     def migrate_articles(self):
         sql = "select * " \
@@ -498,11 +625,14 @@ class Command(BaseCommand):
 
         article_page_translations = []
         for row in cur:
+            if row['page_ptr_id'] in self.v1_to_v2_page_map:
+                continue
             if row['page_ptr_id'] in self.page_translation_map:
                 article_page_translations.append(row)
             else:
                 self.create_article(row)
         else:
+            self.flush_pages()
             for row in article_page_translations:
                 article = self.v1_to_v2_page_map.get(self.page_translation_map[row['page_ptr_id']])
                 locale, __ = Locale.objects.get_or_create(language_code=self._get_iso_locale(row['locale']))
@@ -541,7 +671,7 @@ class Command(BaseCommand):
                     tags = self.find_tags(content_type, row['id'])
                     if tags:
                         translated_article.tags.add(*tags)
-                    V1ToV2ObjectMap.create_map(content_object=translated_article, v1_object_id=row['page_ptr_id'])
+                    self.object_map.create_map(content_object=translated_article, v1_object_id=row['page_ptr_id'])
 
                     self.v1_to_v2_page_map.update({
                         row['page_ptr_id']: translated_article
@@ -586,12 +716,9 @@ class Command(BaseCommand):
             index_page_description=row['subtitle'],
         )
         try:
-            article.save()
             content_type = self.find_content_type_id('core', 'articlepage')
             tags = self.find_tags(content_type, row['id'])
-            if tags:
-                article.tags.add(*tags)
-            V1ToV2ObjectMap.create_map(content_object=article, v1_object_id=row['page_ptr_id'])
+            self.save_new_page(article, row['page_ptr_id'], tags=tags)
             self.v1_to_v2_page_map.update({
                 row['page_ptr_id']: article
             })
@@ -602,89 +729,71 @@ class Command(BaseCommand):
             return
         self.stdout.write(f"saved article, title={article.title}")
 
-    def get_unsupported_html_tags(self, value):
-        bleach_kwargs = _get_bleach_kwargs()
-
-        unsupported_html_tags = []
-        tags = BeautifulSoup(value, "html.parser").find_all()
-        for tag in tags:
-            if tag.name not in bleach_kwargs['tags']:
-                unsupported_html_tags.append(tag.name)
-
-        return unsupported_html_tags
+    def body_transformer(self):
+        return body_transformer(
+            _get_bleach_kwargs()['tags'],
+            self.v1_domains_list,
+            {v1_id: image.id for v1_id, image in self.image_map.items()},
+            {v1_id: media.id for v1_id, media in self.media_map.items()},
+            {v1_id: page.id for v1_id, page in self.v1_to_v2_page_map.items()},
+            workers=self.workers,
+        )
 
-    def _map_body(self, type_, row, v2_body):
-        for block in v2_body:
-            if block['type'] == 'paragraph':
-                unsupported_html_tags = self.get_unsupported_html_tags(block['value'])
-                if unsupported_html_tags:
-                    block['type'] = 'paragraph_v1_legacy'
+    def map_page_bodies(self, cur, type_, field_name, body_column, introduction_column, report_missing=False):
+        """
+        Map the v1 bodies of the pages in cur a batch at a time, spread over
+        --workers processes, and write each page once.
+        """
+        with self.body_transformer() as transform:
+            while True:
+                rows = cur.fetchmany(self.batch_size)
+                if not rows:
+                    break
+
+                pages = []
+                for row in rows:
                     page = self.v1_to_v2_page_map.get(row['page_ptr_id'])
                     if page:
-                        self.post_migration_report_messages['page_with_unsupported_tags'].append(
-                            f'title: {page.title}. URL: {page.full_url}. '
-                            f'Admin URL: {self.get_admin_url(page.id)}. '
-                            f'Tags: {unsupported_html_tags}.'
+                        pages.append((page, row))
+                    elif report_missing:
+                        self.post_migration_report_messages[type_].append(
+                            f'Unable to add {type_[:-1]} {field_name}, title={row["title"]}'
                         )
-                else:
-                    block['type'] = 'markdown'
-
-                if bool([domain for domain in self.v1_domains_list if domain in block['value']]):
-                    page = self.v1_to_v2_page_map.get(row['page_id'])
-                    self.post_migration_report_messages['sections_with_internal_links'].append(
-                        f"title: {page.title}. URL: {page.full_url}. "
-                        f"Admin URL: {self.get_admin_url(page.id)}.")
-
-            elif block['type'] == 'richtext':
-                block['type'] = 'paragraph'
-
-                if bool([domain for domain in self.v1_domains_list if domain in block['value']]):
-                    page = self.v1_to_v2_page_map.get(row['page_id'])
-                    self.post_migration_report_messages['sections_with_internal_links'].append(
-                        f"title: {page.title}. URL: {page.full_url}. "
-                        f"Admin URL: {self.get_admin_url(page.id)}.")
-
-            elif block['type'] == 'image':
-                image = self.image_map.get(block['value'])
-                if image:
-                    block['value'] = image.id
-                else:
-                    self.post_migration_report_messages['invalid_image_id'].append(
-                        f"title={row['title']} has image with invalid id {block['value']}"
-                    )
-                    block['value'] = None
-            elif block['type'] == 'media':
-                media = self.media_map.get(block['value'])
-                if media:
-                    block['value'] = media.id
-                else:
-                    self.post_migration_report_messages['invalid_media_id'].append(
-                        f"title={row['title']} has media with invalid id {block['value']}"
-                    )
-                    block['value'] = None
-            elif block['type'] == 'page':
-                block['type'] = 'page_button'
-                page = self.v1_to_v2_page_map.get(block['value'])
-                if page:
-                    block['value'] = {'page': page.id, 'text': ''}
-                else:
-                    block['value'] = {'page': None, 'text': ''}
-                    self.post_migration_report_messages['invalid_page_id'].append(
-                        f'Unable to attach v2 page for {type_[:-1]}, title={row["title"]}'
-                    )
-        return v2_body
-
-    def map_article_body(self, row):
-        v1_body = json.loads(row['body'])
 
-        v2_body = self._map_body('articles', row, v1_body)
+                results = transform([(row[body_column], row[introduction_column]) for __, row in pages])
+                for (page, row), (body, findings) in zip(pages, results):
+                    self.report_body_findings(type_, page, row, findings)
+                    setattr(page, field_name, body)
+                    if self.bulk:
+                        type(page).objects.filter(pk=page.pk).update(**{field_name: getattr(page, field_name)})
+                    else:
+                        page.save()
+        cur.close()
 
-        if row['subtitle']:
-            v2_body = [{
-                'type': 'paragraph',
-                'value': row['subtitle'],
-            }] + v2_body
-        return json.dumps(v2_body)
+    def report_body_findings(self, type_, page, row, findings):
+        for kind, value in findings:
+            if kind == 'unsupported_tags':
+                self.post_migration_report_messages['page_with_unsupported_tags'].append(
+                    f'title: {page.title}. URL: {page.full_url}. '
+                    f'Admin URL: {self.get_admin_url(page.id)}. '
+                    f'Tags: {value}.'
+                )
+            elif kind == 'internal_links':
+                self.post_migration_report_messages['sections_with_internal_links'].append(
+                    f"title: {page.title}. URL: {page.full_url}. "
+                    f"Admin URL: {self.get_admin_url(page.id)}.")
+            elif kind == 'invalid_image_id':
+                self.post_migration_report_messages['invalid_image_id'].append(
+                    f"title={row['title']} has image with invalid id {value}"
+                )
+            elif kind == 'invalid_media_id':
+                self.post_migration_report_messages['invalid_media_id'].append(
+                    f"title={row['title']} has media with invalid id {value}"
+                )
+            elif kind == 'invalid_page_id':
+                self.post_migration_report_messages['invalid_page_id'].append(
+                    f'Unable to attach v2 page for {type_[:-1]}, title={row["title"]}'
+                )
 
     def migrate_banners(self):
         sql = "select * " \
@@ -698,11 +807,14 @@ class Command(BaseCommand):
         cur = self.db_query(sql)
         banner_page_translations = []
         for row in cur:
+            if row['page_ptr_id'] in self.v1_to_v2_page_map:
+                continue
             if row['page_ptr_id'] in self.page_translation_map:
                 banner_page_translations.append(row)
             else:
                 self.create_banner(row)
         else:
+            self.flush_pages()
             for row in banner_page_translations:
                 banner = self.v1_to_v2_page_map.get(self.page_translation_map[row['page_ptr_id']])
                 locale, __ = Locale.objects.get_or_create(language_code=self._get_iso_locale(row['locale']))
@@ -729,7 +841,7 @@ class Command(BaseCommand):
                     translated_banner.search_description = row['search_description']
                     translated_banner.seo_title = row['seo_title']
                     translated_banner.save()
-                    V1ToV2ObjectMap.create_map(content_object=translated_banner, v1_object_id=row['page_ptr_id'])
+                    self.object_map.create_map(content_object=translated_banner, v1_object_id=row['page_ptr_id'])
 
                     self.v1_to_v2_page_map.update({
                         row['page_ptr_id']: translated_banner
@@ -757,8 +869,7 @@ class Command(BaseCommand):
             search_description=row['search_description'],
             seo_title=row['seo_title'],
         )
-        banner.save()
-        V1ToV2ObjectMap.create_map(content_object=banner, v1_object_id=row['page_ptr_id'])
+        self.save_new_page(banner, row['page_ptr_id'])
         self.v1_to_v2_page_map.update({
             row['page_ptr_id']: banner
         })
@@ -789,11 +900,14 @@ class Command(BaseCommand):
         cur = self.db_query(sql)
         footer_page_translations = []
         for row in cur:
+            if row['page_ptr_id'] in self.v1_to_v2_page_map:
+                continue
             if row['page_ptr_id'] in self.page_translation_map:
                 footer_page_translations.append(row)
             else:
                 self.create_footer(row)
         else:
+            self.flush_pages()
             for row in footer_page_translations:
                 footer = self.v1_to_v2_page_map.get(self.page_translation_map[row['page_ptr_id']])
                 locale, __ = Locale.objects.get_or_create(language_code=self._get_iso_locale(row['locale']))
@@ -825,7 +939,7 @@ class Command(BaseCommand):
                     translated_footer.commenting_starts_at = commenting_open_time
                     translated_footer.commenting_ends_at = commenting_close_time
                     translated_footer.save()
-                    V1ToV2ObjectMap.create_map(content_object=translated_footer, v1_object_id=row['page_ptr_id'])
+                    self.object_map.create_map(content_object=translated_footer, v1_object_id=row['page_ptr_id'])
 
                     self.v1_to_v2_page_map.update({
                         row['page_ptr_id']: translated_footer
@@ -857,13 +971,55 @@ class Command(BaseCommand):
             commenting_starts_at=commenting_open_time,
             commenting_ends_at=commenting_close_time
         )
-        footer.save()
-        V1ToV2ObjectMap.create_map(content_object=footer, v1_object_id=row['page_ptr_id'])
+        self.save_new_page(footer, row['page_ptr_id'])
         self.v1_to_v2_page_map.update({
             row['page_ptr_id']: footer
         })
         self.stdout.write(f"saved footer, title={footer.title}")
 
+    def save_new_page(self, page, v1_object_id, tags=None, on_insert=None):
+        """
+        Save a page created from a v1 row, or queue it for batched insertion
+        with --bulk. on_insert runs once the page is in the database.
+        """
+        if self.bulk:
+            self.page_tree_builder.add(page, v1_object_id, tags=tags, on_insert=on_insert)
+            return
+
+        page.save()
+        if tags:
+            page.tags.add(*tags)
+        self.object_map.create_map(content_object=page, v1_object_id=v1_object_id)
+        if on_insert:
+            on_insert()
+
+    def flush_pages(self):
+        if not self.bulk:
+            return
+
+        skipped, failed = self.page_tree_builder.flush()
+        for page, v1_object_id in skipped:
+            self.v1_to_v2_page_map.pop(v1_object_id, None)
+            self.post_migration_report_messages['pages_with_missing_parent'].append(
+                f"Skipping {page._meta.verbose_name} with missing parent: title={page.title}"
+            )
+        # Reported like the failures of save_new_page without --bulk, e.g. under 'polls'
+        for page, v1_object_id, error in failed:
+            self.v1_to_v2_page_map.pop(v1_object_id, None)
+            self.post_migration_report_messages[f'{page._meta.model_name}s'].append(
+                f"Unable to save {page._meta.verbose_name}, title={page.title}: {error}"
+            )
+        self.stdout.write('Queued pages inserted')
+
+    def check_page_tree(self):
+        evil_chars, bad_steplen, orphans, wrong_depth, wrong_numchild = Page.find_problems()
+        for name, page_ids in [('orphaned', orphans), ('wrong_depth', wrong_depth),
+                               ('wrong_numchild', wrong_numchild)]:
+            if page_ids:
+                self.post_migration_report_messages[f'page_tree_{name}'].append(
+                    f'Fixed by fix_tree, page ids={page_ids}'
+                )
+
     def load_page_translation_map(self):
         sql = "select * " \
               "from core_pagetranslation"
@@ -886,14 +1042,14 @@ class Command(BaseCommand):
 
     def migrate_polls(self):
         sql = "select * from polls_pollsindexpage ppip, wagtailcore_page wcp where ppip.page_ptr_id = wcp.id"
-        cur = self.db_query(sql)
+        cur = self.db_query(sql, server_side=False)
         v1_poll_index_page = cur.fetchone()
         cur.close()
 
         self._migrate_polls(v1_poll_index_page, self.poll_index_page)
 
         sql = "select * from core_sectionindexpage csip, wagtailcore_page wcp where csip.page_ptr_id = wcp.id"
-        cur = self.db_query(sql)
+        cur = self.db_query(sql, server_side=False)
         v1_section_index_page = cur.fetchone()
         cur.close()
 
@@ -912,11 +1068,14 @@ class Command(BaseCommand):
         cur = self.db_query(sql)
         poll_page_translations = []
         for row in cur:
+            if row['page_ptr_id'] in self.v1_to_v2_page_map:
+                continue
             if row['page_ptr_id'] in self.page_translation_map:
                 poll_page_translations.append(row)
             else:
                 self.create_poll(v2_index_page, row)
         else:
+            self.flush_pages()
             for row in poll_page_translations:
                 poll = self.v1_to_v2_page_map.get(self.page_translation_map[row['page_ptr_id']])
                 locale, __ = Locale.objects.get_or_create(language_code=self._get_iso_locale(row['locale']))
@@ -947,7 +1106,7 @@ class Command(BaseCommand):
                     translated_poll.allow_anonymous_submissions = False
                     translated_poll.allow_multiple_submissions = False
                     translated_poll.save()
-                    V1ToV2ObjectMap.create_map(content_object=translated_poll, v1_object_id=row['page_ptr_id'])
+                    self.object_map.create_map(content_object=translated_poll, v1_object_id=row['page_ptr_id'])
 
                     self.v1_to_v2_page_map.update({
                         row['page_ptr_id']: translated_poll
@@ -983,16 +1142,13 @@ class Command(BaseCommand):
             allow_multiple_submissions=False,
         )
         try:
-            poll.save()
-            V1ToV2ObjectMap.create_map(content_object=poll, v1_object_id=row['page_ptr_id'])
+            self.save_new_page(poll, row['page_ptr_id'], on_insert=lambda: self.migrate_poll_questions(poll, row))
         except Exception as e:
             self.post_migration_report_messages['polls'].append(
                 f"Unable to save poll, title={row['title']}"
             )
             return
 
-        self.migrate_poll_questions(poll, row)
-
         self.v1_to_v2_page_map.update({
             row['page_ptr_id']: poll
         })
@@ -1007,7 +1163,7 @@ class Command(BaseCommand):
               f'and clr.language_id = csl.id ' \
               f'and csl.locale = \'{poll_row["locale"]}\' ' \
               f'order by wcp.path'
-        cur = self.db_query(sql)
+        cur = self.db_query(sql, server_side=False)
         self.create_poll_question(poll, poll_row, cur)
         cur.close()
 
@@ -1040,19 +1196,19 @@ class Command(BaseCommand):
         if choices:
             cur.scroll(0, 'absolute')
         for row in cur:
-            V1ToV2ObjectMap.create_map(content_object=poll_form_field, v1_object_id=row['page_ptr_id'])
+            self.object_map.create_map(content_object=poll_form_field, v1_object_id=row['page_ptr_id'])
         self.stdout.write(f"saved poll question, label={poll.title}")
 
     def migrate_surveys(self):
         sql = "select * from surveys_surveysindexpage ssip, wagtailcore_page wcp where ssip.page_ptr_id = wcp.id"
-        cur = self.db_query(sql)
+        cur = self.db_query(sql, server_side=False)
         v1_survey_index_page = cur.fetchone()
         cur.close()
 
         self._migrate_surveys(v1_survey_index_page, self.survey_index_page)
 
         sql = "select * from core_sectionindexpage csip, wagtailcore_page wcp where csip.page_ptr_id = wcp.id"
-        cur = self.db_query(sql)
+        cur = self.db_query(sql, server_side=False)
         v1_section_index_page = cur.fetchone()
         cur.close()
 
@@ -1071,11 +1227,14 @@ class Command(BaseCommand):
         cur = self.db_query(sql)
         survey_page_translations = []
         for row in cur:
+            if row['page_ptr_id'] in self.v1_to_v2_page_map:
+                continue
             if row['page_ptr_id'] in self.page_translation_map:
                 survey_page_translations.append(row)
             else:
                 self.create_survey(v2_index_page, row)
         else:
+            self.flush_pages()
             for row in survey_page_translations:
                 survey = self.v1_to_v2_page_map.get(self.page_translation_map[row['page_ptr_id']])
                 locale, __ = Locale.objects.get_or_create(language_code=self._get_iso_locale(row['locale']))
@@ -1117,7 +1276,7 @@ class Command(BaseCommand):
                             f"Truncated survey submit button text, title={row['title']}"
                         )
 
-                    V1ToV2ObjectMap.create_map(content_object=translated_survey, v1_object_id=row['page_ptr_id'])
+                    self.object_map.create_map(content_object=translated_survey, v1_object_id=row['page_ptr_id'])
 
                     self.v1_to_v2_page_map.update({
                         row['page_ptr_id']: translated_survey
@@ -1157,35 +1316,21 @@ class Command(BaseCommand):
         )
 
         try:
-            survey.save()
+            self.save_new_page(
+                survey, row['page_ptr_id'], on_insert=lambda: self.migrate_survey_questions(survey, row))
             if row['submit_text'] and len(row['submit_text']) > 40:
                 self.stdout.write(f"Truncated survey submit button text, title={row['title']}")
-            V1ToV2ObjectMap.create_map(content_object=survey, v1_object_id=row['page_ptr_id'])
         except Exception as e:
             self.post_migration_report_messages['surveys'].append(
                 f"Unable to save survey, title={row['title']}"
             )
             return
 
-        self.migrate_survey_questions(survey, row)
-
         self.v1_to_v2_page_map.update({
             row['page_ptr_id']: survey
         })
         self.stdout.write(f"saved survey, title={survey.title}")
 
-    def map_survey_description(self, row):
-        v1_survey_description = json.loads(row['description'])
-        v2_survey_description = self._map_body('surveys', row, v1_survey_description)
-
-        if row['introduction']:
-            v2_survey_description = [{
-                'type': 'paragraph',
-                'value': row['introduction'],
-            }] + v2_survey_description
-
-        return json.dumps(v2_survey_description)
-
     def map_survey_thank_you_text(self, row):
         v2_thank_you_text = []
         if row['thank_you_text']:
@@ -1200,7 +1345,7 @@ class Command(BaseCommand):
               f'and stc.terms_and_conditions_id = wcp.id ' \
               f'and stc.page_id = {row["page_ptr_id"]}'
 
-        cur = self.db_query(sql)
+        cur = self.db_query(sql, server_side=False)
         v1_term_and_condition = cur.fetchone()
         cur.close()
         if v1_term_and_condition:
@@ -1224,7 +1369,7 @@ class Command(BaseCommand):
         if self.skip_locales:
             sql += "and locale = 'en' "
         sql += 'order by wcp.path'
-        cur = self.db_query(sql)
+        cur = self.db_query(sql, server_side=False)
         self.create_survey_question(survey, survey_row, cur)
         cur.close()
 
@@ -1239,7 +1384,7 @@ class Command(BaseCommand):
                 admin_label=row['admin_label'], page_break=row['page_break'],
                 choices='|'.join(row['choices'].split(',')), skip_logic=row['skip_logic']
             )
-            V1ToV2ObjectMap.create_map(content_object=survey_form_field, v1_object_id=row['smsffid'])
+            self.object_map.create_map(content_object=survey_form_field, v1_object_id=row['smsffid'])
             skip_logic_next_actions = [logic['value']['skip_logic'] for logic in json.loads(row['skip_logic'])]
             if not survey_row['multi_step'] and (
                     'end' in skip_logic_next_actions or 'question' in skip_logic_next_actions):
@@ -1268,6 +1413,7 @@ class Command(BaseCommand):
                 translated_home_page.title = modified_title
                 translated_home_page.draft_title = modified_title
                 translated_home_page.save()
+        cur.close()
 
 
     def translate_index_pages(self):
@@ -1276,6 +1422,7 @@ class Command(BaseCommand):
         for row in cur:
             locale, __ = Locale.objects.get_or_create(language_code=self._get_iso_locale(row['locale']))
             locales.append(locale)
+        cur.close()
 
         index_pages = [
             self.section_index_page, self.banner_index_page, self.footer_index_page, self.poll_index_page,
@@ -1291,7 +1438,9 @@ class Command(BaseCommand):
             v1_article_id = article_row['page_id']
             v2_article = self.v1_to_v2_page_map.get(v1_article_id)
             if v2_article:
-                cur = self.db_query(f'select * from core_articlepagerecommendedsections where page_id = {v1_article_id} and recommended_article_id is not null')
+                cur = self.db_query(
+                    f'select * from core_articlepagerecommendedsections where page_id = {v1_article_id} '
+                    f'and recommended_article_id is not null', server_side=False)
                 for row in cur:
                     v2_recommended_article = self.v1_to_v2_page_map.get(row['recommended_article_id'])
                     if v2_recommended_article:
@@ -1322,7 +1471,7 @@ class Command(BaseCommand):
                 translated_from_page_id = self.page_translation_map.get(article_row['page_ptr_id'])
                 if translated_from_page_id:
                     eng_article_cur = self.db_query(
-                        f'select * from core_articlepage where page_ptr_id = {translated_from_page_id}')
+                        f'select * from core_articlepage where page_ptr_id = {translated_from_page_id}', server_side=False)
                     eng_article_row = eng_article_cur.fetchone()
                     eng_article_cur.close()
                 else:
@@ -1470,16 +1619,7 @@ class Command(BaseCommand):
             sql += "and locale = 'en' "
         sql += " and wcp.path like '000100010002%'order by wcp.path"
         cur = self.db_query(sql)
-        for row in cur:
-            v2_article = self.v1_to_v2_page_map.get(row['page_ptr_id'])
-            if v2_article:
-                v2_article.body = self.map_article_body(row)
-                v2_article.save()
-            else:
-                self.post_migration_report_messages['articles'].append(
-                    f'Unable to add article body, title={row["title"]}'
-                )
-
+        self.map_page_bodies(cur, 'articles', 'body', 'body', 'subtitle', report_missing=True)
         cur.close()
 
     def fix_footers_body(self):
@@ -1493,11 +1633,7 @@ class Command(BaseCommand):
             sql += " and locale = 'en' "
         sql += ' order by wcp.path'
         cur = self.db_query(sql)
-        for row in cur:
-            v2_footer = self.v1_to_v2_page_map.get(row['page_ptr_id'])
-            if v2_footer:
-                v2_footer.body = self.map_article_body(row)
-                v2_footer.save()
+        self.map_page_bodies(cur, 'footers', 'body', 'body', 'subtitle')
         cur.close()
 
     def fix_survey_description(self):
@@ -1510,11 +1646,7 @@ class Command(BaseCommand):
             sql += " and locale = 'en' "
         sql += ' order by wcp.path'
         cur = self.db_query(sql)
-        for row in cur:
-            v2_survey = self.v1_to_v2_page_map.get(row['page_ptr_id'])
-            if v2_survey:
-                v2_survey.description = self.map_survey_description(row)
-                v2_survey.save()
+        self.map_page_bodies(cur, 'surveys', 'description', 'description', 'introduction')
         cur.close()
 
     def fix_banner_link_page(self):
@@ -1672,3 +1804,6 @@ class Command(BaseCommand):
         for k, v in self.post_migration_report_messages.items():
             self.stdout.write(self.style.ERROR(f"===> {k.replace('_', ' ').upper()}"))
             self.stdout.write(self.style.ERROR('\n'.join(v)))
+
+        self.stdout.write('===> PHASE TIMINGS')
+        self.stdout.write('\n'.join(self.phases.report()))
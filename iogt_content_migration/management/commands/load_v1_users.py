@@ -1,13 +1,17 @@
+import itertools
 import json
 from collections import defaultdict
 from time import sleep
 
 import psycopg2
+import psycopg2.extras
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from django.contrib.contenttypes.models import ContentType
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
 from django_comments.models import CommentFlag
 from django_comments_xtd.models import XtdComment
 from pip._vendor.distlib.compat import raw_input
@@ -17,7 +21,12 @@ from tqdm import tqdm
 from wagtail.core.models import Page, PageViewRestriction
 
 from comments.models import CannedResponse
-from home.models import Article, V1ToV2ObjectMap
+from comments.utils import invalidate_comments_cache, update_comment_counts
+from home.models import Article
+from iogt_content_migration.object_map import ObjectIdMap
+from iogt_content_migration.phases import PhaseRunner
+from iogt_content_migration.utils import bulk_create_with_pks, bulk_insert
+from iogt_users.models import Profile
 from questionnaires.models import Survey, UserSubmission, Poll
 
 
@@ -69,7 +78,31 @@ class Command(BaseCommand):
             help='Groups IDs to mark registration survey mandatory for'
         )
 
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of users, comments and submissions inserted per batch'
+        )
+
+        parser.add_argument(
+            '--itersize',
+            type=int,
+            default=2000,
+            help='Number of rows fetched from the v1 database per round trip'
+        )
+
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue an interrupted migration: skip completed phases'
+        )
+
     def handle(self, *args, **options):
+        if options.get('resume') and options.get('delete_users'):
+            raise CommandError('--delete-users would delete the users migrated before the interruption; '
+                               'run with --resume only')
+
         self.db_connect(options)
 
         mandatory_survey_group_ids = options.get('group_ids')
@@ -79,8 +112,14 @@ class Command(BaseCommand):
         self.content_type_map = dict()
         self.delete_users = options.get('delete_users')
         self.post_migration_report_messages = defaultdict(list)
+        self.batch_size = options.get('batch_size')
+        self.object_map = ObjectIdMap(batch_size=self.batch_size)
+        self.phases = PhaseRunner(
+            'load_v1_users', resume=options.get('resume'), stdout=self.stdout, on_complete=self.object_map.flush)
 
-        self.clear()
+        if not self.phases.resume:
+            self.clear()
+            self.phases.reset()
 
         self.migrate()
 
@@ -93,6 +132,8 @@ class Command(BaseCommand):
         connection_string = self.create_connection_string(options)
         self.stdout.write(f'DB connection string created, string={connection_string}')
         self.v1_conn = psycopg2.connect(connection_string)
+        self.itersize = options.get('itersize')
+        self.cursor_ids = itertools.count()
         self.stdout.write('Connected to v1 DB')
 
     def __del__(self):
@@ -104,7 +145,7 @@ class Command(BaseCommand):
 
     def get_query_results_count(self, sql):
         sql = f'select count(*) from ({sql}) as count_table'
-        cur = self.db_query(sql).fetchone()
+        cur = self.db_query(sql, server_side=False).fetchone()
         return cur['count']
 
     def with_progress(self, sql, iterable, title):
@@ -118,6 +159,7 @@ class Command(BaseCommand):
         self.stdout.write('==============================')
         self.stdout.write('User Groups in v1:')
         [self.stdout.write(f'{group["id"]} - {group["name"]}') for group in cur]
+        cur.close()
 
         self.stdout.write('\n Please mention the groups for which you want to mark the registration survey'
                           'mandatory?')
@@ -142,27 +184,39 @@ class Command(BaseCommand):
         password = options.get('password', '')
         return f"host={host} port={port} dbname={name} user={user} password={password}"
 
-    def db_query(self, q):
-        cur = self.v1_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    def db_query(self, q, server_side=True):
+        """
+        Results are streamed from a named server-side cursor, fetching
+        --itersize rows per round trip. Small lookups that run once per row
+        pass server_side=False to skip the extra round trip of declaring a
+        cursor.
+        """
+        if server_side:
+            cur = self.v1_conn.cursor(
+                name=f'v1_query_{next(self.cursor_ids)}', cursor_factory=psycopg2.extras.RealDictCursor)
+            cur.itersize = self.itersize
+        else:
+            cur = self.v1_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         cur.execute(q)
         return cur
 
     def migrate(self):
         self.populate_content_type_map()
 
-        self.migrate_user_groups()
-        self.migrate_user_accounts()
-        self.mark_user_registration_survey_required()
+        run = self.phases.run
+        run(self.migrate_user_groups)
+        run(self.migrate_user_accounts)
+        run(self.mark_user_registration_survey_required)
 
-        self.migrate_user_comments()
-        self.migrate_comment_flags()
-        self.migrate_canned_responses()
+        run(self.migrate_user_comments)
+        run(self.migrate_comment_flags)
+        run(self.migrate_canned_responses)
 
-        self.migrate_user_survey_submissions()
-        self.migrate_user_poll_submissions()
-        self.migrate_user_freetext_poll_submissions()
+        run(self.migrate_user_survey_submissions)
+        run(self.migrate_user_poll_submissions)
+        run(self.migrate_user_freetext_poll_submissions)
 
-        self.migrate_page_view_restrictions()
+        run(self.migrate_page_view_restrictions)
 
         self.print_post_migration_report()
 
@@ -191,45 +245,78 @@ class Command(BaseCommand):
         colliding_usernames = [row['lower'] for row in cur]
         self.post_migration_report_messages['colliding_users_in_v1'].append(','.join(colliding_usernames))
 
+        v1_user_group_names = self.get_v1_user_group_names()
+        group_ids = dict(Group.objects.values_list('name', 'id'))
+        existing_usernames = set(get_user_model().objects.values_list('username', flat=True))
+
         sql = f'select * from auth_user'
         cur = self.db_query(sql)
 
         renamed_users = []
+        batch = []
         for row in self.with_progress(sql, cur, 'User Migration in progress'):
             v1_user_id = row.pop('id')
 
             user_data = dict(row)
             user_data.update({'has_filled_registration_survey': True})
 
-            migrated_user = V1ToV2ObjectMap.get_v2_obj(get_user_model(), v1_user_id)
-
-            if not migrated_user:
-                if get_user_model().objects.filter(username=row['username']).exists():
-                    existing_user = get_user_model().objects.get(username=row['username'])
-                    modified_username = f'{existing_user}_v2'
-                    renamed_users.append(f'{existing_user} -> {modified_username}')
-                    existing_user.username = modified_username
-                    existing_user.save()
-
-                user = get_user_model().objects.create(**user_data)
-                V1ToV2ObjectMap.create_map(user, v1_user_id)
-
-                user_groups_sql = f'select * from auth_user_groups aug ' \
-                                  f'inner join auth_group ag on aug.group_id = ag.id ' \
-                                  f'where user_id={v1_user_id}'
-
-                user_groups_cursor = self.db_query(user_groups_sql)
-
-                user.groups.clear()
-                for row_ in user_groups_cursor:
-                    group = Group.objects.get(name=row_['name'])
-                    group.user_set.add(user)
+            if self.object_map.get_v2_id(get_user_model(), v1_user_id):
+                continue
 
-                user_groups_cursor.close()
+            if row['username'] in existing_usernames:
+                existing_user = get_user_model().objects.get(username=row['username'])
+                modified_username = f'{existing_user}_v2'
+                renamed_users.append(f'{existing_user} -> {modified_username}')
+                existing_user.username = modified_username
+                existing_user.save()
+                existing_usernames.add(modified_username)
+
+            existing_usernames.add(row['username'])
+            batch.append((get_user_model()(**user_data), v1_user_id))
+            if len(batch) >= self.batch_size:
+                self.create_users(batch, v1_user_group_names, group_ids)
+                batch = []
+        self.create_users(batch, v1_user_group_names, group_ids)
+        cur.close()
 
         if renamed_users:
             self.post_migration_report_messages['renamed_users'].append(','.join(renamed_users))
 
+    def get_v1_user_group_names(self):
+        sql = 'select aug.user_id, ag.name from auth_user_groups aug inner join auth_group ag on aug.group_id = ag.id'
+        cur = self.db_query(sql)
+
+        group_names = defaultdict(list)
+        for row in cur:
+            group_names[row['user_id']].append(row['name'])
+        cur.close()
+        return group_names
+
+    def create_users(self, batch, v1_user_group_names, group_ids):
+        """
+        Insert users, their profiles and group memberships in bulk. No
+        post_save signals are sent, so profiles are created here instead of
+        by create_user_profile.
+        """
+        if not batch:
+            return
+
+        UserGroup = get_user_model().groups.through
+        with transaction.atomic():
+            users = bulk_create_with_pks(get_user_model(), [user for user, __ in batch])
+            Profile.objects.bulk_create([Profile(user=user) for user in users])
+
+            user_groups = []
+            for user, v1_user_id in batch:
+                self.object_map.create_map(user, v1_user_id)
+                user_groups += [
+                    UserGroup(user_id=user.pk, group_id=group_ids[name])
+                    for name in v1_user_group_names.get(v1_user_id, []) if name in group_ids
+                ]
+            UserGroup.objects.bulk_create(user_groups)
+            # Mapped in the same transaction, so --resume never inserts them again
+            self.object_map.flush()
+
     def migrate_user_groups(self):
         self.stdout.write(self.style.SUCCESS('Starting User Groups Migration'))
 
@@ -238,7 +325,8 @@ class Command(BaseCommand):
 
         for row in cur:
             group, __ = Group.objects.get_or_create(name=row['name'])
-            V1ToV2ObjectMap.create_map(group, row['id'])
+            self.object_map.create_map(group, row['id'])
+        cur.close()
 
         self.stdout.write(self.style.SUCCESS('Completed User Groups Migration'))
 
@@ -255,6 +343,7 @@ class Command(BaseCommand):
               f'order by submit_date'
         cur = self.db_query(sql)
 
+        batch = []
         for row in self.with_progress(sql, cur, 'User [root] comments migration in progress'):
             comment_id = row.pop('comment_id')
             content_type = self.content_type_map[row['model']]
@@ -263,29 +352,25 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR(f'Content Type for {row["model"]} not found.'))
                 continue
 
-            new_article = V1ToV2ObjectMap.get_v2_obj(Article, row['object_pk'])
+            new_article_id = self.object_map.get_v2_id(Article, row['object_pk'])
 
-            if not new_article:
+            if not new_article_id:
                 self.stdout.write(self.style.ERROR(f'New Article for object_pk:{row["object_pk"]} not found.'))
                 continue
 
-            max_thread_id_comment = XtdComment.objects.filter(
-                content_type_id=content_type.id, object_pk=new_article.pk).order_by('-thread_id').first()
-
-            max_thread_id = 0
-            if max_thread_id_comment:
-                max_thread_id = max_thread_id_comment.id
-
-            migrated_comment = V1ToV2ObjectMap.get_v2_obj(XtdComment, comment_id)
-
-            if not migrated_comment:
-                comment = XtdComment.objects.create(
-                    content_type_id=content_type.id, object_pk=new_article.pk, user_name=row['user_name'],
+            if not self.object_map.get_v2_id(XtdComment, comment_id):
+                comment = XtdComment(
+                    content_type_id=content_type.id, object_pk=str(new_article_id), user_name=row['user_name'],
                     user_email=row['user_email'], submit_date=row['submit_date'],
                     comment=row['comment'], is_public=row['is_public'], is_removed=row['is_removed'],
-                    thread_id=max_thread_id + 1, user=V1ToV2ObjectMap.get_v2_obj(get_user_model(), row['user_id']),
+                    user_id=self.object_map.get_v2_id(get_user_model(), row['user_id']),
                     order=1, followup=0, nested_count=0, ip_address=row['ip_address'], site_id=1)
-                V1ToV2ObjectMap.create_map(comment, comment_id)
+                batch.append((comment, comment_id))
+                if len(batch) >= self.batch_size:
+                    self.create_comments(batch)
+                    batch = []
+        self.create_comments(batch)
+        cur.close()
 
     def migrate_nested_user_comments(self):
         sql = f'select dc.id as comment_id, wcp.id as wagtailpage_id, wcp.title, comment, * ' \
@@ -296,76 +381,172 @@ class Command(BaseCommand):
               f'order by submit_date'
         cur = self.db_query(sql)
 
-        for row in self.with_progress(sql, cur, 'User [nested] comments migration in progress...'):
-            comment_id = row.pop('comment_id')
-            content_type = self.content_type_map[row['model']]
-
-            if not content_type:
-                self.stdout.write(self.style.ERROR(f'Content Type for {row["model"]} not found.'))
-                continue
-
-            parent_comment = V1ToV2ObjectMap.get_v2_obj(XtdComment, row['parent_id'])
-
-            if not parent_comment:
-                self.stdout.write(self.style.ERROR(f'Parent comment for Comment ID:{comment_id} not found in V2'))
-
-            migrated_comment = V1ToV2ObjectMap.get_v2_obj(XtdComment, comment_id)
-
-            if not migrated_comment:
-                max_order_value = XtdComment.objects.filter(thread_id=parent_comment.thread_id) \
-                    .values_list('order', flat=True).first()
-                comment = XtdComment.objects.create(
-                    content_type_id=content_type.id, object_pk=parent_comment.object_pk, user_name=row['user_name'],
+        # Replies are inserted in rounds: a reply whose parent is not in the
+        # database yet is deferred to the next round.
+        rows = self.with_progress(sql, cur, 'User [nested] comments migration in progress...')
+        num_rows = None
+        while True:
+            deferred = []
+            batch = []
+            for row in rows:
+                comment_id = row['comment_id']
+                content_type = self.content_type_map[row['model']]
+
+                if not content_type:
+                    self.stdout.write(self.style.ERROR(f'Content Type for {row["model"]} not found.'))
+                    continue
+
+                if self.object_map.get_v2_id(XtdComment, comment_id):
+                    continue
+
+                parent_comment = self.get_migrated_comment(row['parent_id'])
+                if not parent_comment:
+                    deferred.append(row)
+                    continue
+
+                parent_pk, thread_id, level, object_pk = parent_comment
+                comment = XtdComment(
+                    content_type_id=content_type.id, object_pk=object_pk, user_name=row['user_name'],
                     user_email=row['user_email'], submit_date=row['submit_date'],
                     comment=row['comment'], is_public=row['is_public'], is_removed=row['is_removed'],
-                    thread_id=parent_comment.thread_id,
-                    user=V1ToV2ObjectMap.get_v2_obj(get_user_model(), row['user_id']),
-                    level=parent_comment.level + 1, order=max_order_value + 1, followup=0, nested_count=0,
+                    thread_id=thread_id,
+                    user_id=self.object_map.get_v2_id(get_user_model(), row['user_id']),
+                    level=level + 1, order=1, followup=0, nested_count=0,
                     ip_address=row['ip_address'],
-                    parent_id=parent_comment.pk,
+                    parent_id=parent_pk,
                     site_id=1)
-                V1ToV2ObjectMap.create_map(comment, comment_id)
+                batch.append((comment, comment_id))
+                if len(batch) >= self.batch_size:
+                    self.create_comments(batch)
+                    batch = []
+            self.create_comments(batch)
+
+            if not deferred:
+                break
+            if len(deferred) == num_rows:
+                for row in deferred:
+                    self.stdout.write(
+                        self.style.ERROR(f'Parent comment for Comment ID:{row["comment_id"]} not found in V2'))
+                break
+            rows, num_rows = deferred, len(deferred)
+        cur.close()
+
+    def get_migrated_comment(self, v1_comment_id):
+        """
+        (pk, thread_id, level, object_pk) of a migrated comment
+        """
+        if v1_comment_id not in self.migrated_comments:
+            comment_pk = self.object_map.get_v2_id(XtdComment, v1_comment_id)
+            if comment_pk is None:
+                return None
+            self.migrated_comments[v1_comment_id] = XtdComment.norel_objects.filter(pk=comment_pk).values_list(
+                'pk', 'thread_id', 'level', 'object_pk').first()
+        return self.migrated_comments[v1_comment_id]
+
+    def create_comments(self, batch):
+        """
+        Insert comments in bulk, without XtdComment.save(). Root comments
+        become their own thread; order and nested_count are set afterwards
+        by update_comment_threads.
+        """
+        if not batch:
+            return
+
+        with transaction.atomic():
+            comments = bulk_insert(XtdComment, [comment for comment, __ in batch])
+            XtdComment.norel_objects.filter(pk__in=[comment.pk for comment in comments if not comment.parent_id]) \
+                .update(parent_id=F('pk'), thread_id=F('pk'))
+
+            for comment, comment_id in batch:
+                if not comment.parent_id:
+                    comment.parent_id = comment.thread_id = comment.pk
+                self.object_map.create_map(comment, comment_id)
+                self.migrated_comments[comment_id] = (comment.pk, comment.thread_id, comment.level, comment.object_pk)
+                self.migrated_comment_threads.add(comment.thread_id)
+                self.commented_objects.add((comment.content_type_id, comment.object_pk))
+            self.object_map.flush()
+
+    def update_comment_threads(self):
+        """
+        Number the comments of each migrated thread depth first, replies in
+        submission order, and count their replies, as XtdComment.save() does
+        when comments are posted one by one.
+        """
+        thread_ids = sorted(self.migrated_comment_threads)
+        for i in range(0, len(thread_ids), self.batch_size):
+            comments = list(XtdComment.norel_objects.filter(thread_id__in=thread_ids[i:i + self.batch_size]).only(
+                'pk', 'parent_id', 'submit_date', 'order', 'nested_count').order_by('submit_date', 'pk'))
+
+            replies = defaultdict(list)
+            for comment in comments:
+                if comment.parent_id != comment.pk:
+                    replies[comment.parent_id].append(comment)
+
+            def number(comment, order):
+                comment.order = order
+                comment.nested_count = 0
+                for reply in replies[comment.pk]:
+                    order = number(reply, order + 1)
+                    comment.nested_count += reply.nested_count + 1
+                return order
+
+            for comment in comments:
+                if comment.parent_id == comment.pk:
+                    number(comment, 1)
+            XtdComment.norel_objects.bulk_update(comments, ['order', 'nested_count'], batch_size=self.batch_size)
 
     def migrate_user_comments(self):
+        self.migrated_comments = {}
+        self.migrated_comment_threads = set()
+        self.commented_objects = set()
+
         self.migrate_root_level_user_comments()
         self.migrate_nested_user_comments()
+        self.update_comment_threads()
+
+        # Comments were inserted without post_save signals
+        for content_type_id in {content_type_id for content_type_id, __ in self.commented_objects}:
+            update_comment_counts(content_type_id)
+        for content_type_id, object_pk in self.commented_objects:
+            invalidate_comments_cache(content_type_id, object_pk)
 
     def migrate_comment_flags(self):
         sql = f'select * from django_comment_flags'
         cur = self.db_query(sql)
 
         for row in cur:
-            migrated_comment = V1ToV2ObjectMap.get_v2_obj(XtdComment, row['comment_id'])
-            migrated_user = V1ToV2ObjectMap.get_v2_obj(get_user_model(), row['user_id'])
+            migrated_comment_id = self.object_map.get_v2_id(XtdComment, row['comment_id'])
+            migrated_user_id = self.object_map.get_v2_id(get_user_model(), row['user_id'])
 
-            migrated_comment_flag = V1ToV2ObjectMap.get_v2_obj(CommentFlag, row['id'])
+            migrated_comment_flag = self.object_map.get_v2_id(CommentFlag, row['id'])
 
             if not migrated_comment_flag:
                 comment_flag = CommentFlag.objects.create(
-                    flag=row['flag'], flag_date=row['flag_date'], comment_id=migrated_comment.id,
-                    user_id=migrated_user.id)
-                V1ToV2ObjectMap.create_map(comment_flag, row['id'])
+                    flag=row['flag'], flag_date=row['flag_date'], comment_id=migrated_comment_id,
+                    user_id=migrated_user_id)
+                self.object_map.create_map(comment_flag, row['id'])
+        cur.close()
 
     def migrate_canned_responses(self):
         sql = f'select * from commenting_cannedresponse'
         cur = self.db_query(sql)
 
         for row in cur:
-            migrated_canned_response = V1ToV2ObjectMap.get_v2_obj(CannedResponse, row['id'])
+            migrated_canned_response = self.object_map.get_v2_id(CannedResponse, row['id'])
             if not migrated_canned_response:
                 canned_response = CannedResponse.objects.create(header=row['response_header'], text=row['response'])
-                V1ToV2ObjectMap.create_map(canned_response, row['id'])
+                self.object_map.create_map(canned_response, row['id'])
+        cur.close()
 
     def migrate_user_survey_submissions(self):
         sql = 'select * from surveys_molosurveysubmission mss ' \
               'inner join surveys_molosurveypage msp on mss.page_id = msp.page_ptr_id'
         cur = self.db_query(sql)
 
+        batch = []
         for row in self.with_progress(sql, cur, 'User Survey migration in progress...'):
-            try:
-                new_survey = V1ToV2ObjectMap.get_v2_obj(Survey, row['page_id'])
-                new_survey_page = Page.objects.get(pk=new_survey.id)
-            except (KeyError, AttributeError):
+            new_survey_id = self.object_map.get_v2_id(Survey, row['page_id'])
+            if not new_survey_id:
                 self.stdout.write(self.style.ERROR(f'Skipping Page: {row["page_id"]}'))
                 continue
 
@@ -378,17 +559,38 @@ class Command(BaseCommand):
                     new_key: value
                 })
 
-            migrated_submission = V1ToV2ObjectMap.get_v2_obj(UserSubmission, row['id'], extra='survey')
+            migrated_submission = self.object_map.get_v2_id(UserSubmission, row['id'], extra='survey')
 
             if not migrated_submission:
-                submission = UserSubmission.objects.create(
+                submission = UserSubmission(
                     form_data=json.dumps(altered_form_data, cls=DjangoJSONEncoder),
-                    page=new_survey_page,
-                    user=V1ToV2ObjectMap.get_v2_obj(get_user_model(), row['user_id']) if row['user_id'] else None,
+                    page_id=new_survey_id,
+                    user_id=self.object_map.get_v2_id(get_user_model(), row['user_id']) if row['user_id'] else None,
                 )
-                submission.submit_time = row['created_at']
-                submission.save()
-                V1ToV2ObjectMap.create_map(submission, row['id'], extra='survey')
+                batch.append((submission, row['created_at'], row['id']))
+                if len(batch) >= self.batch_size:
+                    self.create_submissions(batch, extra='survey')
+                    batch = []
+        self.create_submissions(batch, extra='survey')
+        cur.close()
+
+    def create_submissions(self, batch, extra):
+        """
+        Insert UserSubmissions in bulk. submit_time is set with a second
+        query because bulk_create applies auto_now_add.
+        """
+        if not batch:
+            return
+
+        with transaction.atomic():
+            submissions = bulk_create_with_pks(UserSubmission, [submission for submission, *__ in batch])
+            for submission, submit_time, __ in batch:
+                submission.submit_time = submit_time
+            UserSubmission.objects.bulk_update(submissions, ['submit_time'])
+
+            for submission, __, submission_id in batch:
+                self.object_map.create_map(submission, submission_id, extra=extra)
+            self.object_map.flush()
 
     def migrate_user_poll_submissions(self):
         sql = 'select  pcv.user_id, pcv.question_id, wcp_question.title, wcp_question.id, wcp_question.path \
@@ -401,6 +603,7 @@ class Command(BaseCommand):
                 group by pcv.user_id, pcv.question_id, wcp_question.title, wcp_question.id,  wcp_question.path'
         cur = self.db_query(sql)
 
+        batch = []
         for unique_submission in self.with_progress(sql, cur, 'User poll submissions migration in progress'):
             question_id = unique_submission['question_id']
             user_id = unique_submission['user_id']
@@ -415,31 +618,37 @@ class Command(BaseCommand):
                                     right outer join wagtailcore_page wcp_question on pcv.question_id = wcp_question.id \
                                     where pcv.question_id is not null and pcv.question_id={question_id} and ' \
                                    f'pcv.user_id={user_id}'
-            cursor = self.db_query(user_submissions_sql)
+            cursor = self.db_query(user_submissions_sql, server_side=False)
 
-            v2_poll = V1ToV2ObjectMap.get_v2_obj(Poll, page_id)
-            v2_poll_page = Page.objects.get(pk=v2_poll.page_ptr_id)
+            v2_poll_id = self.object_map.get_v2_id(Poll, page_id)
+            if not v2_poll_id:
+                self.stdout.write(self.style.ERROR(f'Skipping Page: {page_id}'))
+                continue
 
             answers = []
             for row in cursor:
                 answers.append(row['answer_title'])
+            cursor.close()
 
             form_title = get_field_clean_name(title)
             form_data = {
                 form_title: answers
             }
 
-            migrated_submission = V1ToV2ObjectMap.get_v2_obj(UserSubmission, row['id'], extra='poll')
+            migrated_submission = self.object_map.get_v2_id(UserSubmission, row['id'], extra='poll')
 
             if not migrated_submission:
-                submission = UserSubmission.objects.create(
+                submission = UserSubmission(
                     form_data=json.dumps(form_data, cls=DjangoJSONEncoder),
-                    page=v2_poll_page,
-                    user=V1ToV2ObjectMap.get_v2_obj(get_user_model(), row['user_id']) if row['user_id'] else None,
+                    page_id=v2_poll_id,
+                    user_id=self.object_map.get_v2_id(get_user_model(), row['user_id']) if row['user_id'] else None,
                 )
-                submission.submit_time = row['submission_date']
-                submission.save()
-                V1ToV2ObjectMap.create_map(submission, row['id'], extra='poll')
+                batch.append((submission, row['submission_date'], row['id']))
+                if len(batch) >= self.batch_size:
+                    self.create_submissions(batch, extra='poll')
+                    batch = []
+        self.create_submissions(batch, extra='poll')
+        cur.close()
 
     def migrate_user_freetext_poll_submissions(self):
         sql = f'select wcp.id, wcp.title, pftv.answer, pftv.id as submission_id, pftv.user_id, pftv.submission_date ' \
@@ -449,6 +658,7 @@ class Command(BaseCommand):
 
         cur = self.db_query(sql)
 
+        batch = []
         for freetext_submission in self.with_progress(sql, cur, 'User freetext poll submissions migration in progress'):
             title = freetext_submission['title']
             answer = freetext_submission['answer']
@@ -459,45 +669,51 @@ class Command(BaseCommand):
                 form_title: answer
             }
 
-            migrated_submission = V1ToV2ObjectMap.get_v2_obj(UserSubmission, freetext_submission['id'],
-                                                             extra='freetext_poll')
+            migrated_submission = self.object_map.get_v2_id(UserSubmission, submission_id, extra='freetext_poll')
 
-            v2_poll = V1ToV2ObjectMap.get_v2_obj(Poll, freetext_submission['id'])
-            v2_poll_page = Page.objects.get(pk=v2_poll.id)
+            v2_poll_id = self.object_map.get_v2_id(Poll, freetext_submission['id'])
+            if not v2_poll_id:
+                self.stdout.write(self.style.ERROR(f'Skipping Page: {freetext_submission["id"]}'))
+                continue
 
             if not migrated_submission:
-                submission = UserSubmission.objects.create(
+                submission = UserSubmission(
                     form_data=json.dumps(form_data, cls=DjangoJSONEncoder),
-                    page=v2_poll_page,
-                    user=V1ToV2ObjectMap.get_v2_obj(get_user_model(), freetext_submission['user_id']) if
+                    page_id=v2_poll_id,
+                    user_id=self.object_map.get_v2_id(get_user_model(), freetext_submission['user_id']) if
                     freetext_submission['user_id'] else None
                 )
-                submission.submit_time = freetext_submission['submission_date']
-                submission.save()
-                V1ToV2ObjectMap.create_map(submission, submission_id, extra='freetext_poll')
+                batch.append((submission, freetext_submission['submission_date'], submission_id))
+                if len(batch) >= self.batch_size:
+                    self.create_submissions(batch, extra='freetext_poll')
+                    batch = []
+        self.create_submissions(batch, extra='freetext_poll')
+        cur.close()
 
     def migrate_page_view_restrictions(self):
         sql = f'select * from wagtailcore_pageviewrestriction'
         cur = self.db_query(sql)
 
         for row in self.with_progress(sql, cur, 'User Page View Restrictions migration in progress'):
-            if not V1ToV2ObjectMap.get_v2_obj(PageViewRestriction, row['id']):
+            if not self.object_map.get_v2_id(PageViewRestriction, row['id']):
                 for klass in [Page, Article, Survey, Poll]:
-                    migrated_page = V1ToV2ObjectMap.get_v2_obj(klass, row['page_id'])
+                    migrated_page = self.object_map.get_v2_obj(klass, row['page_id'])
                     if migrated_page:
                         break
 
                 pvr = PageViewRestriction.objects.create(
                     page=migrated_page, restriction_type=row['restriction_type'], password=row['password'])
-                V1ToV2ObjectMap.create_map(pvr, row['id'])
+                self.object_map.create_map(pvr, row['id'])
 
                 pvr_groups_sql = f'select * from wagtailcore_pageviewrestriction_groups ' \
                                  f'where pageviewrestriction_id={row["id"]}'
-                pvr_groups_cur = self.db_query(pvr_groups_sql)
+                pvr_groups_cur = self.db_query(pvr_groups_sql, server_side=False)
 
                 for pvr_group in pvr_groups_cur:
-                    migrated_group = V1ToV2ObjectMap.get_v2_obj(Group, pvr_group['group_id'])
+                    migrated_group = self.object_map.get_v2_obj(Group, pvr_group['group_id'])
                     PageViewRestriction.groups.add(migrated_group)
+                pvr_groups_cur.close()
+        cur.close()
 
     def print_post_migration_report(self):
         self.stdout.write(self.style.ERROR('====================='))
@@ -507,3 +723,6 @@ class Command(BaseCommand):
         for k, v in self.post_migration_report_messages.items():
             self.stdout.write(self.style.ERROR(f"===> {k.replace('_', ' ').upper()}"))
             self.stdout.write(self.style.ERROR('\n'.join(v)))
+
+        self.stdout.write('===> PHASE TIMINGS')
+        self.stdout.write('\n'.join(self.phases.report()))
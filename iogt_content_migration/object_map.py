@@ -0,0 +1,60 @@
+from django.contrib.contenttypes.models import ContentType
+
+from home.models import V1ToV2ObjectMap
+
+
+class ObjectIdMap:
+    """
+    In-memory copy of V1ToV2ObjectMap for the migration commands. The
+    mappings of a content type are loaded with one query on first use, and
+    new mappings are kept in memory and written in batches by flush().
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.v2_ids = {}
+        self.v1_ids = {}
+        self.pending = []
+
+    def load(self, klass):
+        content_type = ContentType.objects.get_for_model(klass)
+        if content_type.id not in self.v2_ids:
+            v2_ids, v1_ids = {}, {}
+            for v1_object_id, object_id, extra in V1ToV2ObjectMap.objects.filter(
+                    content_type=content_type).values_list('v1_object_id', 'object_id', 'extra'):
+                v2_ids[(v1_object_id, extra)] = object_id
+                v1_ids[(object_id, extra)] = v1_object_id
+            self.v2_ids[content_type.id] = v2_ids
+            self.v1_ids[content_type.id] = v1_ids
+        return content_type, self.v2_ids[content_type.id], self.v1_ids[content_type.id]
+
+    def get_v1_id(self, klass, object_id, extra=None):
+        __, __, v1_ids = self.load(klass)
+        return v1_ids.get((int(object_id), extra))
+
+    def get_v2_id(self, klass, v1_object_id, extra=None):
+        __, v2_ids, __ = self.load(klass)
+        return v2_ids.get((int(v1_object_id), extra))
+
+    def get_v2_obj(self, klass, v1_object_id, extra=None):
+        object_id = self.get_v2_id(klass, v1_object_id, extra=extra)
+        if object_id is None:
+            return None
+        return klass._default_manager.filter(pk=object_id).first()
+
+    def create_map(self, content_object, v1_object_id, extra=None):
+        content_type, v2_ids, v1_ids = self.load(type(content_object))
+        key = (int(v1_object_id), extra)
+        if v2_ids.get(key) == content_object.pk:
+            return
+
+        v2_ids[key] = content_object.pk
+        v1_ids[(content_object.pk, extra)] = key[0]
+        self.pending.append(V1ToV2ObjectMap(
+            content_type=content_type, object_id=content_object.pk, v1_object_id=key[0], extra=extra))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        V1ToV2ObjectMap.objects.bulk_create(pending, batch_size=self.batch_size)
@@ -0,0 +1,98 @@
+from collections import defaultdict
+
+from django.db import DatabaseError, transaction
+from wagtail.core.models import Page
+
+from iogt_content_migration.utils import bulk_insert
+
+
+class BulkPageTreeBuilder:
+    """
+    Collects new pages whose treebeard path, depth and numchild are already
+    set and inserts them in batches instead of saving them one by one.
+
+    Pages are inserted without Page.save(), i.e. without validation, signals
+    or search indexing. url_path is derived from the parent's url_path in
+    memory, so parents must either be registered or be added before their
+    children are flushed.
+    """
+
+    def __init__(self, object_map, batch_size=500):
+        self.object_map = object_map
+        self.batch_size = batch_size
+        self.pending = []
+        self.url_paths = {}
+
+    def register(self, page):
+        """
+        Make an existing page available as a parent of pending pages.
+        """
+        self.url_paths[page.path] = page.url_path
+
+    def add(self, page, v1_object_id, tags=None, on_insert=None):
+        """
+        Queue page for insertion. on_insert is called once the page has a pk.
+        """
+        self.pending.append((page, v1_object_id, tags, on_insert))
+
+    def flush(self):
+        """
+        Insert all queued pages, parents before children. Returns the
+        (page, v1_object_id) pairs of pages that were skipped because their
+        parent does not exist or failed to insert, and the
+        (page, v1_object_id, error) triples of pages that failed to insert or
+        whose tags or on_insert callback failed.
+        """
+        pending, self.pending = self.pending, []
+        by_level = defaultdict(list)
+        for item in sorted(pending, key=lambda item: item[0].path):
+            by_level[(item[0].depth, type(item[0]))].append(item)
+
+        skipped, failed, inserted = [], [], []
+        with transaction.atomic():
+            for depth, model in sorted(by_level, key=lambda level: level[0]):
+                insertable = []
+                for page, v1_object_id, tags, on_insert in by_level[(depth, model)]:
+                    parent_url_path = self.url_paths.get(page.path[:-Page.steplen])
+                    if parent_url_path is None:
+                        skipped.append((page, v1_object_id))
+                        continue
+                    page.url_path = f'{parent_url_path}{page.slug}/'
+                    page.draft_title = page.draft_title or page.title
+                    insertable.append((page, v1_object_id, tags, on_insert))
+
+                for i in range(0, len(insertable), self.batch_size):
+                    for item in self._insert(model, insertable[i:i + self.batch_size], failed):
+                        page, v1_object_id, *__ = item
+                        self.url_paths[page.path] = page.url_path
+                        self.object_map.create_map(page, v1_object_id)
+                        inserted.append(item)
+            self.object_map.flush()
+
+        for page, v1_object_id, tags, on_insert in inserted:
+            try:
+                with transaction.atomic():
+                    if tags:
+                        page.tags.add(*tags)
+                    if on_insert:
+                        on_insert()
+            except Exception as e:
+                failed.append((page, v1_object_id, e))
+        return skipped, failed
+
+    def _insert(self, model, items, failed):
+        """
+        Insert the pages of items, falling back to one by one if the batch
+        fails. Returns the items that were inserted and adds the others to
+        failed.
+        """
+        try:
+            with transaction.atomic():
+                bulk_insert(model, [page for page, *__ in items])
+            return items
+        except DatabaseError as e:
+            if len(items) > 1:
+                return [inserted for item in items for inserted in self._insert(model, [item], failed)]
+            page, v1_object_id, *__ = items[0]
+            failed.append((page, v1_object_id, e))
+            return []
@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from home.models import V1MigrationPhase
+
+
+class PhaseRunner:
+    """
+    Runs the steps of a migration command and records each completed step in
+    V1MigrationPhase. With resume, steps that completed in an earlier run
+    are skipped. on_complete is called before a step is recorded, e.g. to
+    write out batched data the next run depends on.
+    """
+
+    def __init__(self, prefix, resume, stdout, on_complete=None):
+        self.prefix = prefix
+        self.on_complete = on_complete
+        self.resume = resume
+        self.stdout = stdout
+        self.timings = {}
+
+    def get_name(self, func):
+        return f'{self.prefix}.{func.__name__}'
+
+    def is_completed(self, func):
+        return V1MigrationPhase.objects.filter(name=self.get_name(func), completed_at__isnull=False).exists()
+
+    def run(self, func, *args):
+        if self.resume and self.is_completed(func):
+            self.stdout.write(f'Skipping completed phase, name={func.__name__}')
+            return None
+
+        start = time.monotonic()
+        result = func(*args)
+        if self.on_complete:
+            self.on_complete()
+        duration = timedelta(seconds=time.monotonic() - start)
+        V1MigrationPhase.objects.update_or_create(
+            name=self.get_name(func), defaults={'completed_at': timezone.now(), 'duration': duration})
+        self.timings[func.__name__] = duration
+        return result
+
+    def reset(self):
+        V1MigrationPhase.objects.filter(name__startswith=f'{self.prefix}.').delete()
+
+    def report(self):
+        return [f'{name}: {duration.total_seconds():.1f}s' for name, duration in self.timings.items()]
@@ -0,0 +1,59 @@
+from django.db import connections, router
+from django.db.models import AutoField
+
+
+def bulk_create_with_pks(model, objs, batch_size=None):
+    """
+    bulk_create that sets the pks of the objects on every database. Where a
+    bulk insert cannot return the new rows, e.g. on SQLite, the objects are
+    inserted one at a time instead.
+    """
+    using = router.db_for_write(model)
+    manager = model._base_manager.using(using)
+    if connections[using].features.can_return_rows_from_bulk_insert:
+        return manager.bulk_create(objs, batch_size=batch_size)
+
+    fields = [field for field in model._meta.local_concrete_fields if not isinstance(field, AutoField)]
+    for obj in objs:
+        [(obj.pk,)] = manager._insert([obj], fields=fields, returning_fields=model._meta.db_returning_fields)
+        obj._state.adding = False
+        obj._state.db = using
+    return objs
+
+
+def bulk_insert(model, objs):
+    """
+    bulk_create for models with multi-table inheritance, which Django does
+    not support: the rows of the base table are inserted with
+    bulk_create_with_pks, then each table of the subclasses with one
+    multi-row INSERT.
+    """
+    if not objs:
+        return objs
+
+    using = router.db_for_write(model)
+    tables = list(reversed(model._meta.get_parent_list())) + [model]
+    base = tables[0]
+    try:
+        base_objs = bulk_create_with_pks(base, [
+            base(**{field.attname: getattr(obj, field.attname) for field in base._meta.concrete_fields})
+            for obj in objs
+        ])
+        for obj, base_obj in zip(objs, base_objs):
+            setattr(obj, base._meta.pk.attname, base_obj.pk)
+
+        for table in tables[1:]:
+            for obj, base_obj in zip(objs, base_objs):
+                setattr(obj, table._meta.pk.attname, base_obj.pk)
+            table._base_manager._insert(objs, fields=table._meta.local_concrete_fields, using=using)
+    except Exception:
+        # The rows are rolled back, so the objects must not keep their pks
+        for obj in objs:
+            for table in tables:
+                setattr(obj, table._meta.pk.attname, None)
+        raise
+
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = using
+    return objs
@@ -1,5 +1,8 @@
+import hmac
+
 from django.conf import settings
-from rest_framework.authentication import BasicAuthentication
+from django.contrib.auth import get_user_model
+from rest_framework.authentication import BaseAuthentication, BasicAuthentication, get_authorization_header
 from rest_framework.exceptions import AuthenticationFailed
 
 
@@ -13,3 +16,31 @@ class RapidProBasicAuthentication(BasicAuthentication):
         if user and user[0].id != settings.RAPIDPRO_BOT_USER_ID:
             raise AuthenticationFailed('User not allowed.')
         return user
+
+
+class RapidProTokenAuthentication(BaseAuthentication):
+    """
+    Static token ("Token <RAPIDPRO_WEBHOOK_TOKEN>") authentication for the RapidPro webhook.
+    Unlike basic authentication, it does not run the password hasher on every request.
+    """
+    keyword = 'Token'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+
+        expected_token = settings.RAPIDPRO_WEBHOOK_TOKEN
+        if not expected_token or not hmac.compare_digest(auth[1], expected_token.encode()):
+            raise AuthenticationFailed('Invalid token.')
+
+        User = get_user_model()
+        try:
+            return User.get_rapidpro_bot_user(), None
+        except User.DoesNotExist:
+            raise AuthenticationFailed('RapidPro bot user not found.')
+
+    def authenticate_header(self, request):
+        return self.keyword
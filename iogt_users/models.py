@@ -2,7 +2,7 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 
@@ -20,9 +20,17 @@ class User(AbstractUser):
     def is_rapidpro_bot_user(self):
         return self.pk == settings.RAPIDPRO_BOT_USER_ID
 
+    # Process-wide cache of the RapidPro bot user, keyed by RAPIDPRO_BOT_USER_ID
+    _rapidpro_bot_user_cache = {}
+
     @classmethod
     def get_rapidpro_bot_user(cls):
-        return cls.objects.get(pk=settings.RAPIDPRO_BOT_USER_ID)
+        user_id = settings.RAPIDPRO_BOT_USER_ID
+        user = cls._rapidpro_bot_user_cache.get(user_id)
+        if user is None:
+            user = cls.objects.get(pk=user_id)
+            cls._rapidpro_bot_user_cache[user_id] = user
+        return user
 
     read_articles = models.ManyToManyField(to='home.Article')
 
@@ -58,3 +66,10 @@ class Profile(models.Model):
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def clear_rapidpro_bot_user_cache(sender, instance, **kwargs):
+    if instance.pk == settings.RAPIDPRO_BOT_USER_ID:
+        sender._rapidpro_bot_user_cache.clear()
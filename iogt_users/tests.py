@@ -6,6 +6,7 @@ from comments.models import CommentStatus
 from home.factories import ArticleFactory, SurveyFactory, SiteSettingsFactory
 from home.models import HomePage
 from iogt_users.factories import UserFactory
+from questionnaires.models import UserSubmission
 
 
 class PostRegistrationRedirectTests(TestCase):
@@ -33,3 +34,28 @@ class PostRegistrationRedirectTests(TestCase):
     def test_anonymous_user_can_browse_public_urls(self):
         response = self.client.get(self.home_page.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class UsersExportTests(TestCase):
+    def setUp(self) -> None:
+        self.admin_user = UserFactory(is_superuser=True, is_staff=True)
+        self.user = UserFactory()
+
+        self.home_page = HomePage.objects.first()
+        self.registration_survey = SurveyFactory.build()
+        self.home_page.add_child(instance=self.registration_survey)
+
+        self.site = Site.objects.filter(is_default_site=True).first()
+        SiteSettingsFactory.create(registration_survey=self.registration_survey, site_id=self.site.id)
+
+    def test_export_contains_earliest_registration_survey_response(self):
+        UserSubmission.objects.create(page=self.registration_survey, user=self.user, form_data='{"answer": "first"}')
+        UserSubmission.objects.create(page=self.registration_survey, user=self.user, form_data='{"answer": "second"}')
+        self.client.force_login(self.admin_user)
+
+        response = self.client.get('/admin/iogt_users/user/?export=csv')
+        content = b''.join(response.streaming_content).decode()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('first', content)
+        self.assertNotIn('second', content)
@@ -1,9 +1,14 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.db.models import OuterRef, Subquery
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.views.generic import UpdateView, TemplateView
+from wagtail.contrib.modeladmin.views import IndexView
+
+from home.models import SiteSettings
+from questionnaires.models import UserSubmission
 
 
 @method_decorator(login_required, name='dispatch')
@@ -47,3 +52,21 @@ class PostRegistrationSurveyView(TemplateView):
 
         context = self.get_context_data(**kwargs)
         return self.render_to_response(context)
+
+
+class UsersExportIndexView(IndexView):
+    export_chunk_size = 2000
+
+    def as_spreadsheet(self, queryset, spreadsheet_format):
+        queryset = self.annotate_registration_survey_response(queryset)
+        return super().as_spreadsheet(queryset.iterator(chunk_size=self.export_chunk_size), spreadsheet_format)
+
+    def annotate_registration_survey_response(self, queryset):
+        registration_survey = SiteSettings.get_for_default_site().registration_survey
+        if not registration_survey:
+            return queryset
+
+        page_ids = list(registration_survey.get_translations(inclusive=True).values_list('id', flat=True))
+        first_submission = UserSubmission.objects.filter(
+            user=OuterRef('pk'), page_id__in=page_ids).order_by('submit_time', 'id').values('form_data')[:1]
+        return queryset.annotate(registration_survey_response=Subquery(first_submission))
@@ -3,8 +3,8 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from wagtail.contrib.modeladmin.options import ModelAdmin, modeladmin_register
 
-from home.models import SiteSettings
 from iogt_users.filters import GroupsFilter
+from iogt_users.views import UsersExportIndexView
 
 
 class UsersExportAdmin(ModelAdmin):
@@ -20,15 +20,11 @@ class UsersExportAdmin(ModelAdmin):
     add_to_settings_menu = True
     list_per_page = 20
     menu_order = 601
+    index_view_class = UsersExportIndexView
 
     def registration_survey_response(self, obj):
-        registration_survey = SiteSettings.get_for_default_site().registration_survey
-        user_submission = None
-        if registration_survey:
-            ids = registration_survey.get_translations(inclusive=True).values_list('id', flat=True)
-            user_submission = obj.usersubmission_set.filter(page__pk__in=ids).order_by('submit_time').first()
-
-        return user_submission.form_data if user_submission else ''
+        # Annotated in bulk by UsersExportIndexView when exporting
+        return getattr(obj, 'registration_survey_response', None) or ''
 
     @property
     def export_filename(self):
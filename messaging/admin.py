@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from django.contrib import admin
 
-from .models import ChatbotChannel, Thread, UserThread, Message, Attachment
+from .models import ChatbotChannel, Thread, UserThread, Message, Attachment, OutboxMessage
 
 
 @admin.register(ChatbotChannel)
@@ -50,5 +50,23 @@ class AttachmentAdmin(admin.ModelAdmin):
         'modified',
         'external_link',
         'file',
+        'status',
+        'size',
+        'content_hash',
     )
-    list_filter = ('created', 'modified')
+    list_filter = ('status', 'created', 'modified')
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'thread',
+        'status',
+        'attempts',
+        'next_attempt_at',
+        'sent_at',
+        'created',
+    )
+    list_filter = ('status', 'created')
+    raw_id_fields = ('thread',)
@@ -4,7 +4,7 @@ from rest_framework import serializers
 class RapidProMessageSerializer(serializers.Serializer):
     channel = serializers.UUIDField()
     from_ = serializers.CharField(required=False)
-    id = serializers.CharField()
+    id = serializers.IntegerField()
     quick_replies = serializers.JSONField()
     text = serializers.CharField()
     to = serializers.UUIDField()
@@ -13,3 +13,7 @@ class RapidProMessageSerializer(serializers.Serializer):
         fields = super().get_fields()
         fields['from'] = fields.pop('from_')
         return fields
+
+
+class RapidProMessageBatchSerializer(serializers.Serializer):
+    messages = RapidProMessageSerializer(many=True, allow_empty=False)
@@ -1,9 +1,10 @@
 from django.urls import path
 
-from messaging.api.views import RapidProWebhook
+from messaging.api.views import RapidProBatchWebhook, RapidProWebhook
 
 app_name = 'api'
 
 urlpatterns = [
-    path('rapidpro-webhook/', RapidProWebhook.as_view(), name='rapidpro_webhook')
+    path('rapidpro-webhook/', RapidProWebhook.as_view(), name='rapidpro_webhook'),
+    path('rapidpro-webhook/batch/', RapidProBatchWebhook.as_view(), name='rapidpro_batch_webhook'),
 ]
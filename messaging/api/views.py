@@ -1,20 +1,17 @@
-from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 
-from .serializers import RapidProMessageSerializer
+from .serializers import RapidProMessageSerializer, RapidProMessageBatchSerializer
 from ..chat import ChatManager
 from ..models import Thread
-from iogt_users.authentication import RapidProBasicAuthentication
-
-User = get_user_model()
+from iogt_users.authentication import RapidProBasicAuthentication, RapidProTokenAuthentication
 
 
 class RapidProWebhook(APIView):
-    authentication_classes = [RapidProBasicAuthentication]
+    authentication_classes = [RapidProTokenAuthentication, RapidProBasicAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -30,7 +27,40 @@ class RapidProWebhook(APIView):
 
         chat_manager = ChatManager(thread)
         chat_manager.record_reply(
-            sender=User.get_rapidpro_bot_user(), text=text, quick_replies=quick_replies,
+            sender=request.user, text=text, quick_replies=quick_replies,
             rapidpro_message_id=rapidpro_message_id)
 
         return Response(data='ok', status=status.HTTP_200_OK)
+
+
+class RapidProBatchWebhook(APIView):
+    """
+    Accepts {"messages": [...]} with the same message format as
+    RapidProWebhook, so broadcasts can be delivered in a few requests.
+    Messages addressed to unknown threads are skipped and reported back.
+    """
+    authentication_classes = [RapidProTokenAuthentication, RapidProBasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = RapidProMessageBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        messages = serializer.validated_data['messages']
+
+        threads = Thread.objects.in_bulk({message['to'] for message in messages}, field_name='uuid')
+        unknown_threads = sorted({str(message['to']) for message in messages if message['to'] not in threads})
+
+        created, skipped = ChatManager.record_rapidpro_messages(
+            sender=request.user,
+            messages=[{
+                'rapidpro_message_id': message['id'],
+                'thread': threads[message['to']],
+                'text': message['text'],
+                'quick_replies': message['quick_replies'],
+            } for message in messages if message['to'] in threads])
+
+        return Response(data={
+            'created': created,
+            'skipped': skipped,
+            'unknown_threads': unknown_threads,
+        }, status=status.HTTP_200_OK)
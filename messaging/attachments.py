@@ -0,0 +1,77 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Attachment, AttachmentStatus, AttachmentTooLarge
+
+logger = logging.getLogger(__name__)
+
+
+class AttachmentDownloadWorker:
+    """
+    Fetch pending chatbot attachments outside of the RapidPro webhook.
+
+    Attachments are claimed by switching them to DOWNLOADING. Claims older
+    than RAPIDPRO_ATTACHMENT_LEASE_SECONDS are considered abandoned by a crashed
+    worker and are picked up again.
+    """
+
+    def __init__(self, concurrency=None, batch_size=None):
+        self.concurrency = concurrency or settings.RAPIDPRO_ATTACHMENT_CONCURRENCY
+        self.batch_size = batch_size or settings.RAPIDPRO_ATTACHMENT_BATCH_SIZE
+
+    def claim_batch(self):
+        lease_expired_at = timezone.now() - timedelta(seconds=settings.RAPIDPRO_ATTACHMENT_LEASE_SECONDS)
+        claimable = Q(status=AttachmentStatus.PENDING) | Q(
+            status=AttachmentStatus.DOWNLOADING, modified__lt=lease_expired_at)
+
+        with transaction.atomic():
+            ids = list(
+                Attachment.objects
+                .select_for_update(skip_locked=True)
+                .filter(claimable)
+                .order_by('modified', 'id')
+                .values_list('id', flat=True)[:self.batch_size]
+            )
+            Attachment.objects.filter(id__in=ids).update(
+                status=AttachmentStatus.DOWNLOADING, modified=timezone.now())
+
+        return list(Attachment.objects.filter(id__in=ids).order_by('id'))
+
+    def download(self, attachment):
+        try:
+            attachment.download_external_file()
+        except AttachmentTooLarge as e:
+            logger.warning('Skipping %s: %s', attachment, e)
+            attachment.mark_attempt_failed(permanent=True)
+            return False
+        except Exception as e:
+            logger.warning('Download of %s failed: %s', attachment, e)
+            attachment.mark_attempt_failed()
+            return False
+        return True
+
+    def _download_in_worker_thread(self, attachment):
+        try:
+            return self.download(attachment)
+        finally:
+            connection.close()
+
+    def run_once(self):
+        """
+        Download one batch of attachments. Returns (claimed, downloaded).
+        """
+        attachments = self.claim_batch()
+
+        if self.concurrency <= 1:
+            downloaded = sum(self.download(attachment) for attachment in attachments)
+        else:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                downloaded = sum(executor.map(self._download_in_worker_thread, attachments))
+
+        return len(attachments), downloaded
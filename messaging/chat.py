@@ -2,10 +2,10 @@ from django.contrib.auth import get_user_model
 from django.core import validators
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
+from django.db import transaction
 from django.utils import timezone
 
-from .models import Message, Thread, UserThread
-from messaging.rapidpro_client import RapidProClient
+from .models import Attachment, Message, OutboxMessage, Thread, UnreadThreadCounter, UserThread
 
 User = get_user_model()
 
@@ -21,12 +21,12 @@ class ChatManager:
         from_rapidpro_server = bool(rapidpro_message_id)
 
         if from_rapidpro_server:
-            message, created = Message.objects.get_or_create(rapidpro_message_id=rapidpro_message_id, defaults={
-                'sender': sender,
-                'text': text,
-                'quick_replies': quick_replies,
-                'thread': self.thread,
-            })
+            message, created = Message.objects.get_or_create(
+                thread=self.thread, rapidpro_message_id=rapidpro_message_id, defaults={
+                    'sender': sender,
+                    'text': text,
+                    'quick_replies': quick_replies,
+                })
             if not created:
                 # If the message already exists, we concatenate the newly received
                 # messages with the existing message. An assumption here is that
@@ -69,8 +69,8 @@ class ChatManager:
         if quick_replies is None:
             quick_replies = []
         if not sender.is_rapidpro_bot_user:
-            client = RapidProClient(self.thread)
-            client.send_reply(text)
+            # Delivered to RapidPro by the deliver_rapidpro_outbox command
+            OutboxMessage.objects.create(thread=self.thread, text=text)
 
         self._record_message_in_database(
             sender=sender, rapidpro_message_id=rapidpro_message_id, text=text, quick_replies=quick_replies)
@@ -78,6 +78,80 @@ class ChatManager:
         if mark_unread:
             self.thread.mark_unread(sender)
 
+    @staticmethod
+    def record_rapidpro_messages(sender, messages):
+        """
+        Record a batch of messages received from RapidPro with a fixed number
+        of queries. Each message is a dict with rapidpro_message_id, thread,
+        text and quick_replies. Parts of one message within the batch are
+        joined; messages already recorded in their thread are skipped, so a
+        batch can safely be delivered again. Returns the number of (created,
+        skipped) messages.
+        """
+        received = {}
+        for data in messages:
+            key = (data['thread'].pk, data['rapidpro_message_id'])
+            if key in received:
+                received[key]['text'] += data['text']
+            else:
+                received[key] = dict(data)
+
+        with transaction.atomic():
+            existing = set(Message.objects.filter(
+                thread_id__in={thread_id for thread_id, __ in received},
+                rapidpro_message_id__in={rapidpro_message_id for __, rapidpro_message_id in received},
+            ).values_list('thread_id', 'rapidpro_message_id'))
+
+            new_messages, attachment_links = [], {}
+            for key, data in received.items():
+                if key in existing:
+                    continue
+                cleaned_text, attachment_links[key] = ChatManager._parse_rapidpro_message(data['text'])
+                new_messages.append(Message(
+                    rapidpro_message_id=data['rapidpro_message_id'], sender=sender, text=cleaned_text,
+                    quick_replies=data['quick_replies'], thread=data['thread']))
+
+            # A batch recorded concurrently may have inserted some of these
+            # already; the unique constraint makes those rows no-ops
+            Message.objects.bulk_create(new_messages, ignore_conflicts=True)
+            ChatManager._link_attachments(attachment_links)
+
+            thread_ids = {message.thread_id for message in new_messages}
+            Thread.objects.filter(pk__in=thread_ids).update(last_message_at=timezone.now())
+            Thread.mark_threads_unread(thread_ids, sender)
+
+        return len(new_messages), len(received) - len(new_messages)
+
+    @staticmethod
+    def _link_attachments(attachment_links):
+        """
+        Link attachments given as {(thread_id, rapidpro_message_id): [links]}
+        to their messages, creating the Attachment rows that do not exist yet.
+        """
+        all_links = {link for links in attachment_links.values() for link in links}
+        if not all_links:
+            return
+
+        attachments = {attachment.external_link: attachment
+                       for attachment in Attachment.objects.filter(external_link__in=all_links)}
+        Attachment.objects.bulk_create(
+            [Attachment(external_link=link) for link in all_links if link not in attachments])
+        attachments.update({attachment.external_link: attachment
+                            for attachment in Attachment.objects.filter(external_link__in=all_links)})
+
+        message_ids = {
+            (thread_id, rapidpro_message_id): message_id
+            for message_id, thread_id, rapidpro_message_id in Message.objects.filter(
+                thread_id__in={thread_id for thread_id, __ in attachment_links},
+                rapidpro_message_id__in={rapidpro_message_id for __, rapidpro_message_id in attachment_links},
+            ).values_list('id', 'thread_id', 'rapidpro_message_id')
+        }
+        Message.attachments.through.objects.bulk_create([
+            Message.attachments.through(message_id=message_ids[key], attachment_id=attachments[link].pk)
+            for key, links in attachment_links.items()
+            for link in links
+        ], ignore_conflicts=True)
+
     @staticmethod
     def initiate_thread(sender, recipients, chatbot, subject, text):
         sender_thread = UserThread.objects.filter(user=sender, thread__chatbot=chatbot).first()
@@ -91,6 +165,7 @@ class ChatManager:
             for user in recipients + [sender]:
                 user_threads.append(UserThread(user=user, thread=thread))
             UserThread.objects.bulk_create(user_threads)
+            UnreadThreadCounter.adjust({user_thread.user.pk: 1 for user_thread in user_threads})
 
         chat_manager = ChatManager(thread)
         chat_manager.record_reply(sender=sender, text=text)
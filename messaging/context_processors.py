@@ -1,9 +1,8 @@
-from .models import Thread
+from .models import UnreadThreadCounter
 
 
 def user_messages(request):
     context = {}
     if request.user.is_authenticated:
-        context["inbox_threads"] = Thread.thread_objects.of_user(request.user).inbox()
-        context["unread_threads"] = Thread.thread_objects.of_user(request.user).unread()
+        context["unread_thread_count"] = UnreadThreadCounter.get_count(request.user)
     return context
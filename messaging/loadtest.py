@@ -0,0 +1,167 @@
+"""
+Building blocks of the messaging_load_test management command: a local
+stand-in for a RapidPro server and helpers to collect timings.
+"""
+import itertools
+import queue
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of a list of numbers
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, int(round(percent / 100 * len(ordered))) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+class Metrics:
+    """
+    Thread-safe collection of (duration, query count) samples per operation
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, operation, duration, num_queries=None):
+        with self._lock:
+            self.durations[operation].append(duration)
+            if num_queries is not None:
+                self.queries[operation].append(num_queries)
+
+    def record_error(self, operation):
+        with self._lock:
+            self.errors[operation] += 1
+
+    def measure(self, operation, func, *args, **kwargs):
+        """
+        Call func, recording its duration and the number of queries it ran on
+        this thread's connection. Responses with an error status count as errors.
+        """
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = func(*args, **kwargs)
+            duration = time.perf_counter() - start
+        if getattr(response, 'status_code', 200) >= 400:
+            self.record_error(operation)
+        else:
+            self.record(operation, duration, len(captured))
+        return response
+
+    def summary(self):
+        summary = {}
+        for operation in sorted(set(self.durations) | set(self.errors)):
+            durations = self.durations[operation]
+            queries = self.queries[operation]
+            summary[operation] = {
+                'count': len(durations),
+                'errors': self.errors[operation],
+                'p50_ms': _ms(percentile(durations, 50)),
+                'p90_ms': _ms(percentile(durations, 90)),
+                'p99_ms': _ms(percentile(durations, 99)),
+                'max_ms': _ms(max(durations) if durations else None),
+                'avg_queries': round(sum(queries) / len(queries), 1) if queries else None,
+                'max_queries': max(queries) if queries else None,
+            }
+        return summary
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class FakeRapidPro:
+    """
+    Local HTTP server answering RapidProClient.send_reply calls. Every received
+    reply is answered by posting a bot message back to the RapidPro webhook
+    after `reply_delay` seconds, through the Django test client.
+    """
+
+    def __init__(self, metrics, webhook_token, reply_delay=0.0, webhook_workers=4):
+        self.metrics = metrics
+        self.webhook_token = webhook_token
+        self.reply_delay = reply_delay
+        self.webhook_workers = webhook_workers
+        self.received = queue.Queue()
+        self._message_ids = itertools.count(1)
+        self._id_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._threads = []
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}/receive'
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                fake.received.put((params.get('from', [''])[0], params.get('text', [''])[0], time.monotonic()))
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b'ok')
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _next_message_id(self):
+        with self._id_lock:
+            return next(self._message_ids)
+
+    def _fire_webhooks(self):
+        client = Client(HTTP_AUTHORIZATION=f'Token {self.webhook_token}')
+        path = reverse('messaging:api:rapidpro_webhook')
+        try:
+            while True:
+                item = self.received.get()
+                if item is None:
+                    break
+                thread_uuid, text, received_at = item
+                remaining_delay = self.reply_delay - (time.monotonic() - received_at)
+                if remaining_delay > 0:
+                    time.sleep(remaining_delay)
+                self.metrics.measure('webhook', client.post, path, content_type='application/json', data={
+                    'id': str(self._next_message_id()),
+                    'text': f'Echo: {text}',
+                    'to': thread_uuid,
+                    'from': 'load-test',
+                    'channel': '00000000-0000-0000-0000-000000000000',
+                    'quick_replies': [],
+                })
+        finally:
+            connection.close()
+
+    def start(self):
+        server_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        server_thread.start()
+        self._threads.append(server_thread)
+        for _ in range(self.webhook_workers):
+            worker = threading.Thread(target=self._fire_webhooks, daemon=True)
+            worker.start()
+            self._threads.append(worker)
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        for _ in range(self.webhook_workers):
+            self.received.put(None)
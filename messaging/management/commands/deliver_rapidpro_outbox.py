@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from messaging.outbox import OutboxDeliveryWorker
+
+
+class Command(BaseCommand):
+    """
+    This command delivers the user replies queued in the RapidPro outbox.
+    Run it with --loop as a long running worker process next to the web
+    server, or without it from a scheduler to deliver a single batch.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox for new messages.')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait between polls when the outbox is empty.')
+        parser.add_argument('--concurrency', type=int, default=settings.RAPIDPRO_OUTBOX_CONCURRENCY,
+                            help='Maximum number of threads delivered to in parallel.')
+        parser.add_argument('--batch-size', type=int, default=settings.RAPIDPRO_OUTBOX_BATCH_SIZE,
+                            help='Maximum number of messages claimed at once.')
+
+    def handle(self, *args, **options):
+        worker = OutboxDeliveryWorker(concurrency=options['concurrency'], batch_size=options['batch_size'])
+
+        while True:
+            claimed, delivered = worker.run_once()
+            if claimed:
+                self.stdout.write(f'Delivered {delivered} of {claimed} outbox messages.')
+
+            if not options['loop']:
+                break
+            if not claimed:
+                time.sleep(options['interval'])
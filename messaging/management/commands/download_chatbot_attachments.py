@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from messaging.attachments import AttachmentDownloadWorker
+
+
+class Command(BaseCommand):
+    """
+    This command downloads the attachments of messages received from
+    RapidPro. Run it with --loop as a long running worker process, or
+    without it from a scheduler to download a single batch.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new attachments.')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait between polls when there is nothing to download.')
+        parser.add_argument('--concurrency', type=int, default=settings.RAPIDPRO_ATTACHMENT_CONCURRENCY,
+                            help='Maximum number of parallel downloads.')
+        parser.add_argument('--batch-size', type=int, default=settings.RAPIDPRO_ATTACHMENT_BATCH_SIZE,
+                            help='Maximum number of attachments claimed at once.')
+
+    def handle(self, *args, **options):
+        worker = AttachmentDownloadWorker(concurrency=options['concurrency'], batch_size=options['batch_size'])
+
+        while True:
+            claimed, downloaded = worker.run_once()
+            if claimed:
+                self.stdout.write(f'Downloaded {downloaded} of {claimed} attachments.')
+
+            if not options['loop']:
+                break
+            if not claimed:
+                time.sleep(options['interval'])
@@ -13,6 +13,10 @@ class Command(BaseCommand):
     """
 
     def handle(self, *args, **options):
+        if settings.RAPIDPRO_WEBHOOK_TOKEN:
+            self.stdout.write(self.style.SUCCESS(f'Token {settings.RAPIDPRO_WEBHOOK_TOKEN}'))
+            return
+
         auth_str = f'{settings.RAPIDPRO_BOT_USER_USERNAME}:{settings.RAPIDPRO_BOT_USER_PASSWORD}'
         message_bytes = auth_str.encode('ascii')
         base64_bytes = base64.b64encode(message_bytes)
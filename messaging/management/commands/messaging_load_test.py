@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from messaging.loadtest import FakeRapidPro, Metrics
+from messaging.models import ChatbotChannel, Message, Thread, UserThread
+from messaging.outbox import OutboxDeliveryWorker
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    This command load tests the messaging stack end to end on one machine,
+    without network access. It starts a local fake RapidPro server and
+    simulates users who start a chat and reply to it. Each reply goes
+    through ThreadDetailView.post, the outbox, the fake RapidPro server and
+    back through the RapidPro webhook. Latency percentiles, query counts
+    and throughput are reported for every step.
+
+    It creates users, a chatbot channel and threads in the configured
+    database and deletes them afterwards, so never run it against
+    production. Use PostgreSQL for meaningful concurrency numbers; SQLite
+    serialises all writes.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Number of concurrent simulated users.')
+        parser.add_argument('--replies', type=int, default=5, help='Replies sent by each user.')
+        parser.add_argument('--bot-delay', type=float, default=0.0,
+                            help='Seconds the fake RapidPro waits before answering.')
+        parser.add_argument('--reply-timeout', type=float, default=30.0,
+                            help='Seconds a user waits for the bot to answer a reply.')
+        parser.add_argument('--output', help='Also write the report as JSON to this file.')
+        parser.add_argument('--keep-data', action='store_true', help='Do not delete the generated data.')
+        parser.add_argument('--force', action='store_true', help='Run even if DEBUG is off.')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('Refusing to write load test data with DEBUG off. Use --force to run anyway.')
+
+        run_id = uuid.uuid4().hex[:8]
+        metrics = Metrics()
+        bot_user = User.objects.create_user(username=f'loadtest-{run_id}-bot', password=uuid.uuid4().hex)
+        webhook_token = uuid.uuid4().hex
+        users = [
+            User.objects.create_user(
+                username=f'loadtest-{run_id}-user{i}', password=uuid.uuid4().hex,
+                has_filled_registration_survey=True, terms_accepted=True)
+            for i in range(options['users'])
+        ]
+        fake_rapidpro = FakeRapidPro(metrics, webhook_token, reply_delay=options['bot_delay'])
+        chatbot = ChatbotChannel.objects.create(display_name=f'Load test {run_id}', request_url=fake_rapidpro.url)
+
+        stop_delivery = threading.Event()
+        test_settings = override_settings(
+            RAPIDPRO_BOT_USER_ID=bot_user.pk,
+            RAPIDPRO_WEBHOOK_TOKEN=webhook_token,
+            ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver'],
+        )
+        test_settings.enable()
+        fake_rapidpro.start()
+        delivery_thread = threading.Thread(target=self._deliver_outbox, args=(stop_delivery,), daemon=True)
+        delivery_thread.start()
+
+        try:
+            start = time.perf_counter()
+            user_threads = [
+                threading.Thread(target=self._simulate_user, args=(user, chatbot, metrics, options))
+                for user in users
+            ]
+            for user_thread in user_threads:
+                user_thread.start()
+            for user_thread in user_threads:
+                user_thread.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            stop_delivery.set()
+            delivery_thread.join()
+            fake_rapidpro.stop()
+            test_settings.disable()
+            if not options['keep_data']:
+                Thread.objects.filter(chatbot=chatbot).delete()
+                chatbot.delete()
+                User.objects.filter(pk__in=[user.pk for user in users] + [bot_user.pk]).delete()
+
+        round_trips = len(metrics.durations['round_trip'])
+        report = {
+            'users': options['users'],
+            'replies_per_user': options['replies'],
+            'elapsed_seconds': round(elapsed, 2),
+            'round_trips_per_second': round(round_trips / elapsed, 2) if elapsed else None,
+            'operations': metrics.summary(),
+        }
+        self._print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+    def _deliver_outbox(self, stop):
+        worker = OutboxDeliveryWorker()
+        try:
+            while not stop.is_set():
+                claimed, _ = worker.run_once()
+                if not claimed:
+                    stop.wait(0.05)
+        finally:
+            connection.close()
+
+    def _simulate_user(self, user, chatbot, metrics, options):
+        client = Client()
+        client.force_login(user)
+        try:
+            metrics.measure('create_thread', client.post, reverse('messaging:message_create'), data={
+                'subject': 'Load test', 'chatbot': chatbot.pk, 'text': 'Hello'})
+            user_thread = UserThread.objects.filter(user=user, thread__chatbot=chatbot).select_related('thread').first()
+            if not user_thread:
+                metrics.record_error('round_trip')
+                return
+            thread = user_thread.thread
+            thread_url = reverse('messaging:thread', kwargs={'thread_id': thread.pk})
+
+            for i in range(options['replies']):
+                last_id = thread.messages.order_by('-id').values_list('id', flat=True).first() or 0
+                sent_at = time.perf_counter()
+                metrics.measure('reply', client.post, thread_url, data={
+                    'text': f'Reply {i}', 'thread': thread.pk, 'user': user.pk})
+                if self._wait_for_bot_reply(thread, last_id, options['reply_timeout']):
+                    metrics.record('round_trip', time.perf_counter() - sent_at)
+                else:
+                    metrics.record_error('round_trip')
+                metrics.measure('view_thread', client.get, thread_url)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _wait_for_bot_reply(thread, after_id, timeout):
+        deadline = time.perf_counter() + timeout
+        bot_user_id = settings.RAPIDPRO_BOT_USER_ID
+        while time.perf_counter() < deadline:
+            if Message.objects.filter(thread=thread, sender_id=bot_user_id, id__gt=after_id).exists():
+                return True
+            time.sleep(0.02)
+        return False
+
+    def _print_report(self, report):
+        self.stdout.write(
+            f"{report['users']} users x {report['replies_per_user']} replies in {report['elapsed_seconds']}s "
+            f"({report['round_trips_per_second']} round trips/s)")
+        columns = ('count', 'errors', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'avg_queries', 'max_queries')
+        self.stdout.write(f"{'operation':<15}" + ''.join(f'{column:>12}' for column in columns))
+        for operation, stats in report['operations'].items():
+            self.stdout.write(f'{operation:<15}' + ''.join(f'{str(stats[column]):>12}' for column in columns))
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from messaging.models import UnreadThreadCounter, UserThread
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    This command rebuilds the unread thread counters from the UserThread
+    table, e.g. after UserThreads were changed outside of the messaging app.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        user_ids = list(UserThread.objects.order_by('user_id').values_list('user_id', flat=True).distinct())
+        user_ids += list(UnreadThreadCounter.objects.exclude(user_id__in=user_ids).values_list('user_id', flat=True))
+
+        batch_size = options['batch_size']
+        for i in range(0, len(user_ids), batch_size):
+            UnreadThreadCounter.recount(user_ids[i:i + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f'Recounted unread threads of {len(user_ids)} users.'))
@@ -0,0 +1,44 @@
+# Generated by Django 3.1.14 on 2026-10-19 01:58
+
+from django.db import migrations, models
+
+
+def mark_existing_attachments_downloaded(apps, schema_editor):
+    Attachment = apps.get_model('messaging', 'Attachment')
+    Attachment.objects.exclude(file='', image__isnull=True).exclude(
+        file__isnull=True, image__isnull=True).update(status='downloaded')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0003_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('downloading', 'Downloading'), ('downloaded', 'Downloaded'), ('failed', 'Failed')], default='pending', max_length=15),
+        ),
+        migrations.AddIndex(
+            model_name='attachment',
+            index=models.Index(fields=['status', 'modified'], name='messaging_a_status_218b9f_idx'),
+        ),
+        migrations.RunPython(mark_existing_attachments_downloaded, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.1.14 on 2026-10-19 01:59
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_attachment_download_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='rapidpro_message_id',
+            field=models.IntegerField(db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='thread',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
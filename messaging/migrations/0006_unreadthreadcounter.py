@@ -0,0 +1,22 @@
+# Generated by Django 3.1.14 on 2026-10-19 02:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iogt_users', '0002_user_read_articles'),
+        ('messaging', '0005_thread_uuid_unique_message_rapidpro_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadThreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_thread_counter', serialize=False, to='iogt_users.user')),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
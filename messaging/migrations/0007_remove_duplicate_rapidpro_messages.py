@@ -0,0 +1,32 @@
+# Generated by Django 3.1.14 on 2026-10-19 03:07
+
+from django.db import migrations, models
+
+
+def remove_duplicate_rapidpro_messages(apps, schema_editor):
+    # Replayed batches could record a RapidPro message more than once in a
+    # thread; keep the first copy
+    Message = apps.get_model('messaging', 'Message')
+    duplicates = (
+        Message.objects
+        .filter(rapidpro_message_id__isnull=False)
+        .values('thread_id', 'rapidpro_message_id')
+        .annotate(count=models.Count('id'), first_id=models.Min('id'))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        Message.objects.filter(
+            thread_id=duplicate['thread_id'],
+            rapidpro_message_id=duplicate['rapidpro_message_id'],
+        ).exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0006_unreadthreadcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_rapidpro_messages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-19 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0007_remove_duplicate_rapidpro_messages'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('thread', 'rapidpro_message_id'), name='unique_rapidpro_message_id_per_thread'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_last_message_at(apps, schema_editor):
+    Message = apps.get_model('messaging', 'Message')
+    Thread = apps.get_model('messaging', 'Thread')
+    latest_message = Message.objects.filter(thread=OuterRef('pk')).order_by('-sent_at')
+    Thread.objects.filter(last_message_at__isnull=True).update(
+        last_message_at=Subquery(latest_message.values('sent_at')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0008_unique_rapidpro_message_id_per_thread'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_last_message_at, migrations.RunPython.noop),
+    ]
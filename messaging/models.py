@@ -1,18 +1,28 @@
+import hashlib
 import logging
+import tempfile
 import uuid
-from io import BytesIO
+from collections import Counter, defaultdict
+from datetime import timedelta
 
-import requests
 from PIL import Image as PILImage, UnidentifiedImageError
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files import File
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.urls import reverse
+from django.utils import timezone
 from django_extensions.db.models import TimeStampedModel
-from rest_framework import status
 from wagtail.images.models import Image
 
+from home.utils.cache import is_process_local_cache
+
 from .querysets import ThreadQuerySet
+from .rapidpro_client import get_session
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +38,7 @@ class ChatbotChannel(models.Model):
 class Thread(models.Model):
     last_message_at = models.DateTimeField(null=True, editable=False, default=None)
     subject = models.CharField(max_length=150)
-    uuid = models.UUIDField(default=uuid.uuid4, editable=False)
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
 
     chatbot = models.ForeignKey('ChatbotChannel', on_delete=models.PROTECT)
     users = models.ManyToManyField(get_user_model(), through="UserThread")
@@ -41,17 +51,37 @@ class Thread(models.Model):
         return self.messages.order_by('-sent_at').first()
 
     def mark_read(self, user):
-        self.user_threads.filter(user=user).update(is_read=True)
+        UserThread.set_read(self.user_threads.filter(user=user), is_read=True)
 
     def mark_unread(self, sender=None):
         """
         Mark all related UserThread(s) unread
         """
+        Thread.mark_threads_unread([self.pk], sender)
+
+    @classmethod
+    def mark_threads_unread(cls, thread_ids, sender=None):
+        """
+        Mark the UserThread(s) of all given threads unread, except for the sender
+        """
+        user_threads = UserThread.objects.filter(thread_id__in=thread_ids)
         if sender:
-            self.user_threads.exclude(user=sender).update(is_read=False)
-            self.user_threads.filter(user=sender).update(is_read=True)
+            UserThread.set_read(user_threads.exclude(user=sender), is_read=False)
+            UserThread.set_read(user_threads.filter(user=sender), is_read=True)
         else:
-            self.user_threads.update(is_read=False)
+            UserThread.set_read(user_threads, is_read=False)
+
+    def mark_deleted(self, user):
+        """
+        Move the thread to the user's deleted folder
+        """
+        with transaction.atomic():
+            user_threads = list(self.user_threads.select_for_update().filter(
+                user=user, is_active=True).values_list('id', 'is_read'))
+            UserThread.objects.filter(id__in=[pk for pk, _ in user_threads]).update(is_active=False)
+            unread = sum(1 for _, is_read in user_threads if not is_read)
+            if unread:
+                UnreadThreadCounter.adjust({user.pk: -unread})
 
     def __str__(self):
         return f"{self.subject}: {self.chatbot.display_name} {', '.join([str(user) for user in self.users.all()])}"
@@ -68,16 +98,132 @@ class UserThread(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
 
     @classmethod
-    def get_user_inbox(cls, user):
-        return cls.objects.filter(user=user, is_active=True).order_by(
-            '-thread__last_message_at')
+    def get_user_inbox(cls, user, is_active=True):
+        """
+        The user's threads, newest first and those without a last_message_at
+        last, annotated with the text of their latest message so listing them
+        does not load any messages.
+        """
+        latest_message = Message.objects.filter(thread=OuterRef('thread')).order_by('-sent_at', '-id')
+        return cls.objects.filter(user=user, is_active=is_active).select_related('thread').annotate(
+            latest_message_text=Subquery(latest_message.values('text')[:1])
+        ).order_by(F('thread__last_message_at').desc(nulls_last=True), '-id')
+
+    @staticmethod
+    def set_read(user_threads, is_read):
+        """
+        Update is_read of the given UserThread queryset, keeping the
+        UnreadThreadCounter of the affected users in step.
+        """
+        with transaction.atomic():
+            changed = list(user_threads.select_for_update().filter(
+                is_read=not is_read).values_list('id', 'user_id', 'is_active'))
+            if not changed:
+                return
+
+            UserThread.objects.filter(id__in=[pk for pk, _, _ in changed]).update(is_read=is_read)
+            delta = -1 if is_read else 1
+            deltas = Counter(user_id for _, user_id, is_active in changed if is_active)
+            UnreadThreadCounter.adjust({user_id: delta * count for user_id, count in deltas.items()})
+
+
+class UnreadThreadCounter(models.Model):
+    """
+    Number of unread threads in a user's inbox, so the unread badge can be
+    shown without a join across UserThread and Thread. It is kept up to date
+    by UserThread.set_read, Thread.mark_deleted and the deletion of
+    UserThread(s), and can be rebuilt with the recount_unread_threads
+    command. The count is only cached if the cache is shared by all
+    processes.
+    """
+    user = models.OneToOneField(get_user_model(), primary_key=True, on_delete=models.CASCADE,
+                                related_name='unread_thread_counter')
+    count = models.IntegerField(default=0)
+
+    cache_timeout = 60 * 60 * 24
+
+    @staticmethod
+    def cache_key(user_id):
+        return f'messaging:unread_thread_count:{user_id}'
+
+    @classmethod
+    def get_count(cls, user):
+        use_cache = not is_process_local_cache()
+        key = cls.cache_key(user.pk)
+        count = cache.get(key) if use_cache else None
+        if count is None:
+            count = cls.objects.filter(user=user).values_list('count', flat=True).first()
+            if count is None:
+                count = cls.recount([user.pk])[user.pk]
+            if use_cache:
+                cache.set(key, count, cls.cache_timeout)
+        return count
+
+    @classmethod
+    def adjust(cls, deltas, recount_missing=True):
+        """
+        Atomically add {user_id: delta} to the counters. Missing counters are
+        rebuilt from the UserThread(s) unless recount_missing is False.
+        """
+        user_ids_by_delta = defaultdict(list)
+        for user_id, delta in deltas.items():
+            if delta:
+                user_ids_by_delta[delta].append(user_id)
+
+        existing = set(cls.objects.filter(user_id__in=list(deltas)).values_list('user_id', flat=True))
+        for delta, user_ids in user_ids_by_delta.items():
+            cls.objects.filter(user_id__in=user_ids).update(count=F('count') + delta)
+
+        missing = set(deltas) - existing
+        if missing and recount_missing:
+            cls.recount(missing)
+        cls._clear_cache(deltas)
+
+    @classmethod
+    def recount(cls, user_ids):
+        """
+        Rebuild the counters of the given users from their UserThread(s)
+        """
+        user_ids = list(user_ids)
+        counts = dict(
+            UserThread.objects.filter(user_id__in=user_ids, is_active=True, is_read=False)
+            .order_by().values('user_id').annotate(count=Count('id')).values_list('user_id', 'count'))
+        counts = {user_id: counts.get(user_id, 0) for user_id in user_ids}
+
+        cls.objects.bulk_create([cls(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        user_ids_by_count = defaultdict(list)
+        for user_id, count in counts.items():
+            user_ids_by_count[count].append(user_id)
+        for count, ids in user_ids_by_count.items():
+            cls.objects.filter(user_id__in=ids).update(count=count)
+
+        cls._clear_cache(user_ids)
+        return counts
+
+    @classmethod
+    def _clear_cache(cls, user_ids):
+        keys = [cls.cache_key(user_id) for user_id in user_ids]
+        # Cleared again on commit in case a concurrent request cached the old count meanwhile
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+    def __str__(self):
+        return f'{self.user}: {self.count} unread'
+
+
+@receiver(post_delete, sender=UserThread)
+def decrement_unread_thread_counter(sender, instance, **kwargs):
+    # Also runs when threads or users are deleted, e.g. from the admin; the
+    # counter of a user being deleted may be gone already, so it is not rebuilt
+    if instance.is_active and not instance.is_read:
+        UnreadThreadCounter.adjust({instance.user_id: -1}, recount_missing=False)
 
 
 class Message(models.Model):
     # Quick replies are encoded as a json string
     quick_replies = models.JSONField(default=list)
     # If sent from RapidPro, the ID the message has in RapidPro.
-    rapidpro_message_id = models.IntegerField(null=True)
+    rapidpro_message_id = models.IntegerField(null=True, db_index=True)
     sent_at = models.DateTimeField(auto_now_add=True)
     text = models.TextField()
 
@@ -87,47 +233,183 @@ class Message(models.Model):
     attachments = models.ManyToManyField('Attachment', blank=True)
 
     def update_or_create_attachments(self, attachment_links):
+        """
+        Link the attachments to this message. The files themselves are
+        fetched later by the download_chatbot_attachments command.
+        """
         for link in attachment_links:
             if not self.attachments.filter(external_link=link).exists():
                 attachment, created = Attachment.objects.get_or_create(external_link=link)
-                if not attachment.file:
-                    attachment.download_external_file()
                 self.attachments.add(attachment)
 
     class Meta:
         ordering = ("sent_at",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['thread', 'rapidpro_message_id'], name='unique_rapidpro_message_id_per_thread'),
+        ]
 
     def get_absolute_url(self):
         return self.thread.get_absolute_url()
 
 
+class AttachmentStatus:
+    PENDING = 'pending'
+    DOWNLOADING = 'downloading'
+    DOWNLOADED = 'downloaded'
+    FAILED = 'failed'
+
+    Choices = (
+        (PENDING, 'Pending'),
+        (DOWNLOADING, 'Downloading'),
+        (DOWNLOADED, 'Downloaded'),
+        (FAILED, 'Failed'),
+    )
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
 class Attachment(TimeStampedModel):
     external_link = models.URLField()
     file = models.FileField(null=True, blank=True)
     image = models.ForeignKey(to=Image, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=15, choices=AttachmentStatus.Choices, default=AttachmentStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # SHA-256 of the downloaded content, used to store identical media once
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    size = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(fields=['status', 'modified']),
+        ]
 
     @staticmethod
-    def _verify_image(content):
+    def _verify_image(file):
         try:
-            image = PILImage.open(BytesIO(content))
+            image = PILImage.open(file)
             image.verify()
             image.close()
             return True
         except UnidentifiedImageError:
             return False
+        finally:
+            file.seek(0)
+
+    def _stream_to_file(self, response, file):
+        """
+        Copy the response body to file in chunks, enforcing the size limit.
+        Returns the content hash and size.
+        """
+        max_size = settings.RAPIDPRO_ATTACHMENT_MAX_SIZE
+        content_length = response.headers.get('Content-Length')
+        if content_length and int(content_length) > max_size:
+            raise AttachmentTooLarge(f'{self.external_link} is {content_length} bytes')
+
+        content_hash = hashlib.sha256()
+        size = 0
+        for chunk in response.iter_content(chunk_size=settings.RAPIDPRO_ATTACHMENT_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise AttachmentTooLarge(f'{self.external_link} is larger than {max_size} bytes')
+            content_hash.update(chunk)
+            file.write(chunk)
+
+        file.seek(0)
+        return content_hash.hexdigest(), size
 
     def download_external_file(self):
-        response = requests.get(self.external_link, allow_redirects=True)
+        with get_session().get(self.external_link, allow_redirects=True, stream=True,
+                               timeout=settings.RAPIDPRO_REQUEST_TIMEOUT) as response:
+            response.raise_for_status()
+
+            with tempfile.TemporaryFile() as temporary_file:
+                self.content_hash, self.size = self._stream_to_file(response, temporary_file)
+
+                duplicate = Attachment.objects.filter(
+                    content_hash=self.content_hash, status=AttachmentStatus.DOWNLOADED).exclude(pk=self.pk).first()
+                if duplicate:
+                    self.file = duplicate.file.name or None
+                    self.image = duplicate.image
+                else:
+                    filename = self.external_link.split('/')[-1]
+                    file = File(temporary_file, name=filename)
+                    if Attachment._verify_image(temporary_file):
+                        self.image = Image.objects.create(file=file)
+                    else:
+                        self.file = file
+
+                self.status = AttachmentStatus.DOWNLOADED
+                self.save()
+
+    def mark_attempt_failed(self, permanent=False):
+        self.attempts += 1
+        if permanent or self.attempts >= settings.RAPIDPRO_ATTACHMENT_MAX_ATTEMPTS:
+            self.status = AttachmentStatus.FAILED
+        else:
+            self.status = AttachmentStatus.PENDING
+        self.save(update_fields=['attempts', 'status', 'modified'])
+
+    def __str__(self):
+        return f'Attachment #{self.pk}'
+
 
-        if response.status_code == status.HTTP_200_OK:
-            filename = self.external_link.split('/')[-1]
-            file = File(BytesIO(response.content), name=filename)
+class OutboxStatus:
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    Choices = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+
+class OutboxMessage(TimeStampedModel):
+    """
+    A user reply waiting to be delivered to RapidPro. Replies are stored here
+    by ChatManager and sent by the deliver_rapidpro_outbox command, so the
+    user's request never waits on the RapidPro server.
+    """
+    status = models.CharField(max_length=15, choices=OutboxStatus.Choices, default=OutboxStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    text = models.TextField()
 
-            if Attachment._verify_image(response.content):
-                self.image = Image.objects.create(file=file)
-            else:
-                self.file = file
-            self.save()
+    thread = models.ForeignKey('Thread', related_name='outbox_messages', on_delete=models.CASCADE)
+
+    class Meta:
+        ordering = ('created', 'id')
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def mark_sent(self):
+        self.status = OutboxStatus.SENT
+        self.sent_at = timezone.now()
+        self.last_error = ''
+        self.save(update_fields=['status', 'sent_at', 'last_error', 'modified'])
+
+    def mark_attempt_failed(self, error):
+        """
+        Schedule the next attempt with exponential backoff, giving up once
+        RAPIDPRO_OUTBOX_MAX_ATTEMPTS is reached.
+        """
+        self.attempts += 1
+        self.last_error = str(error)
+        if self.attempts >= settings.RAPIDPRO_OUTBOX_MAX_ATTEMPTS:
+            self.status = OutboxStatus.FAILED
+        else:
+            backoff = min(
+                settings.RAPIDPRO_OUTBOX_BACKOFF_SECONDS * 2 ** (self.attempts - 1),
+                settings.RAPIDPRO_OUTBOX_MAX_BACKOFF_SECONDS)
+            self.next_attempt_at = timezone.now() + timedelta(seconds=backoff)
+        self.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', 'modified'])
 
     def __str__(self):
-        return f'Attachment #{self.pk}'
+        return f'Outbox message #{self.pk} ({self.status})'
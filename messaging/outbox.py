@@ -0,0 +1,105 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import OutboxMessage, OutboxStatus
+from .rapidpro_client import RapidProClient
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDeliveryWorker:
+    """
+    Deliver pending OutboxMessages to RapidPro.
+
+    Messages are claimed in batches by pushing their next_attempt_at forward
+    by a lease, so several workers can run side by side. Messages of one
+    thread are sent one after another to keep them in order, while different
+    threads are delivered concurrently.
+    """
+
+    def __init__(self, concurrency=None, batch_size=None):
+        self.concurrency = concurrency or settings.RAPIDPRO_OUTBOX_CONCURRENCY
+        self.batch_size = batch_size or settings.RAPIDPRO_OUTBOX_BATCH_SIZE
+
+    def claim_batch(self):
+        """
+        Claim the due message at the head of each thread together with the
+        pending messages queued behind it, oldest first.
+        """
+        now = timezone.now()
+        earlier_pending = OutboxMessage.objects.filter(
+            thread=OuterRef('thread'), status=OutboxStatus.PENDING, id__lt=OuterRef('id'))
+
+        with transaction.atomic():
+            thread_ids = list(
+                OutboxMessage.objects
+                .select_for_update(skip_locked=True)
+                .filter(status=OutboxStatus.PENDING, next_attempt_at__lte=now)
+                .exclude(Exists(earlier_pending))
+                .order_by('next_attempt_at', 'id')
+                .values_list('thread_id', flat=True)[:self.batch_size]
+            )
+            # Within a thread ids increase, so any prefix in id order holds
+            # the head of each thread and a contiguous run behind it
+            ids = list(
+                OutboxMessage.objects
+                .select_for_update(skip_locked=True)
+                .filter(status=OutboxStatus.PENDING, thread_id__in=thread_ids)
+                .order_by('id')
+                .values_list('id', flat=True)[:self.batch_size]
+            )
+            OutboxMessage.objects.filter(id__in=ids).update(
+                next_attempt_at=now + timedelta(seconds=settings.RAPIDPRO_OUTBOX_LEASE_SECONDS))
+
+        return list(OutboxMessage.objects.filter(id__in=ids).select_related('thread__chatbot').order_by(
+            'thread_id', 'id'))
+
+    def deliver(self, message):
+        try:
+            response = RapidProClient(message.thread).send_reply(message.text)
+            response.raise_for_status()
+        except Exception as e:
+            logger.warning('Delivery of %s failed: %s', message, e)
+            message.mark_attempt_failed(e)
+            return False
+
+        message.mark_sent()
+        return True
+
+    def deliver_thread_messages(self, messages):
+        delivered = 0
+        for message in messages:
+            if not self.deliver(message):
+                # Keep the remaining messages of this thread for later, so
+                # they are not sent ahead of the failed one
+                break
+            delivered += 1
+        return delivered
+
+    def _deliver_in_worker_thread(self, messages):
+        try:
+            return self.deliver_thread_messages(messages)
+        finally:
+            connection.close()
+
+    def run_once(self):
+        """
+        Deliver one batch of due messages. Returns (claimed, delivered).
+        """
+        messages = self.claim_batch()
+        by_thread = [list(group) for _, group in groupby(messages, key=lambda message: message.thread_id)]
+
+        if self.concurrency <= 1:
+            delivered = sum(self.deliver_thread_messages(group) for group in by_thread)
+        else:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                delivered = sum(executor.map(self._deliver_in_worker_thread, by_thread))
+
+        return len(messages), delivered
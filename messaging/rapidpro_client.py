@@ -1,4 +1,30 @@
+import threading
+
 import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return a process-wide requests session, so connections to RapidPro are
+    pooled and kept alive between replies.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.RAPIDPRO_HTTP_POOL_SIZE,
+                    pool_maxsize=settings.RAPIDPRO_HTTP_POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
 
 
 class RapidProClient:
@@ -7,8 +33,8 @@ class RapidProClient:
         self.thread = thread
 
     def send_reply(self, text):
-        response = requests.get(url=self.thread.chatbot.request_url, params={
+        response = get_session().get(url=self.thread.chatbot.request_url, params={
             'from': self.thread.uuid,
             'text': text,
-        }, timeout=10)
+        }, timeout=settings.RAPIDPRO_REQUEST_TIMEOUT)
         return response
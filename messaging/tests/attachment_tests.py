@@ -0,0 +1,43 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from messaging.attachments import AttachmentDownloadWorker
+from messaging.models import Attachment, AttachmentStatus
+
+
+def mock_response(content):
+    response = mock.MagicMock()
+    response.__enter__.return_value = response
+    response.headers = {'Content-Length': str(len(content))}
+    response.iter_content.return_value = [content[:4], content[4:]]
+    return response
+
+
+class AttachmentDownloadTest(TestCase):
+    @mock.patch('messaging.models.get_session')
+    def test_identical_content_is_stored_once(self, get_session):
+        get_session.return_value.get.side_effect = lambda *args, **kwargs: mock_response(b'same file content')
+        first = Attachment.objects.create(external_link='https://rapidpro.example.com/media/a.txt')
+        second = Attachment.objects.create(external_link='https://rapidpro.example.com/media/b.txt')
+
+        claimed, downloaded = AttachmentDownloadWorker(concurrency=1).run_once()
+        first.refresh_from_db()
+        second.refresh_from_db()
+
+        self.assertEqual((claimed, downloaded), (2, 2))
+        self.assertEqual(first.content_hash, second.content_hash)
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(second.status, AttachmentStatus.DOWNLOADED)
+
+    @override_settings(RAPIDPRO_ATTACHMENT_MAX_SIZE=8)
+    @mock.patch('messaging.models.get_session')
+    def test_too_large_attachment_is_not_retried(self, get_session):
+        get_session.return_value.get.return_value = mock_response(b'content larger than the limit')
+        attachment = Attachment.objects.create(external_link='https://rapidpro.example.com/media/a.txt')
+
+        AttachmentDownloadWorker(concurrency=1).run_once()
+        attachment.refresh_from_db()
+
+        self.assertEqual(attachment.status, AttachmentStatus.FAILED)
+        self.assertFalse(attachment.file)
@@ -0,0 +1,103 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from iogt_users.factories import UserFactory
+from messaging.factories import ThreadFactory
+from messaging.models import Message, UnreadThreadCounter, UserThread
+from messaging.views import InboxView
+
+
+class InboxViewTest(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory()
+        now = timezone.now()
+        self.threads = []
+        for i in range(3):
+            thread = ThreadFactory(last_message_at=now - timedelta(minutes=i))
+            UserThread.objects.create(user=self.user, thread=thread)
+            Message.objects.create(thread=thread, text=f'Message {i}')
+            self.threads.append(thread)
+        self.client.force_login(self.user)
+
+    @mock.patch.object(InboxView, 'paginate_by', 2)
+    def test_inbox_is_paginated_with_latest_message(self):
+        first_page = self.client.get(reverse('messaging:inbox')).context
+        second_page = self.client.get(reverse('messaging:inbox'), {'cursor': first_page['next_cursor']}).context
+
+        self.assertEqual([user_thread.thread for user_thread in first_page['user_threads']], self.threads[:2])
+        self.assertEqual(first_page['user_threads'][0].latest_message_text, 'Message 0')
+        self.assertEqual([user_thread.thread for user_thread in second_page['user_threads']], self.threads[2:])
+        self.assertIsNone(second_page['next_cursor'])
+
+    @mock.patch.object(InboxView, 'paginate_by', 2)
+    def test_threads_without_last_message_at_are_listed_last(self):
+        threads_without_messages = [ThreadFactory(last_message_at=None) for __ in range(2)]
+        for thread in threads_without_messages:
+            UserThread.objects.create(user=self.user, thread=thread)
+
+        pages, cursor = [], None
+        while True:
+            request = RequestFactory().get(reverse('messaging:inbox'), {'cursor': cursor} if cursor else {})
+            request.user = self.user
+            context = InboxView.as_view()(request).context_data
+            pages.append([user_thread.thread for user_thread in context['user_threads']])
+            cursor = context['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(pages, [
+            self.threads[:2],
+            [self.threads[2], threads_without_messages[1]],
+            [threads_without_messages[0]],
+        ])
+
+
+class UnreadThreadCounterTest(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = UserFactory()
+        self.other_user = UserFactory()
+        self.thread = ThreadFactory()
+        UserThread.objects.create(user=self.user, thread=self.thread, is_read=True)
+        UserThread.objects.create(user=self.other_user, thread=self.thread, is_read=True)
+
+    def test_counter_follows_read_state(self):
+        self.assertEqual(UnreadThreadCounter.get_count(self.user), 0)
+
+        self.thread.mark_unread(sender=self.other_user)
+        self.assertEqual(UnreadThreadCounter.get_count(self.user), 1)
+        self.assertEqual(UnreadThreadCounter.get_count(self.other_user), 0)
+
+        self.thread.mark_unread(sender=self.other_user)
+        self.assertEqual(UnreadThreadCounter.get_count(self.user), 1)
+
+        self.thread.mark_read(self.user)
+        self.assertEqual(UnreadThreadCounter.get_count(self.user), 0)
+
+    def test_deleting_unread_thread_decrements_counter(self):
+        self.thread.mark_unread(sender=self.other_user)
+
+        self.thread.mark_deleted(self.user)
+
+        self.assertEqual(UnreadThreadCounter.get_count(self.user), 0)
+        self.assertEqual(UnreadThreadCounter.recount([self.user.pk]), {self.user.pk: 0})
+
+    def test_deleting_user_threads_decrements_counter(self):
+        self.thread.mark_unread(sender=self.other_user)
+        self.assertEqual(UnreadThreadCounter.get_count(self.user), 1)
+
+        self.thread.delete()
+
+        self.assertEqual(UnreadThreadCounter.get_count(self.user), 0)
+
+    def test_deleting_user_with_unread_threads_removes_counter(self):
+        self.thread.mark_unread(sender=self.other_user)
+
+        self.user.delete()
+
+        self.assertFalse(UnreadThreadCounter.objects.filter(user_id=self.user.pk).exists())
@@ -0,0 +1,62 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from iogt_users.factories import UserFactory
+from messaging.chat import ChatManager
+from messaging.factories import ThreadFactory
+from messaging.models import OutboxMessage, OutboxStatus, UserThread
+from messaging.outbox import OutboxDeliveryWorker
+
+
+@override_settings(RAPIDPRO_BOT_USER_ID=None)
+class OutboxTest(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory()
+        self.thread = ThreadFactory(chatbot__request_url='https://rapidpro.example.com/receive')
+        UserThread.objects.create(user=self.user, thread=self.thread)
+
+    @mock.patch('messaging.rapidpro_client.get_session')
+    def test_record_reply_queues_message_without_calling_rapidpro(self, get_session):
+        ChatManager(self.thread).record_reply(text='Hello', sender=self.user)
+
+        get_session.assert_not_called()
+        self.assertEqual(OutboxMessage.objects.get().text, 'Hello')
+
+    @mock.patch('messaging.rapidpro_client.get_session')
+    def test_worker_delivers_pending_messages(self, get_session):
+        OutboxMessage.objects.create(thread=self.thread, text='Hello')
+
+        claimed, delivered = OutboxDeliveryWorker(concurrency=1).run_once()
+
+        self.assertEqual((claimed, delivered), (1, 1))
+        self.assertEqual(OutboxMessage.objects.get().status, OutboxStatus.SENT)
+        get_session.return_value.get.assert_called_once()
+
+    @mock.patch('messaging.rapidpro_client.get_session')
+    def test_failed_delivery_is_retried_later_and_keeps_thread_order(self, get_session):
+        get_session.return_value.get.side_effect = ConnectionError('RapidPro is down')
+        first = OutboxMessage.objects.create(thread=self.thread, text='First')
+        second = OutboxMessage.objects.create(thread=self.thread, text='Second')
+
+        claimed, delivered = OutboxDeliveryWorker(concurrency=1).run_once()
+        first.refresh_from_db()
+        second.refresh_from_db()
+
+        self.assertEqual((claimed, delivered), (2, 0))
+        self.assertEqual(first.attempts, 1)
+        self.assertEqual(first.status, OutboxStatus.PENDING)
+        self.assertEqual(second.attempts, 0)
+        self.assertEqual(second.status, OutboxStatus.PENDING)
+        get_session.return_value.get.assert_called_once()
+
+    @mock.patch('messaging.rapidpro_client.get_session')
+    def test_worker_delivers_all_queued_messages_of_a_thread_in_one_batch(self, get_session):
+        for i in range(3):
+            OutboxMessage.objects.create(thread=self.thread, text=f'Message {i}')
+
+        claimed, delivered = OutboxDeliveryWorker(concurrency=1).run_once()
+
+        self.assertEqual((claimed, delivered), (3, 3))
+        self.assertEqual([call.kwargs['params']['text'] for call in get_session.return_value.get.call_args_list],
+                         ['Message 0', 'Message 1', 'Message 2'])
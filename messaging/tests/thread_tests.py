@@ -0,0 +1,51 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from iogt_users.factories import UserFactory
+from messaging.factories import ThreadFactory
+from messaging.models import Message, UserThread
+from messaging.views import ThreadDetailView
+
+
+class ThreadDetailViewTest(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory()
+        self.thread = ThreadFactory()
+        UserThread.objects.create(user=self.user, thread=self.thread)
+        self.messages = [Message.objects.create(thread=self.thread, text=f'Message {i}') for i in range(3)]
+        self.client.force_login(self.user)
+
+    @mock.patch.object(ThreadDetailView, 'paginate_by', 2)
+    def test_older_messages_are_loaded_with_cursor(self):
+        url = reverse('messaging:thread', kwargs={'thread_id': self.thread.pk})
+
+        latest_page = self.client.get(url).context
+        older_page = self.client.get(url, {'before': latest_page['before_cursor']}).context
+
+        self.assertEqual(list(latest_page['thread_messages']), self.messages[1:])
+        self.assertEqual(latest_page['most_recent_message_id'], self.messages[2].pk)
+        self.assertEqual(list(older_page['thread_messages']), self.messages[:1])
+        self.assertIsNone(older_page['before_cursor'])
+
+    def test_new_messages_endpoint_returns_only_newer_messages(self):
+        url = reverse('messaging:thread_new_messages', kwargs={'thread_id': self.thread.pk})
+
+        response = self.client.get(url, {'after': self.messages[0].pk})
+
+        self.assertEqual(response.status_code, 200)
+        new_messages = response.json()['messages']
+        self.assertEqual([message['id'] for message in new_messages], [self.messages[1].pk, self.messages[2].pk])
+        self.assertIn('Message 2', new_messages[1]['html'])
+        self.assertFalse(UserThread.objects.get(user=self.user).is_read)
+
+    def test_thread_is_marked_read_with_post(self):
+        url = reverse('messaging:thread_read', kwargs={'thread_id': self.thread.pk})
+
+        get_response = self.client.get(url)
+        post_response = self.client.post(url)
+
+        self.assertEqual(get_response.status_code, 405)
+        self.assertEqual(post_response.status_code, 204)
+        self.assertTrue(UserThread.objects.get(user=self.user).is_read)
@@ -1,4 +1,5 @@
 from base64 import b64encode
+from unittest import mock
 
 from django.core import management
 from django.test import override_settings
@@ -6,15 +7,19 @@ from django.urls import reverse
 from rest_framework.test import APITestCase
 
 from home.models import User
+from iogt_users.factories import UserFactory
 from messaging.factories import ThreadFactory
-from messaging.models import Message
+from messaging.models import Attachment, AttachmentStatus, Message
 
 
 class RapidProWebhookTest(APITestCase):
-    @override_settings(RAPIDPRO_BOT_USER_USERNAME='rb1', RAPIDPRO_BOT_USER_PASSWORD='rapidpassword1')
     def setUp(self) -> None:
-        management.call_command('sync_rapidpro_bot_user')
-        self.bot_user = User.objects.first()
+        with self.settings(RAPIDPRO_BOT_USER_USERNAME='rb1', RAPIDPRO_BOT_USER_PASSWORD='rapidpassword1'):
+            management.call_command('sync_rapidpro_bot_user')
+        self.bot_user = User.objects.get(username='rb1')
+        bot_user_settings = self.settings(RAPIDPRO_BOT_USER_ID=self.bot_user.pk)
+        bot_user_settings.enable()
+        self.addCleanup(bot_user_settings.disable)
         self.client.credentials(HTTP_AUTHORIZATION="Basic {}".format(
             b64encode(bytes(f"rb1:rapidpassword1", "utf-8")).decode("ascii")
         ))
@@ -47,3 +52,105 @@ class RapidProWebhookTest(APITestCase):
                          'https://rapidpro.idems.international/media/attachments/43/15890/steps/'
                          '3de4f80a-1eab-42db-8b7e-d7c35edecd06.bin')
         self.assertIsNotNone(attachment.file)
+
+    @override_settings(RAPIDPRO_BOT_USER_USERNAME='rb1', RAPIDPRO_BOT_USER_PASSWORD='rapidpassword1')
+    def test_webhook_does_not_download_attachments(self):
+        thread = ThreadFactory()
+        rapidpro_data = {
+            "id": "2",
+            "text": "Some message with attachment.\nhttps://rapidpro.example.com/media/image.jpg",
+            "to": str(thread.uuid),
+            "from": "abcd",
+            "channel": "bd3577c6-65b1-4bb7-9611-306c11b1dcc5",
+            "quick_replies": []}
+
+        with mock.patch('messaging.models.get_session') as get_session:
+            response = self.client.post(
+                path=reverse('messaging:api:rapidpro_webhook'), data=rapidpro_data, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        get_session.assert_not_called()
+        self.assertEqual(Attachment.objects.get().status, AttachmentStatus.PENDING)
+
+    @override_settings(RAPIDPRO_BOT_USER_USERNAME='rb1', RAPIDPRO_BOT_USER_PASSWORD='rapidpassword1')
+    def test_batch_webhook_records_messages_idempotently(self):
+        threads = [ThreadFactory(), ThreadFactory()]
+        rapidpro_data = {"messages": [{
+            "id": str(i),
+            "text": f"Broadcast {i}",
+            "to": str(thread.uuid),
+            "from": "abcd",
+            "channel": "bd3577c6-65b1-4bb7-9611-306c11b1dcc5",
+            "quick_replies": []} for i, thread in enumerate(threads, start=10)]}
+        path = reverse('messaging:api:rapidpro_batch_webhook')
+
+        response = self.client.post(path=path, data=rapidpro_data, format='json')
+        replay_response = self.client.post(path=path, data=rapidpro_data, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['skipped']), (2, 0))
+        self.assertEqual((replay_response.data['created'], replay_response.data['skipped']), (0, 2))
+        self.assertEqual(Message.objects.count(), 2)
+        message = Message.objects.get(rapidpro_message_id=10)
+        self.assertEqual(message.thread, threads[0])
+        self.assertEqual(message.text, 'Broadcast 10')
+
+    @override_settings(RAPIDPRO_BOT_USER_USERNAME='rb1', RAPIDPRO_BOT_USER_PASSWORD='rapidpassword1')
+    def test_batch_webhook_rejects_non_numeric_message_ids(self):
+        thread = ThreadFactory()
+        rapidpro_data = {"messages": [{
+            "id": "abc",
+            "text": "Broadcast",
+            "to": str(thread.uuid),
+            "from": "abcd",
+            "channel": "bd3577c6-65b1-4bb7-9611-306c11b1dcc5",
+            "quick_replies": []}]}
+
+        response = self.client.post(
+            path=reverse('messaging:api:rapidpro_batch_webhook'), data=rapidpro_data, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Message.objects.count(), 0)
+
+
+class RapidProTokenAuthenticationTest(APITestCase):
+    def setUp(self) -> None:
+        self.bot_user = UserFactory()
+        self.thread = ThreadFactory()
+        self.rapidpro_data = {
+            "id": "1",
+            "text": "Hello",
+            "to": str(self.thread.uuid),
+            "from": "abcd",
+            "channel": "bd3577c6-65b1-4bb7-9611-306c11b1dcc5",
+            "quick_replies": []}
+
+    def test_webhook_accepts_valid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token secret-token')
+
+        with self.settings(RAPIDPRO_WEBHOOK_TOKEN='secret-token', RAPIDPRO_BOT_USER_ID=self.bot_user.pk):
+            response = self.client.post(
+                path=reverse('messaging:api:rapidpro_webhook'), data=self.rapidpro_data, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Message.objects.get().sender, self.bot_user)
+
+    def test_webhook_rejects_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token wrong-token')
+
+        with self.settings(RAPIDPRO_WEBHOOK_TOKEN='secret-token', RAPIDPRO_BOT_USER_ID=self.bot_user.pk):
+            response = self.client.post(
+                path=reverse('messaging:api:rapidpro_webhook'), data=self.rapidpro_data, format='json')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(Message.objects.count(), 0)
+
+    def test_webhook_rejects_token_when_bot_user_is_missing(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token secret-token')
+
+        with self.settings(RAPIDPRO_WEBHOOK_TOKEN='secret-token', RAPIDPRO_BOT_USER_ID=self.bot_user.pk + 1000):
+            response = self.client.post(
+                path=reverse('messaging:api:rapidpro_webhook'), data=self.rapidpro_data, format='json')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(Message.objects.count(), 0)
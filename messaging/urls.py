@@ -8,6 +8,8 @@ urlpatterns = [
     path('api/', include('messaging.api.urls')),
     path('inbox/', views.InboxView.as_view(), name='inbox'),
     path('message/<int:thread_id>', views.ThreadDetailView.as_view(), name='thread'),
+    path('message/<int:thread_id>/new', views.ThreadNewMessagesView.as_view(), name='thread_new_messages'),
+    path('message/<int:thread_id>/read', views.ThreadReadView.as_view(), name='thread_read'),
     path('message/create', views.MessageCreateView.as_view(), name='message_create'),
     path('thread/<int:pk>/delete/', views.ThreadDeleteView.as_view(), name="thread_delete"),
 ]
@@ -1,8 +1,11 @@
 from django.contrib import messages
 from django.contrib.auth import get_user_model
-from django.http import HttpResponseRedirect
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.generic import (DeleteView, TemplateView, )
@@ -16,41 +19,92 @@ from django.contrib.auth.decorators import login_required
 User = get_user_model()
 
 
+def make_cursor(timestamp, pk):
+    return f'{timestamp.isoformat() if timestamp else ""}_{pk}'
+
+
+def parse_cursor(cursor, nullable=False):
+    """
+    Parse a "<timestamp>_<id>" cursor made by make_cursor. The timestamp may only be empty if nullable is set.
+    Returns None if the cursor is missing or invalid.
+    """
+    try:
+        timestamp, pk = cursor.rsplit('_', 1)
+        if not timestamp and nullable:
+            return None, int(pk)
+        timestamp = parse_datetime(timestamp)
+        return (timestamp, int(pk)) if timestamp else None
+    except (AttributeError, ValueError):
+        return None
+
+
 @method_decorator(login_required, name='dispatch')
 class InboxView(TemplateView):
     template_name = 'messaging/inbox.html'
+    paginate_by = 20
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         folder = self.kwargs.get('deleted', 'inbox')
-        if folder == 'deleted':
-            threads = Thread.thread_objects.of_user(self.request.user).deleted().order_by_latest()
-        else:
-            threads = Thread.thread_objects.of_user(self.request.user).inbox().order_by_latest()
+        user_threads = UserThread.get_user_inbox(self.request.user, is_active=folder != 'deleted')
+
+        # Threads without a last_message_at come last, so the cursor of a
+        # page ending in them has an empty timestamp
+        cursor = parse_cursor(self.request.GET.get('cursor'), nullable=True)
+        if cursor:
+            last_message_at, pk = cursor
+            if last_message_at is None:
+                user_threads = user_threads.filter(thread__last_message_at__isnull=True, pk__lt=pk)
+            else:
+                user_threads = user_threads.filter(
+                    Q(thread__last_message_at__lt=last_message_at)
+                    | Q(thread__last_message_at=last_message_at, pk__lt=pk)
+                    | Q(thread__last_message_at__isnull=True))
+
+        user_threads = list(user_threads[:self.paginate_by + 1])
+        next_cursor = None
+        if len(user_threads) > self.paginate_by:
+            user_threads = user_threads[:self.paginate_by]
+            last = user_threads[-1]
+            next_cursor = make_cursor(last.thread.last_message_at, last.pk)
 
         context.update({
             "folder": folder,
-            "threads": threads.prefetch_related('messages'),
-            "user_threads": UserThread.get_user_inbox(self.request.user),
-            "unread_threads": Thread.thread_objects.of_user(self.request.user).unread().order_by_latest(),
+            "user_threads": user_threads,
+            "next_cursor": next_cursor,
         })
         return context
 
 
 @method_decorator(login_required, name='dispatch')
 class ThreadDetailView(View):
+    paginate_by = 20
 
     def get_context(self, thread):
-        num_results = int(self.request.GET.get('num_results', 20))
-        thread_messages = thread.messages.order_by('-sent_at')[:num_results]
-        most_recent_message = thread_messages.first()
+        thread_messages = thread.messages.select_related('sender').prefetch_related(
+            'attachments__image').order_by('-sent_at', '-id')
+
+        cursor = parse_cursor(self.request.GET.get('before'))
+        if cursor:
+            sent_at, pk = cursor
+            thread_messages = thread_messages.filter(Q(sent_at__lt=sent_at) | Q(sent_at=sent_at, pk__lt=pk))
+
+        thread_messages = list(thread_messages[:self.paginate_by + 1])
+        before_cursor = None
+        if len(thread_messages) > self.paginate_by:
+            thread_messages = thread_messages[:self.paginate_by]
+            before_cursor = make_cursor(thread_messages[-1].sent_at, thread_messages[-1].pk)
+
+        # Quick replies are only offered on the latest message of the thread
+        most_recent_message = thread_messages[0] if thread_messages and not cursor else None
 
         return {
             'thread': thread,
             'most_recent_message_id': most_recent_message.id if most_recent_message else None,
             'user': self.request.user,
-            'thread_messages': reversed(thread_messages),
-            'load_more_num_results': num_results + 20,
+            'thread_messages': thread_messages[::-1],
+            'before_cursor': before_cursor,
+            'is_latest_page': not cursor,
         }
 
     def get(self, request, thread_id):
@@ -72,6 +126,50 @@ class ThreadDetailView(View):
             return render(request, 'messaging/thread_detail.html', context=self.get_context(thread))
 
 
+@method_decorator(login_required, name='dispatch')
+class ThreadNewMessagesView(View):
+    """
+    Messages of a thread newer than the message id given as ?after=, each
+    rendered as on the thread page, for polling from the thread page without
+    rendering the whole thread again. Polling does not mark the thread read;
+    the page does that with a POST to ThreadReadView once it shows them.
+    """
+    max_results = 50
+
+    def get(self, request, thread_id):
+        thread = get_object_or_404(Thread, pk=thread_id, users__in=[request.user])
+        try:
+            after = int(request.GET.get('after', 0))
+        except ValueError:
+            return JsonResponse({'error': 'after must be a message id'}, status=400)
+
+        thread_messages = list(thread.messages.filter(pk__gt=after).select_related('sender').prefetch_related(
+            'attachments__image').order_by('sent_at', 'id')[:self.max_results])
+        context = {
+            'thread': thread,
+            'user': request.user,
+            'most_recent_message_id': thread_messages[-1].id if thread_messages else None,
+        }
+
+        return JsonResponse({'messages': [{
+            'id': message.id,
+            'sent_at': message.sent_at.isoformat(),
+            'html': render_to_string('messaging/message.html', {**context, 'message': message}, request=request),
+        } for message in thread_messages]})
+
+
+@method_decorator(login_required, name='dispatch')
+class ThreadReadView(View):
+    """
+    Mark a thread read for the user, after the thread page showed new messages.
+    """
+
+    def post(self, request, thread_id):
+        thread = get_object_or_404(Thread, pk=thread_id, users__in=[request.user])
+        thread.mark_read(request.user)
+        return HttpResponse(status=204)
+
+
 @method_decorator(login_required, name='dispatch')
 class MessageCreateView(View):
     """
@@ -101,5 +199,5 @@ class ThreadDeleteView(DeleteView):
     template_name = "messaging/thread_confirm_delete.html"
 
     def delete(self, request, *args, **kwargs):
-        self.get_object().user_threads.filter(user=request.user).update(is_active=False)
+        self.get_object().mark_deleted(request.user)
         return HttpResponseRedirect(reverse("messaging:inbox"))